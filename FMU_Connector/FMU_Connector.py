@@ -2,12 +2,27 @@
 import os
 from datetime import datetime
 import shutil
+import time
 from fmpy import *
 import yaml
 import re
 import json
 import transform
+import transform_pipeline
+import aggregation
+import arrays
+import terminal
+import fmu_build
+import me_engine
+import model_reader
+import variable_table
+import variable_selection
 import copy
+import logging
+import threading
+import collections
+import connector_logging
+import numpy as np
 
 from typing import Any, Dict, List, Union
 
@@ -18,9 +33,56 @@ SIM_CONFIG_NAME_f = lambda model_fp: model_fp.replace(".fmu", "_conf.yaml")
 # ("1.0", "2.0", "3.0")
 FMI_VERSION = "2.0"
 
+logger = connector_logging.get_logger("connector")
+validator_logger = connector_logging.get_logger("validator")
+fmi_logger = connector_logging.get_logger("fmi")
+
+# FMU files extracted by this process, per extraction folder, with the number of instances using them
+# (binaries loaded by an instance can't be overwritten by extracting them again, nor removed while in use,
+#  e.g: when several instances of the model run in the same process)
+_extracted_models = {}
+
+
+# FMI getter/setter per variable type (see FMUSimValidation.vars_to_fmi_type)
+# note, fmi v'3.0' uses a getter/setter per type name (e.g: "getFloat64"), and exchanges enumerations as "Int64"
+TYPE_ACCESSORS = {"Real": ("getReal", "setReal"),
+                  "Integer": ("getInteger", "setInteger"),
+                  "Enumeration": ("getInteger", "setInteger"),
+                  "Boolean": ("getBoolean", "setBoolean"),
+                  "String": ("getString", "setString")}
+
+
+def _cast_read_values(type_f, values):
+    """Cast values read from the FMU for the brain: Booleans as 0/1, and Strings (read as bytes) as str.
+    """
+
+    if type_f is bool:
+        return [int(value) for value in values]
+    if type_f is str:
+        return [value.decode("utf-8") if isinstance(value, bytes) else value for value in values]
+    return values
+
 
 def fmi_call_logger(message:str):
-    print('[FMI] ' + message, flush=True)
+    fmi_logger.info('[FMI] ' + message, extra={"rate_limit": False})
+
+
+def read_interface_state_fields(interface_filepath: str = "interface.json"):
+    """Read the names of the state fields declared in an interface.json file (e.g: to project the state on them).
+    """
+
+    with open(interface_filepath, 'r') as file:
+        interface_dict = json.load(file)
+    return [field["name"] for field in interface_dict["description"]["state"]["fields"]]
+
+
+def cast_start_value(type_f, start):
+    """Cast the start value of a variable (as read from the model description) to its type.
+    """
+
+    if type_f is bool and isinstance(start, str):
+        return start.strip().lower() in ("true", "1")
+    return type_f(start)
 
 
 class FMUSimValidation:
@@ -28,6 +90,9 @@ class FMUSimValidation:
         self,
         model_filepath: str,
         user_validation: bool = True,
+        model_description = None,
+        stream_model_description: bool = True,
+        variable_causalities: List[str] = None,
     ):
         """Template for validating FMU models for Bonsai integration.
 
@@ -39,6 +104,13 @@ class FMUSimValidation:
             If True, model inputs/outputs need to be accepted by user for each run.
             If False, YAML config file is used (if exists and valid). Otherwise, FMI
               file is read. If FMI model description is also invalid, error is raised.
+        model_description: ModelDescription
+            If given, it is used instead of reading the description from the FMU file.
+        stream_model_description: bool
+            If True, the description is read in a single pass, keeping only the variables selected in the
+              YAML config file (if any), see model_reader.py. Otherwise, fmpy builds the full description.
+        variable_causalities: List[str]
+            If given, only variables with these causalities are read (e.g: ["parameter", "input", "output"]).
         """
 
         # ensure model filepath is balid, and save as att if it is
@@ -48,55 +120,37 @@ class FMUSimValidation:
         self.sim_config_filepath = SIM_CONFIG_NAME_f(self.model_filepath)
 
         # read the model description
-        self.model_description = read_model_description(model_filepath)
+        self.stream_model_description = stream_model_description
+        self.variable_causalities = variable_causalities
+        self.is_selection_filtered = False
+        if model_description is None:
+            model_description = self._read_model_description(None if user_validation else self._get_yaml_selection())
+        self.model_description = model_description
         error_log  = "Provided model ({}) doesn't have modelVariables in XLS description file".format(model_filepath)
         assert len(self.model_description.modelVariables) > 0, error_log
 
-        # correct non-alphanumeric tags.
-        # note, it doesn't suppose any problem, since interaction with sim uses indices, not names.
-        self._clean_non_alphanumeric_chars()
+        # collect value references, types, and start values of the variables into a columnar table (single pass)
+        self._collect_variables()
 
 
-        # collect the value references (indices)
-        # collect the value types (Real, Integer or Enumeration)
-        # collect the variables to be initialized and the value to do so at
-        self.vars_to_idx = {}
-        self.vars_to_type_f = {}
-        self.vars_to_ini_vals = {}
-        for variable in self.model_description.modelVariables:
-            # extract key attributes per variable
-            var_idx = variable.valueReference #, variable.causality
-            var_name = variable.name
-            var_type = variable.type
-            var_start = variable.start
-            
-            # collect type reference
-            if var_type == "Real":
-                self.vars_to_type_f[var_name] = float
-            elif var_type == "Integer":
-                self.vars_to_type_f[var_name] = int
-            else:
-                # [TODO] Integrate variables of type "Enumeration". How do we cast? Define a function for "self.vars_to_type_f".
-                # [TODO] Integrate variables of type string (need to find correct var_type tag first).
-                # [TODO] Integrate variables of type boolean (need to find correct var_type tag first).
-                print(f"Variable '{var_name}' will be skipped. FMU connector cannot currently handle vars of type '{var_type}'.")
-                continue
-            
-            # collect the value references (indices)
-            self.vars_to_idx[var_name] = var_idx
-
-            # collect the variables to be initialized and the value to do so at
-            if var_start is not None:
-                # cast variable prior to storing
-                self.vars_to_ini_vals[var_name] = self.vars_to_type_f[var_name](var_start)
-        
-
         # initialize sim config
         self.is_model_config_valid = False  # Currently unused, since error is raised if model invalid
         self.sim_config_params = []
         self.sim_inputs = []
         self.sim_outputs = []
         self.sim_other_vars = []
+        # recommended step sizes, written by the offline calibration tool (generic/calibrate.py)
+        self.sim_calibration = {}
+        # reductions of outputs over the substeps of each step (opt-in)
+        self.sim_aggregation = {}
+        # terminal (halt) conditions evaluated after each step (opt-in)
+        self.sim_terminal = {}
+        # representation of array variables in the state: "nested" arrays, or "flattened" {name}_{i} fields
+        self.sim_array_mode = "nested"
+        # fields of the state sent to the brain: a list of names, or the filepath to an interface.json (opt-in)
+        self.sim_state_projection = None
+        # declarative transforms of states and actions (opt-in)
+        self.sim_transforms = {}
 
         # ---------------------------------------------------------------------
         # YAML CONFIG --> check for existing config using SIM_CONFIG_NAME_f --> e.g: "{model_name}_conf.yaml"
@@ -106,10 +160,11 @@ class FMUSimValidation:
         if valid_config:
 
             # print model config for user reference: config_params, inputs, outputs
-            print(self._get_sim_config_str())
+            validator_logger.info(self._get_sim_config_str(), extra={"rate_limit": False})
 
             if user_validation:
                 # prompt user to manually validate model if selected
+                connector_logging.flush()
                 validation_asserted = input("Is this configuration correct (y|n)? ")
 
                 if validation_asserted == "y":
@@ -134,10 +189,11 @@ class FMUSimValidation:
         if valid_config:
 
             # print model config for user reference: config_params, inputs, outputs
-            print(self._get_sim_config_str())
+            validator_logger.info(self._get_sim_config_str(), extra={"rate_limit": False})
             
             if user_validation:
                 # prompt user to manually validate model if selected
+                connector_logging.flush()
                 validation_asserted = input("Is this configuration correct (y|n)? ")
 
                 if validation_asserted == "y":
@@ -176,24 +232,45 @@ class FMUSimValidation:
         """
 
 
-        print("\n[FMU Validator] ---- Looking to see if YAML config file exists ----")
+        validator_logger.info("\n[FMU Validator] ---- Looking to see if YAML config file exists ----")
 
         # use convention to search for config file
         config_file = self.sim_config_filepath
         
         if not os.path.isfile(config_file):
-            print("[FMU Validator] Configuration file for selected example was NOT found: {}".format(config_file))
+            validator_logger.info("[FMU Validator] Configuration file for selected example was NOT found: {}".format(config_file))
             return False
 
-        print("[FMU Validator] Sim config file for selected example was found: {}\n".format(config_file))
+        validator_logger.info("[FMU Validator] Sim config file for selected example was found: {}\n".format(config_file))
 
         # Open and extract sim config from YAML file
         with open(config_file, 'r') as file:
             #data = yaml.dump(config_file, Loader=yaml.FullLoader)
             simulation_config = yaml.load(file, Loader=yaml.FullLoader)
+
+        # Extract recommended step sizes, if the model has been calibrated
+        self.sim_calibration = simulation_config.get('calibration') or {}
+
+        # Extract reductions of outputs over substeps, if any (e.g: {"x1": ["max", {"count_above": 0.5}]})
+        self.sim_aggregation = simulation_config.get('aggregation') or {}
+
+        # Extract terminal conditions, if any (bounds, non-finite checks, stop time, expressions)
+        self.sim_terminal = simulation_config.get('terminal') or {}
+
+        # Extract representation of array variables, if given
+        self.sim_array_mode = simulation_config.get('array_mode') or "nested"
+        assert self.sim_array_mode in arrays.ARRAY_MODES, f"array_mode '{self.sim_array_mode}' is invalid. Valid values are {arrays.ARRAY_MODES}."
+
+        # Extract projection of the state sent to the brain, if given (e.g: "interface.json", or a list of fields)
+        self.sim_state_projection = simulation_config.get('state_projection') or None
+        assert self.sim_state_projection is None or isinstance(self.sim_state_projection, (str, list)), \
+            "state_projection must be a list of state fields, or the filepath to an interface.json file."
+
+        # Extract declarative transforms of states and actions, if any (see transform_pipeline.py)
+        self.sim_transforms = simulation_config.get('transforms') or {}
             
         if 'simulation' not in simulation_config.keys():
-            print("[FMU Validator] Configuration file for selected example does not have a 'simulation' tag, thus it is omited.")
+            validator_logger.warning("[FMU Validator] Configuration file for selected example does not have a 'simulation' tag, thus it is omited.")
             return False
 
         # Extract sim configuration from dict
@@ -202,11 +279,19 @@ class FMUSimValidation:
         sim_outputs = simulation_config['simulation']['outputs']
         sim_other_vars = simulation_config['simulation']['other_vars']
 
+        # Resolve glob/regex patterns and exclusions into variable names, if any (see variable_selection.py)
+        sim_lists = [sim_config_params, sim_inputs, sim_outputs, sim_other_vars]
+        if any(variable_selection.is_pattern(entry) for sim_list in sim_lists for entry in sim_list or []):
+            tic = time.perf_counter()
+            selector = variable_selection.VariableSelector(self.variables.names, self.original_names)
+            sim_config_params, sim_inputs, sim_outputs, sim_other_vars = [selector.resolve(sim_list) for sim_list in sim_lists]
+            validator_logger.info(f"[FMU Validator] Resolved variable patterns of the YAML config file in {1000 * (time.perf_counter() - tic):.1f} ms.")
+
         # Validate values extracted
         if len(sim_inputs) == 0:
-            print("[FMU Validator] Sim config file has no sim-input states, and thus cannot be used\n")
+            validator_logger.warning("[FMU Validator] Sim config file has no sim-input states, and thus cannot be used\n")
         elif len(sim_outputs) == 0:
-            print("[FMU Validator] Sim config file has no sim-output states, and thus cannot be used\n")
+            validator_logger.warning("[FMU Validator] Sim config file has no sim-output states, and thus cannot be used\n")
         else:
             # Store data extracted as attributes
             self.sim_config_params = sim_config_params
@@ -227,32 +312,24 @@ class FMUSimValidation:
                     {var}.causality == "output"     ==>  sim outputs
         """
         
-        print("\n---- Looking to see if FMU model description contains required 'causality' type definitions ----")
-
-        sim_config_params = []
-        sim_inputs = []
-        sim_outputs = []
-        sim_other_vars = []
-        
-        for variable in self.model_description.modelVariables:
-
-            # extract causality and append valu
-            causality = variable.causality
-
-            if causality == "parameter":
-                sim_config_params.append(variable.name)
-            elif causality == "input":
-                sim_inputs.append(variable.name)
-            elif causality == "output":
-                sim_outputs.append(variable.name)
-            else:
-                sim_other_vars.append(variable.name)
+        validator_logger.info("\n---- Looking to see if FMU model description contains required 'causality' type definitions ----")
+
+        # every variable is needed to extract the config, if only those selected in the YAML config file were read
+        if self.is_selection_filtered:
+            self.model_description = self._read_model_description()
+            self._collect_variables()
+
+        # extract names per causality from the variable table
+        sim_config_params = self.variables.get_names(["parameter"])
+        sim_inputs = self.variables.get_names(["input"])
+        sim_outputs = self.variables.get_names(["output"])
+        sim_other_vars = self.variables.get_names(["parameter", "input", "output"], exclude=True)
         
         # Validate values extracted
         if len(sim_inputs) == 0:
-            print("\n[FMU Validator] Sim FMU description file has no sim-input states, and thus cannot be used.")
+            validator_logger.warning("\n[FMU Validator] Sim FMU description file has no sim-input states, and thus cannot be used.")
         elif len(sim_outputs) == 0:
-            print("\n[FMU Validator] Sim FMU description file has no sim-output states, and thus cannot be used.")
+            validator_logger.warning("\n[FMU Validator] Sim FMU description file has no sim-output states, and thus cannot be used.")
         else:
             # Store data extracted as attributes
             self.sim_config_params = sim_config_params
@@ -289,29 +366,35 @@ class FMUSimValidation:
             # var_start = variable.start
             # var_desc = variable.description
             var_causality = variable.causality
+            var_category = "String" if variable.type == "String" else "Number"
+            var_comment = variable.description
+            if variable.type == "Enumeration" and variable.declaredType is not None:
+                # enumerations are exchanged as their integer codes
+                items = ", ".join(f"{item.value}={item.name}" for item in variable.declaredType.items)
+                var_comment = f"{var_comment or ''} (Enumeration: {items})".strip()
 
                 
+            var_entries = [{"name": variable.name,
+                            "type": {
+                                "category": var_category,
+                                "comment": var_comment
+                                }
+                            }]
+            if variable.name in self.vars_to_shape:
+                # array variables are described as Bonsai arrays, or as a field per element when flattened
+                var_shape = self.vars_to_shape[variable.name]
+                if self.sim_array_mode == "nested":
+                    var_entries = [{"name": variable.name, "type": arrays.get_interface_type(var_shape, var_comment)}]
+                else:
+                    var_entries = [{"name": flat_name, "type": {"category": "Number", "comment": var_comment}}
+                                   for flat_name in arrays.get_flat_names(variable.name, var_shape)]
+
             if var_causality == "parameter":
-                sim_config_list.append({"name": variable.name,
-                                        "type": {
-                                            "category": "Number",
-                                            "comment": variable.description
-                                            }
-                                        })
+                sim_config_list.extend(var_entries)
             elif var_causality == "input":
-                sim_action_list.append({"name": variable.name,
-                                        "type": {
-                                            "category": "Number",
-                                            "comment": variable.description
-                                            }
-                                        })
+                sim_action_list.extend(var_entries)
             elif var_causality == "output":
-                sim_state_list.append({"name": variable.name,
-                                        "type": {
-                                            "category": "Number",
-                                            "comment": variable.description
-                                            }
-                                        })
+                sim_state_list.extend(var_entries)
 
         def copy_entry_and_prefix_comment(entry, prefix):
             entry_copy = copy.deepcopy(entry)
@@ -341,6 +424,48 @@ class FMUSimValidation:
                                     "comment": "Reserved FMU variable: If set, performs each Bonsai iteration as a sequence of smaller simulation steps. Multiple FMU simulation steps of size FMU_substep_size will be performed in each Bonsai iteration with a total time of FMU_substep_size."
                                     }
                                 })
+        sim_config_list.append({"name": "FMU_adaptive_substep",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Set to 1 to adapt the substep size to the dynamics of the model, within FMU_substep_min and FMU_substep_max. Requires a co-simulation model that can handle variable communication step sizes."
+                                    }
+                                })
+        sim_config_list.append({"name": "FMU_substep_min",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Minimum substep size used when FMU_adaptive_substep is set."
+                                    }
+                                })
+        sim_config_list.append({"name": "FMU_substep_max",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Maximum substep size used when FMU_adaptive_substep is set."
+                                    }
+                                })
+        sim_config_list.append({"name": "FMU_substep_tolerance",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Relative tolerance on the local error of the outputs used when FMU_adaptive_substep is set."
+                                    }
+                                })
+        sim_config_list.append({"name": "FMU_max_retries",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Maximum number of times a failed substep is rolled back and retried with smaller substeps (default 3, 0 to disable). Requires a co-simulation model that can get and set its state."
+                                    }
+                                })
+        sim_config_list.append({"name": "FMU_action_repeat",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: If set, each brain action is held for FMU_action_repeat simulation steps (of size FMU_step_size) per Bonsai iteration."
+                                    }
+                                })
+        sim_config_list.append({"name": "FMU_action_repeat_reduction",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Aggregation of the outputs over the steps an action is held for (FMU_action_repeat): 0 for last (default), 1 for mean, 2 for min, 3 for max."
+                                    }
+                                })
         sim_config_list.append({"name": "FMU_logging",
                                 "type": {
                                     "category": "Number",
@@ -371,6 +496,12 @@ class FMUSimValidation:
                                     "comment": "Reserved FMU variable: If set, overrides the default simulation step size. Each Bonsai iteration will step the FMU simulation forward by this amount of time. When this is set using an action, it overrides config settings and can be used to take variable sized time steps dynamically controlled by the brain."
                                     }
                                 })
+        sim_action_list.append({"name": "FMU_action_repeat",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: If set, the action is held for FMU_action_repeat simulation steps. When this is set using an action, it overrides config settings."
+                                    }
+                                })
         sim_state_list.append({"name": "FMU_error",
                                 "type": {
                                     "category": "Number",
@@ -383,6 +514,38 @@ class FMUSimValidation:
                                     "comment": "Reserved FMU variable: Current simulation time. This is the time at the end of the last simulation step."
                                     }
                                 })
+        sim_state_list.append({"name": "FMU_substeps_taken",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Number of substeps taken during the previous simulation step."
+                                    }
+                                })
+        sim_state_list.append({"name": "FMU_substeps_rejected",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Number of substeps rejected (and retaken with a smaller size) during the previous simulation step, when FMU_adaptive_substep is set."
+                                    }
+                                })
+        sim_state_list.append({"name": "FMU_retries",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Number of retries needed to recover from failed substeps during the previous simulation step."
+                                    }
+                                })
+        sim_state_list.append({"name": "FMU_recovery_time",
+                                "type": {
+                                    "category": "Number",
+                                    "comment": "Reserved FMU variable: Wall-clock time (in seconds) spent recovering from failed substeps during the previous simulation step."
+                                    }
+                                })
+     
+        for var_name, reduction, threshold, state_name in aggregation.parse_output_reductions(self.sim_aggregation):
+            sim_state_list.append({"name": state_name,
+                                    "type": {
+                                        "category": "Number",
+                                        "comment": f"Aggregated output: {reduction} of '{var_name}' over the substeps of the previous simulation step" + (f" (threshold {threshold})." if reduction == "count_above" else ".")
+                                        }
+                                    })
      
         interface_dict = {"name": self.model_description.modelName,
                           "timeout":60,
@@ -405,14 +568,14 @@ class FMUSimValidation:
         
         # Dump configuration to YAML file for later reuse (or user editing if "is_aux_yaml==True")
         interface_file = os.path.join(os.getcwd(),"interface.json")
-        print(str(interface_file))
+        validator_logger.info(str(interface_file))
         with open(interface_file, 'w') as file:
             json.dump(interface_dict, file)
         
           # Raise error, and avoid continuing using model
         log  = "\n[FMU Validator] Created an interface.json in cwd "
           
-        print(log)
+        validator_logger.info(log)
 
         return    
     
@@ -449,6 +612,19 @@ class FMUSimValidation:
                            "outputs": sim_outputs,
                            "other_vars": sim_other_vars}
         full_sim_data = {"simulation": full_sim_config}
+        if self.sim_calibration and not is_aux_yaml:
+            # keep recommended step sizes from previous calibration runs
+            full_sim_data["calibration"] = self.sim_calibration
+        if self.sim_aggregation and not is_aux_yaml:
+            full_sim_data["aggregation"] = self.sim_aggregation
+        if self.sim_terminal and not is_aux_yaml:
+            full_sim_data["terminal"] = self.sim_terminal
+        if self.vars_to_shape:
+            full_sim_data["array_mode"] = self.sim_array_mode
+        if self.sim_state_projection and not is_aux_yaml:
+            full_sim_data["state_projection"] = self.sim_state_projection
+        if self.sim_transforms and not is_aux_yaml:
+            full_sim_data["transforms"] = self.sim_transforms
 
         # Dump configuration to YAML file for later reuse (or user editing if "is_aux_yaml==True")
         with open(config_file, 'w') as file:
@@ -462,7 +638,7 @@ class FMUSimValidation:
         if is_aux_yaml:
             log += "[FMU Validator] Edit the YAML file, and remove the '_EDIT' nametag to use this model.\n"
         
-        print(log)
+        validator_logger.info(log)
         
         self._dump_config_to_interface_json_file()
 
@@ -482,17 +658,112 @@ class FMUSimValidation:
         return log
 
 
-    def _clean_non_alphanumeric_chars(self):
-        """Remove non-alphanumeric characters to make them valid with Bonsai interaction.
+    def _read_model_description(self, selection: List[str] = None):
+        """Read the model description, streamed in a single pass unless disabled (see model_reader.py).
+            If a selection of variable names (or patterns, see variable_selection.py) is given, only those are kept.
         """
 
-        for i,variable in enumerate(self.model_description.modelVariables):
-            clean_name = re.sub(r'[^a-zA-Z0-9_]', '', variable.name)
+        if not self.stream_model_description:
+            return read_model_description(self.model_filepath)
+
+        self.is_selection_filtered = selection is not None
+        if not self.is_selection_filtered:
+            return model_reader.read_model_description_streaming(self.model_filepath, causalities=self.variable_causalities)
+
+        names = [name for name in selection if not variable_selection.is_pattern(name)]
+        patterns = variable_selection.get_selection_expressions(selection)
+        validator_logger.info(f"[FMU Validator] Reading the {len(names)} variables (and {len(patterns)} patterns) selected in the YAML config file from the model description.")
+        return model_reader.read_model_description_streaming(self.model_filepath,
+                                                             causalities=self.variable_causalities,
+                                                             names=names,
+                                                             patterns=patterns)
+
+
+    def _get_yaml_selection(self):
+        """Get the names (or patterns) of the variables used by the YAML config file, if it selects inputs and outputs.
+            Returns None otherwise (see _validate_sim_config).
+        """
+
+        if not os.path.isfile(self.sim_config_filepath):
+            return None
+        with open(self.sim_config_filepath, 'r') as file:
+            simulation_config = yaml.load(file, Loader=yaml.FullLoader) or {}
+
+        simulation = simulation_config.get('simulation') or {}
+        if not simulation.get('inputs') or not simulation.get('outputs'):
+            return None
+
+        selection = []
+        for key in ('config_params', 'inputs', 'outputs', 'other_vars'):
+            selection.extend(simulation.get(key) or [])
+        # variables aggregated, or involved in terminal conditions
+        selection.extend((simulation_config.get('aggregation') or {}).keys())
+        sim_terminal = simulation_config.get('terminal') or {}
+        selection.extend((sim_terminal.get('bounds') or {}).keys())
+        if isinstance(sim_terminal.get('non_finite'), list):
+            selection.extend(sim_terminal['non_finite'])
+        expressions = sim_terminal.get('expressions') or []
+        for expression in [expressions] if isinstance(expressions, str) else expressions:
+            selection.extend(re.findall(r'[A-Za-z_]\w*', str(expression)))
+
+        return list(dict.fromkeys(str(name) for name in selection))
+
+
+    def _collect_variables(self):
+        """Collect the value references, types, shapes, and start values of the model variables (see variable_table.py).
+            Non-alphanumeric characters are removed from names on the same pass (see model_reader.clean_name).
+            Note, it doesn't suppose any problem, since interaction with sim uses indices, not names.
+        """
+
+        # collect the value references (indices)
+        # collect the value types (Real, Integer, Enumeration, Boolean or String, and fmi v'3.0' types)
+        # collect the shape of array variables (fmi v'3.0' only)
+        # collect the variables to be initialized and the value to do so at
+        self.variables = variable_table.VariableTable()
+        # original (dotted) names per row of the table, to resolve patterns of the YAML config file against
+        self.original_names = []
+        for variable in self.model_description.modelVariables:
+            # correct non-alphanumeric tags
+            original_name = variable.name
+            clean_name = model_reader.clean_name(variable.name)
             if clean_name != variable.name:
                 log = "Sim variable '{}' has been renamed to '{}' ".format(variable.name, clean_name)
                 log += "to comply with Bonsai naming requirements."
-                print(log)
-            self.model_description.modelVariables[i].name = clean_name
+                validator_logger.info(log)
+                variable.name = clean_name
+
+            # extract key attributes per variable
+            var_idx = variable.valueReference #, variable.causality
+            var_name = variable.name
+            var_type = variable.type
+            var_start = variable.start
+            var_shape = tuple(getattr(variable, "shape", None) or ())
+
+            # collect type reference (enumerations are exchanged as their integer codes)
+            if var_type not in variable_table.FMI_TYPES_TO_TYPE_F:
+                validator_logger.warning(f"Variable '{var_name}' will be skipped. FMU connector cannot currently handle vars of type '{var_type}'.")
+                continue
+            if len(var_shape) > 0 and var_type != "Float64":
+                validator_logger.warning(f"Variable '{var_name}' will be skipped. FMU connector can only handle array vars of type 'Float64'.")
+                continue
+
+            # cast start value prior to storing (arrays are stored as flat tuples)
+            if var_start is not None:
+                if len(var_shape) > 0:
+                    var_start = arrays.parse_start_value(var_start, var_shape)
+                else:
+                    var_start = cast_start_value(variable_table.FMI_TYPES_TO_TYPE_F[var_type], var_start)
+
+            self.variables.append(var_name, var_idx, var_type, variable.causality, variable.variability, var_start, var_shape)
+            self.original_names.append(original_name)
+        self.variables.freeze()
+
+        # name-based views over the table
+        self.vars_to_idx = self.variables.value_references
+        self.vars_to_type_f = self.variables.types_f
+        self.vars_to_fmi_type = self.variables.fmi_types
+        self.vars_to_shape = self.variables.shapes
+        self.vars_to_ini_vals = self.variables.start_values
 
         return
 
@@ -506,6 +777,14 @@ class FMUConnector:
         user_validation: bool = False,
         use_unzipped_model: bool = False,
         fmi_logging: bool = False,
+        model_description = None,
+        fmu_factory = None,
+        prefer_optimized_build: bool = True,
+        me_solver: str = "rk45",
+        me_relative_tolerance: float = 1e-5,
+        me_max_step: float = None,
+        stream_model_description: bool = True,
+        variable_causalities: List[str] = None,
     ):
         """Template for simulating FMU models for Bonsai integration.
 
@@ -527,26 +806,75 @@ class FMUConnector:
             If True, model unzipping is not performed and unzipped version of the model
             is used. Useful to test changes to unzipped FMI model.
               Note, unzipping is performed if unzipped version is not found.
+        model_description: ModelDescription
+            If given, it is used instead of reading the description from the FMU file.
+        fmu_factory: callable
+            If given, it is used to create the FMU instance instead of fmpy, with the same
+            keyword arguments (guid, unzipDirectory, modelIdentifier, instanceName).
+            E.g: synthetic_fmu.synthetic_fmu_factory, for testing without vendor binaries.
+        prefer_optimized_build: bool
+            If True, binaries are loaded from the optimized copy of the model built by
+            fmu_build.py (if one exists and is up to date), instead of the FMU file itself.
+        me_solver: str
+            Solver used to integrate modelExchange models (see me_engine.SOLVERS):
+            "euler", "rk4", "rk45" (adaptive), or "cvode".
+        me_relative_tolerance: float
+            Relative tolerance of adaptive solvers for modelExchange models.
+        me_max_step: float
+            Maximum internal step size for modelExchange models (internal step size for
+            fixed step solvers). Defaults to one internal step per (sub)step.
+        stream_model_description: bool
+            If True, the model description is read in a single pass, keeping only the variables
+            selected in the YAML config file (if any), see model_reader.py.
+        variable_causalities: List[str]
+            If given, only variables with these causalities are read from the model description
+            (e.g: ["parameter", "input", "output"] to drop locals of very large models).
         """
 
         self.fmi_logging = fmi_logging
 
         # validate simulation: config_vars (optional), inputs, and outputs
-        validated_sim = FMUSimValidation(model_filepath, user_validation)
+        validated_sim = FMUSimValidation(model_filepath, user_validation, model_description,
+                                         stream_model_description, variable_causalities)
         
         # extract validated sim configuration
         self.model_filepath = validated_sim.model_filepath
         self.sim_config_filepath = validated_sim.sim_config_filepath
-        self.model_description = validated_sim.model_description
+        # the per-variable objects of the model description are not kept (the variable table holds what is used)
+        self.model_description = copy.copy(validated_sim.model_description)
+        self.model_description.modelVariables = []
+        self.model_description.typeDefinitions = []
         # model variable names structured per type (config, inputs/brain actions, outputs/brain states)
         self.sim_config_params = validated_sim.sim_config_params
         self.sim_inputs = validated_sim.sim_inputs
         self.sim_outputs = validated_sim.sim_outputs
         self.sim_other_vars = validated_sim.sim_other_vars
-        # model variable dictionaries with
+        self.sim_calibration = validated_sim.sim_calibration
+        self.sim_aggregation = validated_sim.sim_aggregation
+        self.sim_terminal = validated_sim.sim_terminal
+        self.sim_transforms = validated_sim.sim_transforms
+        # columnar table of model variables, and name-based views over it (see variable_table.py)
+        self.variables = validated_sim.variables
         self.vars_to_idx = validated_sim.vars_to_idx
         self.vars_to_type_f = validated_sim.vars_to_type_f
+        self.vars_to_fmi_type = validated_sim.vars_to_fmi_type
+        self.vars_to_shape = validated_sim.vars_to_shape
         self.vars_to_ini_vals = validated_sim.vars_to_ini_vals
+        self.array_mode = validated_sim.sim_array_mode
+
+        # declarative transforms of states and actions, compiled once per episode (see transform_pipeline.py)
+        self.state_pipeline = transform_pipeline.TransformPipeline(self.sim_transforms.get("state"))
+        self.action_pipeline = transform_pipeline.TransformPipeline(self.sim_transforms.get("action"))
+
+        # fields of the state sent to the brain (see set_state_projection), None to send every state variable
+        self.state_projection = None
+        self.state_var_names = None
+        self.projected_state_var_names = None
+        if validated_sim.sim_state_projection:
+            projection = validated_sim.sim_state_projection
+            if isinstance(projection, str):
+                projection = read_interface_state_fields(projection)
+            self.set_state_projection(projection)
 
         # get parent directory and model name (without .fmu)
         aux_head_and_tail_tup = os.path.split(self.model_filepath)
@@ -557,17 +885,30 @@ class FMUConnector:
         # also prevents calling self.fmu.terminate() if initialization hasn't occurred or termination has already been applied
         self._is_initialized = False
         self._is_instantiated = False
+
+        # value references partitioned per type, cached per list of variable names (see _get_access_plan)
+        self._access_plans = {}
+
+        # values read since the last step, served from memory until the model changes (see _get_variables)
+        self._read_cache = {}
+        self.read_cache_stats = {"hits": 0, "misses": 0}
+
+        # speculative reset prepared in the background between episodes (see prepare_reset)
+        self._speculative_reset = None
+        self._recent_configs = collections.deque(maxlen=20)
+        self._last_states = {}
+        self.speculative_reset_stats = {"hits": 0, "misses": 0, "saved_s": 0.0}
         
         # get FMI version
         read_fmi_version = self.model_description.fmiVersion
         if read_fmi_version in ["1.0", "2.0", "3.0"]:
             # Use fmi version from model_description
-            print(f"[FMU Connector] FMU model indicates to be follow fmi version '{read_fmi_version}'.")
+            logger.info(f"[FMU Connector] FMU model indicates to be follow fmi version '{read_fmi_version}'.")
             self.fmi_version = read_fmi_version
         else:
             assert fmi_version in ["1.0", "2.0", "3.0"], f"fmi version provided ({fmi_version}) is invalid."
             # Use fmi version provided by user if the one on model_description is invalid
-            print(f"[FMU Connector] Using fmi version provided by user: v'{fmi_version}'. Model indicates v'{read_fmi_version}' instead.")
+            logger.warning(f"[FMU Connector] Using fmi version provided by user: v'{fmi_version}'. Model indicates v'{read_fmi_version}' instead.")
             self.fmi_version = fmi_version
 
         # default time settings
@@ -584,6 +925,11 @@ class FMUConnector:
             if self.model_description.defaultExperiment.stepSize != None:
                 self.step_size = self.model_description.defaultExperiment.stepSize
 
+        # override step size if the model has been calibrated offline (see generic/calibrate.py)
+        if 'FMU_step_size' in self.sim_calibration:
+            self.step_size = self.sim_calibration['FMU_step_size']
+            logger.info(f"[FMU Connector] Using calibrated step size {self.step_size} from '{self.sim_config_filepath}'")
+
         # save time-related data
         error_log = "Stop time provided ({}) is lower than start time provided ({})".format(self.stop_time, self.start_time)
         assert self.stop_time > self.start_time, error_log
@@ -591,13 +937,38 @@ class FMUConnector:
         error_log += "stop and start times, ({}) and ({}), respectively".format(self.stop_time, self.start_time)
         assert self.step_size <= self.stop_time-self.start_time, error_log
 
-        print(f"[FMU Connector] Step size {self.step_size}, Start time {self.start_time}, Stop time {self.stop_time if self.stop_time < sys.float_info.max else 'NEVER'}'.")
+        logger.info(f"[FMU Connector] Step size {self.step_size}, Start time {self.start_time}, Stop time {self.stop_time if self.stop_time < sys.float_info.max else 'NEVER'}'.")
 
         # set current time to start time
         self.sim_time = float(self.start_time)
 
         self.error_occurred = False
 
+        # adaptive substep settings (see reset), and substep counters of the last step
+        self.adaptive_substep = False
+        self.substeps_taken = 0
+        self.substeps_rejected = 0
+
+        # rollback settings on failed substeps (see reset), and recovery telemetry of the last step
+        self.max_retries = 0
+        self.retries = 0
+        self.recovery_time = 0.0
+
+        # action hold settings (see reset), with the window of outputs sampled while the action is held
+        self.action_repeat = 1
+        self.action_repeat_reduction = "last"
+        self.held_window = None
+
+        # reductions of outputs over substeps (see reset), with the window of outputs sampled after each substep
+        self.substep_window = None
+
+        # terminal conditions compiled from the YAML config file, checked after each step (see halted)
+        # (any numeric scalar variable: Real, Integer, Boolean... of any fmi version)
+        numeric_vars_to_idx = {name: idx for name, idx in self.vars_to_idx.items()
+                               if self.vars_to_type_f[name] in (float, int, bool) and name not in self.vars_to_shape}
+        self.terminal = terminal.TerminalConditions(self.sim_terminal, numeric_vars_to_idx, self.stop_time)
+        self.terminal_reason = None
+
         self.transform = transform.Transform({})
 
         # retrieve FMU model type, as well as model identifier
@@ -623,9 +994,26 @@ class FMUConnector:
         
         # extract the FMU
         extract_path = os.path.join(self.model_dir, self.model_name + "_unzipped")
-        if not use_unzipped_model:
+        if fmu_factory is not None:
+            # no binaries are loaded from the FMU file when the instance is created by a factory
+            self.unzipdir = None
+        elif not use_unzipped_model:
             # extract model to subfolder by default
-            self.unzipdir = extract(self.model_filepath, unzipdir=extract_path)
+            # - prefer the cached optimized build (see fmu_build.py), if any
+            binaries_filepath = self.model_filepath
+            if prefer_optimized_build:
+                optimized_filepath = fmu_build.find_optimized_fmu(self.model_filepath)
+                if optimized_filepath is not None:
+                    logger.info(f"[FMU Connector] Using optimized build of the model: '{optimized_filepath}'.")
+                    binaries_filepath = optimized_filepath
+            extraction = (os.path.abspath(binaries_filepath), os.path.getmtime(binaries_filepath))
+            extracted = _extracted_models.get(extract_path)
+            if extracted is not None and extracted["extraction"] == extraction and extracted["instances"] > 0:
+                self.unzipdir = extract_path
+                extracted["instances"] += 1
+            else:
+                self.unzipdir = extract(binaries_filepath, unzipdir=extract_path)
+                _extracted_models[extract_path] = {"extraction": extraction, "instances": 1}
         else:
             # use previouslly unzipped model
             self.unzipdir = extract_path
@@ -637,10 +1025,16 @@ class FMUConnector:
         # ---------------------------------------------------------------
         # instance model depending on 'fmi version' and 'fmu model type'
         self.fmu = None
-        print(f"[FMU Connector] Model has been determined to be of type '{self.model_type}' with fmi version == '{self.fmi_version}'.")
-        if self.model_type == "modelExchange":
+        logger.info(f"[FMU Connector] Model has been determined to be of type '{self.model_type}' with fmi version == '{self.fmi_version}'.")
+        if fmu_factory is not None:
+            logger.info(f"[FMU Connector] Instancing model through the provided FMU factory.")
+            self.fmu = fmu_factory(guid=self.model_description.guid,
+                                   unzipDirectory=self.unzipdir,
+                                   modelIdentifier=self.model_identifier,
+                                   instanceName=self.instance_name)
+        elif self.model_type == "modelExchange":
             ## [TODO] test integrations
-            print(f"[FMU Connector] Simulator hasn't been tested for '{self.model_type}' models with fmi version == '{self.fmi_version}'.")
+            logger.warning(f"[FMU Connector] Simulator hasn't been tested for '{self.model_type}' models with fmi version == '{self.fmi_version}'.")
             if self.fmi_version == "1.0":
                 self.fmu = fmi1.FMU1Model(guid=self.model_description.guid,
                                           unzipDirectory=self.unzipdir,
@@ -659,7 +1053,7 @@ class FMUConnector:
         elif self.model_type == "coSimulation":
             if self.fmi_version == "1.0":
                 ## [TODO] test integrations
-                print(f"[FMU Connector] Simulator hasn't been tested for '{self.model_type}' models with fmi version == '{self.fmi_version}'.")
+                logger.warning(f"[FMU Connector] Simulator hasn't been tested for '{self.model_type}' models with fmi version == '{self.fmi_version}'.")
                 self.fmu = fmi1.FMU1Slave(guid=self.model_description.guid,
                                           unzipDirectory=self.unzipdir,
                                           modelIdentifier=self.model_identifier,
@@ -671,7 +1065,7 @@ class FMUConnector:
                                           instanceName=self.instance_name)
             elif self.fmi_version == "3.0":
                 ## [TODO] test integrations
-                print(f"[FMU Connector] Simulator hasn't been tested for '{self.model_type}' models with fmi version == '{self.fmi_version}'.")
+                logger.warning(f"[FMU Connector] Simulator hasn't been tested for '{self.model_type}' models with fmi version == '{self.fmi_version}'.")
                 self.fmu = fmi3.FMU3Slave(guid=self.model_description.guid,
                                           unzipDirectory=self.unzipdir,
                                           modelIdentifier=self.model_identifier,
@@ -680,7 +1074,7 @@ class FMUConnector:
             if self.fmi_version == "1.0" or self.fmi_version == "2.0":
                 raise Exception("scheduledExecution type only exists in fmi v'3.0', but fmi version '{}' was provided.".format(self.fmi_version))
             
-            print(f"[FMU Connector] Simulator hasn't been tested for '{self.model_type}' models with fmi version == '{self.fmi_version}'.")
+            logger.warning(f"[FMU Connector] Simulator hasn't been tested for '{self.model_type}' models with fmi version == '{self.fmi_version}'.")
             ## [TODO] test integrations
             #elif self.fmi_version_int == 3:
             self.fmu = fmi3.FMU3ScheduledExecution(guid=self.model_description.guid,
@@ -689,6 +1083,34 @@ class FMUConnector:
                                                    instanceName=self.instance_name)
         
         
+        # modelExchange models are integrated by the connector itself
+        self.me_stepper = None
+        if self.model_type == "modelExchange":
+            if self.fmi_version != "2.0":
+                raise Exception(f"modelExchange models are only supported for fmi version '2.0', but '{self.fmi_version}' was provided.")
+            logger.info(f"[FMU Connector] Integrating modelExchange model with solver '{me_solver}'.")
+            self.me_stepper = me_engine.ModelExchangeStepper(self.fmu,
+                                                             self.model_description,
+                                                             solver=me_solver,
+                                                             relative_tolerance=me_relative_tolerance,
+                                                             max_step=me_max_step)
+
+        # array variables (fmi v'3.0') are exchanged through a single buffer, with a view per variable
+        self.arrays = None
+        self.array_elements = {}
+        if self.vars_to_shape:
+            array_names = list(self.vars_to_shape.keys())
+            self.arrays = arrays.ArrayVariables(array_names,
+                                                [self.vars_to_idx[name] for name in array_names],
+                                                [self.vars_to_shape[name] for name in array_names])
+            self.arrays.bind(self.fmu)
+            # elements of the arrays as individual variables when flattened ({name}_{i} --> (name, i))
+            if self.array_mode == "flattened":
+                for name in array_names:
+                    for i, flat_name in enumerate(arrays.get_flat_names(name, self.vars_to_shape[name])):
+                        self.array_elements[flat_name] = (name, i)
+            logger.info(f"[FMU Connector] Exchanging {len(array_names)} array variable(s) as '{self.array_mode}' arrays.")
+
         # ---------------------------------------------------------------
         return
 
@@ -697,12 +1119,33 @@ class FMUConnector:
         """
         self._is_initialized = True
 
+        self._reset_instance()
+        self._configure_episode_options(config_param_vals)
+
+        self._setup_experiment()
+        if config_param_vals is not None:
+            self._apply_config(config_param_vals)
+        self._initialize_instance()
+        self._read_cache.clear()
+
+        return
+
+
+    def _reset_instance(self):
+        """Instantiate the model the first time, and reset the instance afterwards.
+        """
+
         if (self._is_instantiated is False):
             self.fmu.instantiate()
             self._is_instantiated = True
         else:
             self.fmu.reset()
 
+
+    def _configure_episode_options(self, config_param_vals = None):
+        """Set the connector options given by reserved variables of the config (logging, state contents).
+        """
+
         config_logging_value = 0
         self.state_includes_config = False
         self.state_includes_action = False
@@ -714,15 +1157,31 @@ class FMUConnector:
              self.state_includes_other = config_param_vals.get("FMU_state_includes_other", 0) != 0
 
         self.state_var_names = None
+        self.projected_state_var_names = None
 
         self.episode_fmi_logging = self.fmi_logging or config_logging_value != 0
         self.fmu.fmiCallLogger = fmi_call_logger if self.episode_fmi_logging else None
 
-        self.fmu.setupExperiment(startTime=self.start_time)
-        if config_param_vals is not None:
-            self._apply_config(config_param_vals)
-        self.fmu.enterInitializationMode()
+
+    def _setup_experiment(self):
+        """Set the start time of the experiment (given at initialization instead in fmi v'3.0').
+        """
+
+        if self.fmi_version != "3.0":
+            self.fmu.setupExperiment(startTime=self.start_time)
+
+
+    def _initialize_instance(self):
+        """Run the initialization of the model, once the config has been applied.
+        """
+
+        if self.fmi_version == "3.0":
+            self.fmu.enterInitializationMode(startTime=self.start_time)
+        else:
+            self.fmu.enterInitializationMode()
         self.fmu.exitInitializationMode()
+        if self.me_stepper is not None:
+            self.me_stepper.initialize(self.start_time)
 
         return
 
@@ -734,38 +1193,243 @@ class FMUConnector:
         # Ensure model has been initialized at least once
         self._model_has_been_initialized("run_step")
 
-        # Check if sim is steady-state (doesn't contain "doStep" method)
-        if  "doStep" not in dir(self.fmu):
+        # Check if sim is steady-state (doesn't contain "doStep" method, nor is integrated by the connector)
+        if self.me_stepper is None and "doStep" not in dir(self.fmu):
             error_log  = "[run_step] FMU model cannot be run one step-forward, since it is a steady-state sim. "
             error_log += "No step advance will be applied."
-            print(error_log)
+            logger.warning(error_log)
             return
 
-        print(f'  Step Size: {self.step_size:.3f}, Substep Size {self.substep_size:.3f}')
+        self._start_step()
 
         # [TODO] Consider potential float precision issues with this code that may occur when sim_time grows to large values.
 
-        # Step forward in sim by step_size.
-        next_sim_time = self.sim_time + self.step_size
-
         # We may need to take multiple smaller steps of size substep_size.
         # Due to precision issues, we may not reach next_sim_time exactly. In order to avoid taking a very small final step,
         # stop when we are within a small fraction of the substep size.
         stop_tolerance = self.substep_size * 0.001
+        if self.adaptive_substep:
+            stop_tolerance = min(stop_tolerance, self.substep_min * 0.001)
+        next_step_size = self.substep_size
         try:
-            while self.sim_time + stop_tolerance < next_sim_time:
-                next_step_size = min(self.substep_size, next_sim_time - self.sim_time)
-                if self.episode_fmi_logging:
-                    print(f'    doStep({self.sim_time:.3f}, {next_step_size:.3f})', flush=True)
-
-                self.fmu.doStep(currentCommunicationPoint=self.sim_time, communicationStepSize=next_step_size)
-                self.sim_time += next_step_size
+            # The brain action is held for 'FMU_action_repeat' steps per Bonsai iteration
+            for _ in range(self.action_repeat):
+                # Step forward in sim by step_size.
+                next_sim_time = self.sim_time + self.step_size
+
+                while self.sim_time + stop_tolerance < next_sim_time:
+                    if self.max_retries > 0:
+                        # failed substeps are rolled back and retried with smaller substeps
+                        next_step_size = self._do_substep_with_retries(next_sim_time - self.sim_time)
+                    else:
+                        next_step_size = self._do_substep(next_sim_time - self.sim_time)
+                    self.sim_time += next_step_size
+                    self.substeps_taken += 1
+
+                    # Sample the aggregated outputs after each substep (into preallocated buffers)
+                    if self.substep_window is not None:
+                        self.substep_window.append(self.sim_time, self.substep_reader())
+
+                # Sample the outputs at the fine (step_size) rate to aggregate them over the held window
+                if self.held_window is not None:
+                    self.held_window.append(self.sim_time, self._get_values(self.held_output_names)[1])
         except Exception as err:
-            print(f"Error: doStep({self.sim_time:.3f}, {next_step_size:.3f}): {err}")
+            logger.error(f"Error: doStep({self.sim_time:.3f}, {next_step_size:.3f}): {err}")
             self.error_occurred = True
 
+        self._finish_step()
         return
 
+
+    def _start_step(self):
+        """Start a step: invalidate the values read, reset the per-step counters, and start the aggregation windows.
+        """
+
+        # Values read before the step are outdated
+        self._read_cache.clear()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'  Step Size: {self.step_size:.3f}, Substep Size {self.substep_size:.3f}, Action Repeat {self.action_repeat}')
+
+        self._reset_step_counters()
+        if self.held_window is not None:
+            self.held_window.start(self.sim_time, self._get_values(self.held_output_names)[1])
+        if self.substep_window is not None:
+            self.substep_window.start(self.sim_time, self.substep_reader())
+
+
+    def _reset_step_counters(self):
+        """Reset the substeps and retries reported for the last step.
+        """
+
+        self.substeps_taken = 0
+        self.substeps_rejected = 0
+        self.retries = 0
+        self.recovery_time = 0.0
+
+
+    def _finish_step(self):
+        """Finish a step: report recoveries, and evaluate the terminal conditions.
+        """
+
+        if self.retries > 0 and not self.error_occurred:
+            logger.info(f"[FMU Connector] Recovered from failed substep(s) after {self.retries} retries ({self.recovery_time:.3f}s).")
+
+        # Evaluate terminal conditions, so diverged simulations are halted at the simulator side
+        if not self.error_occurred and not self.terminal.is_empty():
+            self.terminal_reason = self.terminal.evaluate(self.sim_time)
+            if self.terminal_reason is not None:
+                logger.info(f"[FMU Connector] Terminal condition reached: {self.terminal_reason}.")
+
+
+    def halted(self):
+        """Check whether the simulation cannot continue: an error occurred, or a terminal condition has been reached.
+        """
+
+        return self.error_occurred or self.terminal_reason is not None
+
+
+    def _do_substep(self, max_step_size: float, no_set_state_prior: bool = True):
+        """Take a single substep (at most 'max_step_size' long).
+            Returns the size of the substep taken.
+        """
+
+        if self.adaptive_substep:
+            # substep size is chosen based on the estimated local error
+            return self._do_adaptive_step(max_step_size, no_set_state_prior)
+
+        step_size = min(self.substep_size, max_step_size)
+        if self.episode_fmi_logging:
+            fmi_logger.info(f'    doStep({self.sim_time:.3f}, {step_size:.3f})', extra={"rate_limit": False})
+
+        self._do_step(self.sim_time, step_size, no_set_state_prior)
+        return step_size
+
+
+    def _do_substep_with_retries(self, max_step_size: float):
+        """Take a single substep, rolling the model back to its state prior to the substep if it fails.
+            The substep is then retried as 2, 4, 8... smaller substeps, up to 'FMU_max_retries' times.
+            Returns the size of the substep taken, or raises the last error if every retry fails.
+        """
+
+        fmu_state = self.fmu.getFMUstate()
+        try:
+            try:
+                return self._do_substep(max_step_size, no_set_state_prior=False)
+            except Exception as err:
+                last_error = err
+
+            tic = time.perf_counter()
+            step_size = min(self.adaptive_substep_size if self.adaptive_substep else self.substep_size, max_step_size)
+            for retry in range(1, self.max_retries + 1):
+                self.retries += 1
+                self.fmu.setFMUstate(fmu_state)
+                n_splits = 2 ** retry
+                split_size = step_size / n_splits
+                if self.episode_fmi_logging:
+                    fmi_logger.info(f'    retry {retry}: {n_splits} x doStep({self.sim_time:.3f}, {split_size:.3f})', extra={"rate_limit": False})
+                try:
+                    for i in range(n_splits):
+                        self._do_step(self.sim_time + i * split_size, split_size, no_set_state_prior=False)
+                except Exception as err:
+                    last_error = err
+                    continue
+
+                if self.adaptive_substep:
+                    # continue with the substep size that succeeded
+                    self.adaptive_substep_size = max(self.substep_min, split_size)
+                self.recovery_time += time.perf_counter() - tic
+                return step_size
+
+            self.recovery_time += time.perf_counter() - tic
+            raise last_error
+        finally:
+            self.fmu.freeFMUstate(fmu_state)
+
+
+    def _do_step(self, current_time: float, step_size: float, no_set_state_prior: bool = True):
+        """Advance the FMU a single (sub)step, integrating modelExchange models when needed.
+        """
+
+        if self.me_stepper is not None:
+            self.me_stepper.do_step(current_time, step_size)
+        elif no_set_state_prior:
+            self.fmu.doStep(currentCommunicationPoint=current_time, communicationStepSize=step_size)
+        else:
+            # the state may be set back to a previous point (e.g: when the step is rejected)
+            self.fmu.doStep(currentCommunicationPoint=current_time,
+                            communicationStepSize=step_size,
+                            noSetFMUStatePriorToCurrentPoint=False)
+
+
+    def _do_adaptive_step(self, max_step_size: float, no_set_state_prior: bool = True):
+        """Take a single error-controlled substep (at most 'max_step_size' long).
+            Returns the size of the substep taken.
+
+            If the model can get/set its state, the local error is estimated by step doubling
+            (one full step vs two half steps) and substeps exceeding the tolerance are rejected
+            and retaken. Otherwise, the (relative) change of the outputs over the substep is
+            monitored against the tolerance, and only the size of the following substep is adapted.
+        """
+
+        step_size = min(self.adaptive_substep_size, max_step_size)
+
+        while True:
+            if self.adaptive_substep_rollback:
+                # the state is freed even if a call fails mid-substep
+                fmu_state = self.fmu.getFMUstate()
+                try:
+                    self._do_step(self.sim_time, step_size, no_set_state_prior=False)
+                    full_step_outputs = self._get_monitored_outputs()
+                    self.fmu.setFMUstate(fmu_state)
+                    self._do_step(self.sim_time, step_size / 2, no_set_state_prior=False)
+                    self._do_step(self.sim_time + step_size / 2, step_size / 2, no_set_state_prior=False)
+                    outputs = self._get_monitored_outputs()
+                    error_norm = self._get_error_norm(full_step_outputs, outputs)
+
+                    if error_norm > 1.0 and step_size > self.substep_min:
+                        # reject substep, and retake it with a smaller size
+                        self.fmu.setFMUstate(fmu_state)
+                        self.substeps_rejected += 1
+                        step_size = max(self.substep_min, step_size * max(0.2, 0.9 * error_norm ** -0.5))
+                        continue
+                finally:
+                    self.fmu.freeFMUstate(fmu_state)
+            else:
+                previous_outputs = self._get_monitored_outputs()
+                self._do_step(self.sim_time, step_size, no_set_state_prior)
+                outputs = self._get_monitored_outputs()
+                error_norm = self._get_error_norm(previous_outputs, outputs)
+
+            # propose size for the following substep (kept within bounds)
+            factor = 2.0 if error_norm == 0 else min(2.0, max(0.2, 0.9 * error_norm ** -0.5))
+            next_step_size = step_size * factor
+            # avoid shrinking the proposal just because the substep was cut by the end of the step
+            if step_size < max_step_size or factor < 1.0:
+                self.adaptive_substep_size = min(self.substep_max, max(self.substep_min, next_step_size))
+
+            if self.episode_fmi_logging:
+                fmi_logger.info(f'    adaptive doStep({self.sim_time:.3f}, {step_size:.3f}), error norm {error_norm:.3f}', extra={"rate_limit": False})
+            return step_size
+
+
+    def _get_monitored_outputs(self):
+        """Get the values of the (Real) outputs monitored by the adaptive substep mode.
+        """
+
+        return np.array(self.fmu.getReal(self.monitored_output_vrs), dtype=np.float64)
+
+
+    def _get_error_norm(self, reference: np.ndarray, values: np.ndarray):
+        """Get the max-norm of the difference between two sets of outputs, scaled by the tolerance.
+            Values below 1 are within tolerance.
+        """
+
+        if len(values) == 0:
+            return 0.0
+        scale = self.substep_tolerance * np.maximum(1.0, np.maximum(np.abs(reference), np.abs(values)))
+        return float(np.max(np.abs(values - reference) / scale))
+
     
     def reset(self, config_param_vals: Dict[str, Any] = None):
         """Reset model with new config (if given).
@@ -774,31 +1438,335 @@ class FMUConnector:
         # Ensure model has been initialized at least once
         self._model_has_been_initialized("reset")
 
-        # Terminate and re-initialize
-        self.initialize_model(config_param_vals)
+        # Terminate and re-initialize (reusing the speculative reset prepared in the background, if possible)
+        if not self._complete_speculative_reset(config_param_vals):
+            self.initialize_model(config_param_vals)
+        self._recent_configs.append(config_param_vals or {})
+        self._read_cache.clear()
         
         # Reset time
         self.sim_time = float(self.start_time)
         
         self.error_occurred = False
+        self.terminal_reason = None
+        # (substeps and retries are reported for the last step, none yet)
+        self._reset_step_counters()
+        self.terminal.bind(self._get_reader(self.terminal.var_names))
 
         self.transform = transform.Transform(config_param_vals)
+        self.state_pipeline.bind(config_param_vals)
+        self.action_pipeline.bind(config_param_vals)
         
         # The machine teacher can specify the time step size by setting the value of
         # 'FMU_step_size' in a lesson's SimConfig.
         if 'FMU_step_size' in config_param_vals:
             self.step_size = config_param_vals['FMU_step_size']
-            print(f"[FMU Connector] Using step size {self.step_size} from FMU_step_size value in SimConfig")
+            logger.debug(f"[FMU Connector] Using step size {self.step_size} from FMU_step_size value in SimConfig")
 
         if 'FMU_substep_size' in config_param_vals:
             self.substep_size = config_param_vals['FMU_substep_size']
-            print(f"[FMU Connector] Using substep size {self.substep_size} from FMU_substep_size value in SimConfig")
+            logger.debug(f"[FMU Connector] Using substep size {self.substep_size} from FMU_substep_size value in SimConfig")
+        elif 'FMU_substep_size' in self.sim_calibration:
+            # calibrated substep size, never larger than the (possibly overridden) step size
+            self.substep_size = min(self.sim_calibration['FMU_substep_size'], self.step_size)
         else:
             self.substep_size = self.step_size
 
+        # The machine teacher can let the connector adapt the substep size by setting
+        # 'FMU_adaptive_substep' in a lesson's SimConfig, bounded by 'FMU_substep_min/max'.
+        self.adaptive_substep = config_param_vals.get('FMU_adaptive_substep', 0) != 0
+        if self.adaptive_substep:
+            self._configure_adaptive_substep(config_param_vals)
+
+        # Failed substeps are rolled back and retried up to 'FMU_max_retries' times (0 disables it),
+        # as long as the model can get/set its state.
+        self.max_retries = int(config_param_vals.get('FMU_max_retries', 3))
+        if self.max_retries > 0 and not self.can_snapshot():
+            if 'FMU_max_retries' in config_param_vals:
+                logger.warning("[FMU Connector] FMU_max_retries is ignored: model cannot get/set its state to roll back failed substeps.")
+            self.max_retries = 0
+
+        # The machine teacher can hold each brain action for several steps by setting 'FMU_action_repeat',
+        # and aggregate the outputs sampled over the held window with 'FMU_action_repeat_reduction'.
+        self.action_repeat = max(1, int(config_param_vals.get('FMU_action_repeat', 1)))
+        self.action_repeat_reduction = aggregation.get_reduction(config_param_vals.get('FMU_action_repeat_reduction', "last"))
+        self._configure_held_window()
+
+        # Reductions of outputs over substeps are enabled by the "aggregation" section of the YAML config file
+        self._configure_substep_window()
+
         return
 
-    
+
+    def prepare_reset(self):
+        """Speculatively reset the model in the background (e.g: on EpisodeFinish or Idle events),
+            with the most frequent recent config (or defaults). Applying the config and initializing the model
+            are then left for 'reset', which only writes the values that differ from the predicted config.
+
+            Until 'reset' is called, get_states returns the last states.
+        """
+
+        self._model_has_been_initialized("prepare_reset")
+        if self._speculative_reset is not None:
+            return
+
+        config_param_vals = self._predict_config()
+        self._speculative_reset = {"config": config_param_vals, "prepare_s": 0.0, "error": None}
+        self._speculative_reset["thread"] = threading.Thread(target=self._run_speculative_reset, daemon=True)
+        self._speculative_reset["thread"].start()
+
+
+    def _predict_config(self):
+        """Predict the config of the following episode: the most frequent of the recent configs, or defaults.
+        """
+
+        if not self._recent_configs:
+            return {}
+
+        counts = collections.Counter(json.dumps(config, sort_keys=True, default=str) for config in self._recent_configs)
+        most_frequent = counts.most_common(1)[0][0]
+        for config in reversed(self._recent_configs):
+            if json.dumps(config, sort_keys=True, default=str) == most_frequent:
+                return dict(config)
+
+
+    def _run_speculative_reset(self):
+        """Reset the instance and apply the predicted config (run in a background thread).
+        """
+
+        tic = time.perf_counter()
+        try:
+            self._reset_instance()
+            self._setup_experiment()
+            config_param_vals = self._speculative_reset["config"]
+            if config_param_vals:
+                self._apply_config(config_param_vals)
+        except Exception as err:
+            self._speculative_reset["error"] = err
+        self._speculative_reset["prepare_s"] = time.perf_counter() - tic
+
+
+    def _complete_speculative_reset(self, config_param_vals: Dict[str, Any] = None):
+        """Complete the speculative reset (if any) for the given config, applying only the values that differ
+            from the predicted config before initializing the model.
+
+            Returns False if there was no speculative reset or it cannot be reused (the model must be fully reset).
+        """
+
+        if self._speculative_reset is None:
+            return False
+
+        speculative_reset = self._speculative_reset
+        speculative_reset["thread"].join()
+        self._speculative_reset = None
+
+        tic = time.perf_counter()
+        writes = None
+        if speculative_reset["error"] is None:
+            writes = self._get_config_writes(self._get_applied_values(speculative_reset["config"]),
+                                             self._get_applied_values(config_param_vals))
+        if writes is None:
+            self.speculative_reset_stats["misses"] += 1
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"[FMU Connector] Speculative reset miss: {self._get_speculative_reset_summary()}")
+            return False
+
+        self._is_initialized = True
+        self._configure_episode_options(config_param_vals)
+        self._set_variables(writes)
+        self._initialize_instance()
+
+        saved_s = max(0.0, speculative_reset["prepare_s"] - (time.perf_counter() - tic))
+        self.speculative_reset_stats["hits"] += 1
+        self.speculative_reset_stats["saved_s"] += saved_s
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[FMU Connector] Speculative reset hit ({len(writes)} values applied, {1000 * saved_s:.1f} ms saved): {self._get_speculative_reset_summary()}")
+        return True
+
+
+    def _get_applied_values(self, config_param_vals: Dict[str, Any] = None):
+        """Get the model values set by applying the given config after a reset (cast to their types).
+            Every other variable holds its start value (see self.vars_to_ini_vals).
+        """
+
+        applied_values = {}
+        if config_param_vals:
+            applied_values.update({name: self.vars_to_type_f[name](value) for name, value in config_param_vals.items()
+                                   if name in self.vars_to_idx and name not in self.vars_to_shape})
+            # arrays are compared as flat tuples
+            if self.vars_to_shape:
+                for name, value in self._get_array_values(config_param_vals, self.vars_to_ini_vals).items():
+                    applied_values[name] = tuple(float(v) for v in np.asarray(value, dtype=np.float64).reshape(-1))
+        return applied_values
+
+
+    def _get_config_writes(self, applied_values: Dict[str, Any], required_values: Dict[str, Any]):
+        """Get the values to write to go from the applied values to the required values (both over start values).
+            Returns None if some applied value cannot be reverted (its start value is unknown).
+        """
+
+        writes = {}
+        for name, value in applied_values.items():
+            if name in required_values:
+                continue
+            if name not in self.vars_to_ini_vals:
+                return None
+            if value != self.vars_to_ini_vals[name]:
+                writes[name] = self.vars_to_ini_vals[name]
+
+        for name, value in required_values.items():
+            if name in applied_values:
+                current_value = applied_values[name]
+            else:
+                current_value = self.vars_to_ini_vals.get(name)
+            if current_value is None or current_value != value:
+                writes[name] = value
+
+        return writes
+
+
+    def _get_speculative_reset_summary(self):
+        """Get a summary of the speculative reset hit rate, and latency saved.
+        """
+
+        hits = self.speculative_reset_stats["hits"]
+        total = hits + self.speculative_reset_stats["misses"]
+        return f"hit rate {hits}/{total} ({100 * hits / total:.0f}%), {self.speculative_reset_stats['saved_s']:.3f}s saved in total."
+
+
+    def _configure_substep_window(self):
+        """Set up the buffer of outputs sampled after each substep, for the reductions in the YAML config file.
+        """
+
+        self.substep_window = None
+        if not self.sim_aggregation:
+            return
+
+        self.substep_reductions = []
+        window_names = []
+        for var_name, reduction, threshold, state_name in aggregation.parse_output_reductions(self.sim_aggregation):
+            if self.vars_to_type_f.get(var_name) is not float or var_name in self.vars_to_shape:
+                logger.warning(f"[FMU Connector] Aggregation of '{var_name}' will be skipped. Only (scalar) variables of type 'Real' can be aggregated.")
+                continue
+            if var_name not in window_names:
+                window_names.append(var_name)
+            self.substep_reductions.append((window_names.index(var_name), reduction, threshold, state_name))
+
+        if not window_names:
+            return
+
+        # buffers are sized for the nominal number of substeps per Bonsai iteration (they grow if exceeded,
+        # e.g: when adaptive substeps get smaller than the nominal substep size)
+        capacity = self.action_repeat * int(np.ceil(self.step_size / self.substep_size - 1e-9))
+        self.substep_reader = self._get_reader(window_names)
+        self.substep_window = aggregation.OutputWindow(len(window_names), capacity)
+        logger.debug(f"[FMU Connector] Aggregating {window_names} over substeps: {[r[3] for r in self.substep_reductions]}.")
+
+
+    def _configure_held_window(self):
+        """Set up the buffer of outputs sampled while an action is held, if aggregation is needed.
+        """
+
+        if self.action_repeat_reduction == "last":
+            # last values are read at get_states already
+            self.held_window = None
+            return
+
+        self.held_output_names = [name for name in self.sim_outputs
+                                  if self.vars_to_type_f.get(name) in (float, int, bool) and name not in self.vars_to_shape]
+        self.held_window = aggregation.OutputWindow(len(self.held_output_names), self.action_repeat)
+        logger.debug(f"[FMU Connector] Holding actions for {self.action_repeat} steps, and reporting the {self.action_repeat_reduction} of outputs over the held window.")
+
+
+    def _configure_adaptive_substep(self, config_param_vals: Dict[str, Any]):
+        """Set up the adaptive substep mode, if the model supports it.
+        """
+
+        co_simulation = self.model_description.coSimulation
+        if self.me_stepper is not None:
+            logger.warning("[FMU Connector] FMU_adaptive_substep is ignored: modelExchange models are integrated with error control already.")
+            self.adaptive_substep = False
+            return
+        if co_simulation is None or not co_simulation.canHandleVariableCommunicationStepSize:
+            logger.warning("[FMU Connector] FMU_adaptive_substep is ignored: model cannot handle variable communication step sizes.")
+            self.adaptive_substep = False
+            return
+
+        self.substep_min = config_param_vals.get('FMU_substep_min', self.substep_size / 100)
+        self.substep_max = config_param_vals.get('FMU_substep_max', self.step_size)
+        self.substep_tolerance = config_param_vals.get('FMU_substep_tolerance', 1e-3)
+        self.adaptive_substep_size = min(self.substep_max, max(self.substep_min, self.substep_size))
+
+        # error is estimated by step doubling when the model state can be rolled back
+        # (fmi v'3.0' state handling is not supported by the rollback yet)
+        self.adaptive_substep_rollback = co_simulation.canGetAndSetFMUstate and self.fmi_version != "3.0"
+        monitored_outputs = [name for name in self.sim_outputs if self.vars_to_type_f.get(name) is float]
+        self.monitored_output_vrs, _ = self._var_names_to_indices(monitored_outputs)
+
+        mode = "step doubling" if self.adaptive_substep_rollback else "output monitoring"
+        logger.debug(f"[FMU Connector] Using adaptive substep ({mode}) within [{self.substep_min}, {self.substep_max}], tolerance {self.substep_tolerance}.")
+
+
+    def can_snapshot(self):
+        """Check whether the model can get/set its state (required by snapshots, and by the rollback of failed substeps).
+        """
+
+        co_simulation = self.model_description.coSimulation
+        return (self.me_stepper is None and co_simulation is not None and bool(co_simulation.canGetAndSetFMUstate)
+                and self.fmi_version != "3.0")
+
+
+    def save_snapshot(self):
+        """Save the current state of the simulation: the FMU state, and the time/status kept by the connector.
+            Returns a snapshot to restore with 'restore_snapshot' (any number of times), and release with 'free_snapshot'.
+        """
+
+        # Ensure model has been initialized at least once
+        self._model_has_been_initialized("save_snapshot")
+
+        if not self.can_snapshot():
+            raise Exception("Model cannot get/set its state: snapshots are not supported.")
+        if self._speculative_reset is not None:
+            raise Exception("A reset is being prepared for the next episode: snapshots cannot be saved until 'reset' is called.")
+
+        return {"fmu_state": self.fmu.getFMUstate(),
+                "sim_time": self.sim_time,
+                "step_size": self.step_size,
+                "error_occurred": self.error_occurred,
+                "terminal_reason": self.terminal_reason,
+                "adaptive_substep_size": getattr(self, "adaptive_substep_size", None)}
+
+
+    def restore_snapshot(self, snapshot: Dict[str, Any]):
+        """Restore the simulation to a snapshot saved with 'save_snapshot' (within the same episode options,
+            i.e: config-driven settings such as the substep size are those of the current episode).
+        """
+
+        # Ensure model has been initialized at least once
+        self._model_has_been_initialized("restore_snapshot")
+
+        # a reset prepared in the background is superseded by the snapshot
+        if self._speculative_reset is not None:
+            self._speculative_reset["thread"].join()
+            self._speculative_reset = None
+
+        self.fmu.setFMUstate(snapshot["fmu_state"])
+        self._read_cache.clear()
+        self.sim_time = snapshot["sim_time"]
+        self.step_size = snapshot["step_size"]
+        self.error_occurred = snapshot["error_occurred"]
+        self.terminal_reason = snapshot["terminal_reason"]
+        if snapshot["adaptive_substep_size"] is not None:
+            self.adaptive_substep_size = snapshot["adaptive_substep_size"]
+
+
+    def free_snapshot(self, snapshot: Dict[str, Any]):
+        """Release the FMU state held by a snapshot.
+        """
+
+        self.fmu.freeFMUstate(snapshot["fmu_state"])
+
+
     def close_model(self):
         """Close model and remove unzipped model from temporary folder.
         """
@@ -806,6 +1774,13 @@ class FMUConnector:
         # Ensure model has been initialized at least once
         self._model_has_been_initialized("close_model")
 
+        # wait for any speculative reset in progress, and complete it so the model can be terminated
+        if self._speculative_reset is not None:
+            self._speculative_reset["thread"].join()
+            if self._speculative_reset["error"] is None:
+                self._initialize_instance()
+            self._speculative_reset = None
+
         # terminate fmu model
         # - avoids error from calling self.fmu.terminate if termination has already been performed
         self._terminate_model()
@@ -817,7 +1792,12 @@ class FMUConnector:
             
         # clean up
         # [TODO] enforce clean up even when exceptions are thrown, or after keyboard interruption
-        shutil.rmtree(self.unzipdir, ignore_errors=True)
+        if self.unzipdir is not None:
+            extracted = _extracted_models.get(self.unzipdir)
+            if extracted is not None:
+                extracted["instances"] -= 1
+            if extracted is None or extracted["instances"] <= 0:
+                shutil.rmtree(self.unzipdir, ignore_errors=True)
         return
         
 
@@ -830,6 +1810,10 @@ class FMUConnector:
         # Ensure model has been initialized at least once
         self._model_has_been_initialized("get_states")
 
+        # The model is being reset in the background: keep reporting the last states until the episode starts
+        if self._speculative_reset is not None:
+            return dict(self._last_states)
+
         if sim_outputs is None:
             sim_outputs = self.sim_outputs
         elif not len(sim_outputs) > 0:
@@ -837,6 +1821,18 @@ class FMUConnector:
 
         states_dict = self._get_variables(sim_outputs)
 
+        # Replace outputs by their aggregation over the window the last action was held for
+        if self.held_window is not None and self.held_window.n > 1:
+            held_values = self.held_window.reduce(self.action_repeat_reduction)
+            for name, value in zip(self.held_output_names, held_values):
+                if name in states_dict:
+                    states_dict[name] = float(value)
+
+        # Add the reductions of outputs over the substeps of the last step
+        if self.substep_window is not None:
+            for index, reduction, threshold, state_name in self.substep_reductions:
+                states_dict[state_name] = float(self.substep_window.reduce(reduction, threshold)[index])
+
         # Add the current simulation time to the state. Brains don't have to use
         # this, but it is useful for analytics, particularly if FMU_step_size is
         # dynamically varied.
@@ -845,13 +1841,24 @@ class FMUConnector:
         # Set error state if an error occurred during the last step
         states_dict['FMU_error'] = 1 if self.error_occurred else 0
 
+        # Report the substeps taken/rejected during the last step
+        states_dict['FMU_substeps_taken'] = self.substeps_taken
+        states_dict['FMU_substeps_rejected'] = self.substeps_rejected
+
+        # Report the retries (and wall time) needed to recover from failed substeps during the last step
+        states_dict['FMU_retries'] = self.retries
+        states_dict['FMU_recovery_time'] = self.recovery_time
+
+        # Declared transforms first, then the user-overridable ones (closest to the brain)
+        states_dict = self.state_pipeline.transform(states_dict)
         states_dict = self.transform.transform_state(states_dict)
 
         # Check if more than one index has been found
         if not len(states_dict.keys()) > 0:
-            print("[get_states] No valid state names have been provided. No states are returned.")
+            logger.warning("[get_states] No valid state names have been provided. No states are returned.")
             return {}
 
+        self._last_states = states_dict
         return states_dict
 
     
@@ -867,7 +1874,7 @@ class FMUConnector:
 
         # Ensure action dict is not empty
         if not len(b_action_vals.items()) > 0:
-            print("[apply_actions] Provided action dict is empty. No action changes will be applied.")
+            logger.warning("[apply_actions] Provided action dict is empty. No action changes will be applied.")
             return False
         
         # The brain can specify a dynamically-adapting time step size by setting the value of
@@ -879,37 +1886,75 @@ class FMUConnector:
             self.step_size = b_action_vals['FMU_step_size']
             del b_action_vals['FMU_step_size']
 
+        # Similarly, the brain can choose for how many steps the action is held with 'FMU_action_repeat'.
+        if 'FMU_action_repeat' in b_action_vals:
+            self.action_repeat = max(1, int(b_action_vals['FMU_action_repeat']))
+            del b_action_vals['FMU_action_repeat']
+
+        # User-overridable transforms first (closest to the brain), then the declared ones
         b_action_vals = self.transform.transform_action(b_action_vals)
+        b_action_vals = self.action_pipeline.transform(b_action_vals)
         
         # We forward the configuration values provided
         applied_actions_bool = self._set_variables(b_action_vals)
 
         if not applied_actions_bool:
-            print("[apply_actions] No valid action parameters were found. No actions applied.")
+            logger.warning("[apply_actions] No valid action parameters were found. No actions applied.")
 
         return applied_actions_bool
 
 
-    def get_state_vars(self):
+    def get_state_vars(self, full: bool = False):
         """Get a dictionary of (var_name: var_val) pairs for all variables in simulation.
+             If a state projection is set, only the projected fields are fetched and returned,
+             unless 'full' is True (e.g: to log every state variable).
         """
         
         # Ensure model has been initialized at least once
         self._model_has_been_initialized("get_state_vars")
 
-        # Get all variable names in model
-        state_var_names = self.get_state_var_names()
+        # Get all variable names in model (only those projected, if any)
+        state_var_names = self.get_state_var_names(full)
 
         # Reusing get_states method --> Retrieve dict with (state_name, state_value) pairs
         state_vars = self.get_states(state_var_names)
+
+        # Drop the fields not projected (e.g: reserved FMU_* fields, or elements of flattened arrays)
+        if self.state_projection is not None and not full:
+            state_vars = {name: value for name, value in state_vars.items() if name in self.state_projection}
         return state_vars
 
 
-    def get_state_var_names(self):
+    def set_state_projection(self, field_names: List[str] = None):
+        """Restrict the states sent to the brain (see get_state_vars) to the given fields.
+             E.g: the state fields declared in interface.json (see read_interface_state_fields).
+             If None, every state variable is sent.
+        """
+
+        self.state_projection = set(field_names) if field_names is not None else None
+        self.state_var_names = None
+        self.projected_state_var_names = None
+        if self.state_projection is not None:
+            logger.info(f"[FMU Connector] Projecting the state sent to the brain on {len(self.state_projection)} field(s).")
+
+
+    def get_state_var_names(self, full: bool = False):
         """Get a list of all variables in the sim (removing duplicates, if any).
+             If a state projection is set, only the variables projected are listed, unless 'full' is True.
              Note, list is kept the same from first time this method is called.
         """
 
+        if self.state_projection is not None and not full:
+            if self.projected_state_var_names is None:
+                # keep array variables when any of their flattened elements is projected,
+                # and the variables the declared state transforms depend on (e.g: renamed or derived fields)
+                projected_names = self.state_projection.union(self.state_pipeline.get_field_names())
+                projected_arrays = {name for flat_name, (name, _) in self.array_elements.items()
+                                    if flat_name in projected_names}
+                self.projected_state_var_names = [name for name in self.get_state_var_names(full=True)
+                                                  if name in projected_names or name in projected_arrays]
+            return self.projected_state_var_names
+
         if self.state_var_names:
             return self.state_var_names
 
@@ -924,8 +1969,7 @@ class FMUConnector:
             aux_all_var_names.extend(self.sim_other_vars)
 
         # Remove duplicates (if any) -- Keeping initial order
-        all_var_names = [aux_all_var_names[i] for i in range(len(aux_all_var_names)) \
-                      if aux_all_var_names[i] not in aux_all_var_names[:i]]
+        all_var_names = list(dict.fromkeys(aux_all_var_names))
 
         # Store for following calls
         self.state_var_names = all_var_names
@@ -934,38 +1978,37 @@ class FMUConnector:
 
     def _apply_config(self, config_param_vals: Dict[str, Any] = {}):
         """Apply configuration paramaters.
+            Only values that differ from the post-reset values of the model (its start values) are written.
         """
 
         # Ensure array is not empty
         if not len(config_param_vals.items()) > 0:
-            print("[_apply_config] Config params was provided empty. No changes applied.")
+            logger.debug("[_apply_config] Config params was provided empty. No changes applied.")
+            return False
+
+        valid_config_names = [name for name in config_param_vals.keys() if name in self.vars_to_idx or name in self.array_elements]
+        if not len(valid_config_names) > 0:
+            logger.debug("[_apply_config] No valid config parameters were found. No changes applied.")
             return False
-        
-        # We forward the configuration values provided
-        applied_config_bool = self._set_variables(config_param_vals)
-            
-        # Report config application to user
-        if not applied_config_bool:
-            print("[_apply_config] No valid config parameters were found. No changes applied.")
-
-        # Take of any other variables that require initialization
-        print("[_apply_config] Apply additional required initializations.")
-        non_initialized_vars = [var_tuple for var_tuple in self.vars_to_ini_vals.items() \
-                                          if var_tuple[0] not in config_param_vals.keys()]
-        vars_to_initialize_d = dict(non_initialized_vars)
-        applied_init_bool = self._set_variables(vars_to_initialize_d)
-            
-        # Report additional initializations to user
-        if applied_init_bool:
-            log = "[_apply_config] Initialized the following required values to "
-            log += "FMU defaults: ({}).".format(vars_to_initialize_d)
-            print(log)
 
-        return applied_config_bool
+        # After a reset every variable holds its start value, so those don't need to be initialized again
+        config_writes = self._get_config_writes({}, self._get_applied_values(config_param_vals))
+        self._set_variables(config_writes)
+
+        # Report config application to user (writes needed when setting every config and start value, for reference)
+        full_write_count = len(valid_config_names) + len(self.vars_to_ini_vals) \
+                           - len([name for name in config_param_vals.keys() if name in self.vars_to_ini_vals])
+        if logger.isEnabledFor(logging.DEBUG):
+            log = f"[_apply_config] Applied {len(config_writes)} value(s) differing from post-reset values "
+            log += f"({full_write_count} writes without differential application): ({config_writes})."
+            logger.debug(log)
+
+        return True
 
     
     def _get_variables(self, sim_outputs: List = None):
         """Get var indices for each (valid) var name provided in list.
+             Values read since the last step (or write) are served from memory (see self.read_cache_stats).
         """
         
         # Ensure model has been initialized at least once
@@ -979,17 +2022,115 @@ class FMUConnector:
             return {}
 
 
-        sim_output_indices, sim_output_names = self._var_names_to_indices(sim_outputs)
-        
+        # Read only the variables not read since the model last changed (by run_step, _set_variables, or reset)
+        cache = self._read_cache
+        missing_names = [name for name in sim_outputs if name not in cache]
+        self.read_cache_stats["hits"] += len(sim_outputs) - len(missing_names)
+        if missing_names:
+            self.read_cache_stats["misses"] += len(missing_names)
+            sim_output_names, sim_output_vals = self._get_values(missing_names)
+            read_vals = dict(zip(sim_output_names, sim_output_vals))
+            for name in missing_names:
+                # values per output name (the elements of flattened arrays, or none if the name isn't valid)
+                if name in self.vars_to_shape and self.array_mode == "flattened":
+                    output_names = arrays.get_flat_names(name, self.vars_to_shape[name])
+                else:
+                    output_names = [name]
+                cache[name] = [(output_name, read_vals[output_name]) for output_name in output_names if output_name in read_vals]
+
+        outputs_dict = {}
+        for name in sim_outputs:
+            outputs_dict.update(cache[name])
+
         # Check if more than one index has been found
-        if not len(sim_output_indices) > 0:
+        if not len(outputs_dict) > 0:
             #print("[_get_variables] No valid var names have been provided. No vars are returned.")
             return {}
-        
-        outputs_dict = dict(zip(sim_output_names, self.fmu.getReal(sim_output_indices)))
+
+        if self.arrays is not None and self.array_mode == "nested":
+            # nested arrays are lists: copied, so the values cached can't be modified
+            for name, value in outputs_dict.items():
+                if isinstance(value, list):
+                    outputs_dict[name] = copy.deepcopy(value)
 
         return outputs_dict
 
+
+    def _get_values(self, var_names: List):
+        """Get the values of the (valid) variables given, with a single batched call per variable type.
+            Returns the valid names, and their values (Booleans as 0/1, Enumerations as their integer codes, Strings as str).
+        """
+
+        names, partitions, array_names = self._get_access_plan(var_names)
+        if len(partitions) == 1 and not array_names:
+            type_f, getter, _, vrs, _ = partitions[0]
+            return names, _cast_read_values(type_f, getattr(self.fmu, getter)(vrs))
+
+        values = [None] * len(names)
+        for type_f, getter, _, vrs, positions in partitions:
+            for position, value in zip(positions, _cast_read_values(type_f, getattr(self.fmu, getter)(vrs))):
+                values[position] = value
+
+        if array_names:
+            # arrays are read with a single call, as nested lists or one value per element when flattened
+            views = self.arrays.read()
+            names = list(names)
+            for name in array_names:
+                if self.array_mode == "flattened":
+                    names.extend(arrays.get_flat_names(name, self.vars_to_shape[name]))
+                    values.extend(views[name].reshape(-1).tolist())
+                else:
+                    names.append(name)
+                    values.append(views[name].tolist())
+        return names, values
+
+
+    def _get_reader(self, var_names: List):
+        """Get a function reading the given (numeric, scalar) variables into a float array, in order.
+            Real (fmi v'3.0': Float64) variables are read with a single low-level call into a preallocated buffer
+            (see aggregation.RealReader), and any other variables through the typed access plan.
+        """
+
+        var_names = list(var_names)
+        real_type = "Float64" if self.fmi_version == "3.0" else "Real"
+        if all(self.vars_to_fmi_type.get(name) == real_type for name in var_names):
+            value_references, _ = self._var_names_to_indices(var_names)
+            return aggregation.RealReader(self.fmu, value_references).read
+        return lambda: np.asarray(self._get_values(var_names)[1], dtype=np.float64)
+
+
+    def _get_access_plan(self, var_names: List):
+        """Get the value references of the (valid) variables given, partitioned per variable type.
+            Returns the valid (non-array) names, a list of (type, getter, setter, value references, positions in names)
+            per type, and the names of the array variables given (see self.arrays).
+            Plans are cached per list of names, since the same lists (e.g: outputs) are accessed on every step.
+        """
+
+        key = tuple(var_names)
+        plan = self._access_plans.get(key)
+        if plan is not None:
+            return plan
+
+        array_names = [name for name in var_names if name in self.vars_to_shape]
+        scalar_names = [name for name in var_names if name not in self.vars_to_shape]
+        indices, names = self._var_names_to_indices(scalar_names) if scalar_names else ([], [])
+        partitions = {}
+        for position, (idx, name) in enumerate(zip(indices, names)):
+            fmi_type = self.vars_to_fmi_type[name]
+            if self.fmi_version == "3.0":
+                # enumerations are exchanged as Int64 values in fmi v'3.0'
+                accessors = ("getInt64", "setInt64") if fmi_type == "Enumeration" else ("get" + fmi_type, "set" + fmi_type)
+            else:
+                accessors = TYPE_ACCESSORS[fmi_type]
+            vrs, positions = partitions.setdefault((self.vars_to_type_f[name],) + accessors, ([], []))
+            vrs.append(idx)
+            positions.append(position)
+
+        plan = (names, [key + (vrs, positions) for key, (vrs, positions) in partitions.items()], array_names)
+        if len(self._access_plans) < 256:
+            self._access_plans[key] = plan
+        return plan
+
     
     def _set_variables(self, b_input_vals: Dict[str, Any] = {}):
         """Apply given input values to simulation.
@@ -1001,32 +2142,62 @@ class FMUConnector:
         # Ensure model has been initialized at least once
         self._model_has_been_initialized("_set_variables")
 
+        # Values read before the write are outdated
+        self._read_cache.clear()
+
         # Ensure dict is not empty
         if not len(b_input_vals.items()) > 0:
             #print("[_set_variables] Provided input dict is empty. No input changes will be applied.")
             return False
         
-        # Get input names, and extract indices
-        sim_inputs = list(b_input_vals.keys())
-        sim_input_indices,sim_input_names = self._var_names_to_indices(sim_inputs)
+        # Gather array values, either whole or per element when flattened
+        array_vals = self._get_array_values(b_input_vals)
+
+        # Get input names, and extract indices (partitioned per type)
+        sim_input_names, partitions, _ = self._get_access_plan(list(b_input_vals.keys()))
         
         # Check if more than one index has been found
-        if not len(sim_input_indices) > 0:
+        if not len(sim_input_names) > 0 and not array_vals:
             #print("[_set_variables] No valid input names have been provided. No input changes will be applied.")
             return False
 
-        # Extract values for valid inputs (found on model variables)
-        sim_input_vals = []
-        for sim_input_name in sim_input_names:
-            # Cast to correct var type prior to appending
-            sim_input_casted = self.vars_to_type_f[sim_input_name](b_input_vals[sim_input_name])
-            sim_input_vals.append(sim_input_casted)
+        # Update inputs to the brain, with a single batched call per type (casting to the correct var type)
+        for type_f, _, setter, vrs, positions in partitions:
+            values = [type_f(b_input_vals[sim_input_names[position]]) for position in positions]
+            getattr(self.fmu, setter)(vrs, values)
 
-        # Update inputs to the brain
-        self.fmu.setReal(sim_input_indices, sim_input_vals)
+        # Update arrays with a single call
+        if array_vals:
+            self.arrays.write(array_vals)
 
         return True
 
+
+    def _get_array_values(self, vals: Dict[str, Any], base_vals: Dict[str, Any] = None):
+        """Get the (flat) values of the array variables in the given dict, either given whole or per element when flattened.
+            Elements not given are taken from 'base_vals' if provided, or read from the model otherwise.
+        """
+
+        array_vals = {name: vals[name] for name in self.vars_to_shape if name in vals}
+        element_vals = [(self.array_elements[name], value) for name, value in vals.items() if name in self.array_elements]
+        if not element_vals:
+            return array_vals
+
+        element_counts = collections.Counter(name for (name, _), _ in element_vals)
+        for (name, i), value in element_vals:
+            if name not in array_vals:
+                if element_counts[name] == self.arrays.sizes[name]:
+                    # every element is given
+                    array_vals[name] = np.zeros(self.arrays.sizes[name], dtype=np.float64)
+                elif base_vals is not None and name in base_vals:
+                    array_vals[name] = np.array(base_vals[name], dtype=np.float64)
+                else:
+                    array_vals[name] = self.arrays.read()[name].reshape(-1).copy()
+            else:
+                array_vals[name] = np.array(array_vals[name], dtype=np.float64).reshape(-1)
+            array_vals[name][i] = float(value)
+        return array_vals
+
     
     def _var_names_to_indices(self, var_names: List):
         """Get var indices for each var name provided in list.
@@ -1034,7 +2205,7 @@ class FMUConnector:
 
         if type(var_names) is not type([]):
             # Return empty array if input is not 'list' type
-            print("[_var_names_to_indices] Provided input is not of type list.")
+            logger.warning("[_var_names_to_indices] Provided input is not of type list.")
             return []
 
         indices_array = []
@@ -1046,7 +2217,7 @@ class FMUConnector:
             names_array.append(name)
 
         if not len(var_names) > 0:
-            print("[_var_names_to_indices] No (valid) states have been provided.")
+            logger.debug("[_var_names_to_indices] No (valid) states have been provided.")
 
         return indices_array, names_array
 
@@ -1078,7 +2249,7 @@ class FMUConnector:
         self._model_has_been_initialized("_terminate_model")
 
         if not self._is_initialized:
-            print("[_terminate_model] Model hasn't been initialized or has already been terminated. Skipping termination.")
+            logger.warning("[_terminate_model] Model hasn't been initialized or has already been terminated. Skipping termination.")
             return
         
         # Terminate instance
@@ -1096,4 +2267,84 @@ class FMUConnector:
     #    """
     #    return self.fmu.getState(kind=)
 
-    
\ No newline at end of file
+
+
+class FMUConnectorBatch:
+    def __init__(self, connectors: List[FMUConnector]):
+        """Step several modelExchange connectors of the same model together.
+
+            Note, continuous states of all models are integrated by a single batched solver
+            (see me_engine.BatchedModelExchangeStepper), which multiplies throughput for small
+            models where solver overhead dominates.
+
+        Parameters
+        ----------
+        connectors: list
+            FMUConnector instances of the same modelExchange model, using the same solver.
+        """
+
+        for connector in connectors:
+            assert connector.me_stepper is not None, "Only modelExchange models can be stepped in batch."
+
+        self.connectors = connectors
+        self.stepper = me_engine.BatchedModelExchangeStepper([c.me_stepper for c in connectors])
+
+
+    def run_step(self):
+        """Move every connector one step forward (see FMUConnector.run_step).
+            The per-step bookkeeping of each connector (action repeat, aggregation windows, substep counters,
+            FMI call logging, and terminal conditions) is the same as when stepped on its own.
+        """
+
+        for connector in self.connectors:
+            connector._model_has_been_initialized("run_step")
+            connector._start_step()
+
+        sim_times = np.array([c.sim_time for c in self.connectors], dtype=np.float64)
+        step_sizes = np.array([c.step_size for c in self.connectors], dtype=np.float64)
+        substep_sizes = np.array([c.substep_size for c in self.connectors], dtype=np.float64)
+        action_repeats = np.array([c.action_repeat for c in self.connectors])
+        stop_tolerances = substep_sizes * 0.001
+        active = np.array([not c.error_occurred for c in self.connectors])
+
+        # The brain action is held for 'FMU_action_repeat' steps of each connector
+        for repeat in range(int(action_repeats.max())):
+            stepping = active & (repeat < action_repeats)
+            next_sim_times = np.where(stepping, sim_times + step_sizes, sim_times)
+
+            while True:
+                running = stepping & active & (sim_times + stop_tolerances < next_sim_times)
+                if not running.any():
+                    break
+
+                next_step_sizes = np.minimum(substep_sizes, next_sim_times - sim_times)
+                for i in np.flatnonzero(running):
+                    if self.connectors[i].episode_fmi_logging:
+                        fmi_logger.info(f'    doStep({sim_times[i]:.3f}, {next_step_sizes[i]:.3f})', extra={"rate_limit": False})
+                failed = self.stepper.do_step(sim_times, next_step_sizes, running)
+                for i in np.flatnonzero(failed):
+                    logger.error(f"Error: doStep({sim_times[i]:.3f}, {next_step_sizes[i]:.3f}) in batch instance {i}.")
+                    self.connectors[i].error_occurred = True
+
+                sim_times = np.where(running & ~failed, sim_times + next_step_sizes, sim_times)
+                active &= ~failed
+
+                # Sample the aggregated outputs after each substep
+                for i in np.flatnonzero(running & ~failed):
+                    connector = self.connectors[i]
+                    connector.sim_time = float(sim_times[i])
+                    connector.substeps_taken += 1
+                    if connector.substep_window is not None:
+                        connector.substep_window.append(connector.sim_time, connector.substep_reader())
+
+            # Sample the outputs at the step_size rate to aggregate them over the held window
+            for i in np.flatnonzero(stepping & active):
+                connector = self.connectors[i]
+                if connector.held_window is not None:
+                    connector.held_window.append(connector.sim_time, connector._get_values(connector.held_output_names)[1])
+
+        for connector, sim_time in zip(self.connectors, sim_times):
+            connector.sim_time = float(sim_time)
+            connector._finish_step()
+
+        return
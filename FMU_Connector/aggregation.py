@@ -0,0 +1,164 @@
+"""
+Reductions of model outputs sampled over a window of simulation time
+(e.g: the steps a brain action is held for, see FMU_action_repeat, or the substeps of a step).
+"""
+
+import numpy as np
+
+from ctypes import POINTER, c_double, c_uint
+
+from typing import Any, Dict
+
+
+# Reductions available over a window of samples
+REDUCTIONS = ("last", "mean", "min", "max", "integral", "count_above")
+
+# Numeric codes for the reductions, since Bonsai configs and actions only carry numbers
+REDUCTION_CODES = {0: "last", 1: "mean", 2: "min", 3: "max"}
+
+
+def get_reduction(reduction: Any):
+    """Get the name of a reduction given either its name or its numeric code.
+    """
+
+    if isinstance(reduction, str):
+        name = reduction.lower()
+    else:
+        name = REDUCTION_CODES.get(int(reduction))
+
+    if name not in REDUCTIONS:
+        raise ValueError(f"Unknown reduction '{reduction}'. Valid values are {REDUCTIONS} or codes {REDUCTION_CODES}.")
+
+    return name
+
+
+def parse_output_reductions(output_reductions: Dict[str, Any]):
+    """Parse the reductions configured per output (e.g: "aggregation" section of the YAML config file).
+        Returns a list of (var_name, reduction, threshold, state_name) tuples.
+
+        > E.g:  {"x1": ["max", {"count_above": 0.5}]}
+           -->  [("x1", "max", 0.0, "x1_max"), ("x1", "count_above", 0.5, "x1_count_above")]
+    """
+
+    parsed = []
+    for var_name, reductions in (output_reductions or {}).items():
+        if not isinstance(reductions, list):
+            reductions = [reductions]
+        for reduction in reductions:
+            threshold = 0.0
+            if isinstance(reduction, dict):
+                # reductions with parameters, e.g: {"count_above": 0.5}
+                (reduction, threshold), = reduction.items()
+            reduction = get_reduction(reduction)
+            parsed.append((var_name, reduction, float(threshold), f"{var_name}_{reduction}"))
+
+    return parsed
+
+
+class OutputWindow:
+    """Preallocated buffer of output samples over a window of simulation time.
+        Row 0 holds the values at the start of the window, followed by one row per sample.
+    """
+
+    def __init__(self, n_vars: int, capacity: int):
+        """Allocate buffers for 'capacity' samples (plus the start values) of 'n_vars' outputs.
+        """
+
+        self.times = np.zeros(capacity + 1, dtype=np.float64)
+        self.values = np.zeros((capacity + 1, n_vars), dtype=np.float64)
+        self.n = 0
+
+
+    def start(self, time: float, values):
+        """Clear the window, and store the values at its start.
+        """
+
+        self.n = 0
+        self.append(time, values)
+
+
+    def append(self, time: float, values):
+        """Store a sample into the next row of the buffer.
+        """
+
+        if self.n == len(self.times):
+            # only reached if there are more samples than expected (e.g: step size changed by an action)
+            self._grow()
+        self.times[self.n] = time
+        self.values[self.n] = values
+        self.n += 1
+
+
+    def _grow(self):
+        """Double the capacity of the buffers, keeping the samples stored.
+        """
+
+        times = np.zeros(2 * len(self.times), dtype=np.float64)
+        values = np.zeros((2 * len(self.times), self.values.shape[1]), dtype=np.float64)
+        times[:self.n] = self.times[:self.n]
+        values[:self.n] = self.values[:self.n]
+        self.times = times
+        self.values = values
+
+
+    def reduce(self, reduction: str, threshold: float = 0.0):
+        """Reduce the samples in the window (excluding the start values) per output.
+            "integral" integrates over time from the start of the window (trapezoidal rule),
+            and "count_above" counts the samples above 'threshold'.
+        """
+
+        # fall back to the start values if no samples have been taken
+        samples = self.values[1:self.n] if self.n > 1 else self.values[:1]
+
+        if reduction == "last":
+            return samples[-1].copy()
+        if reduction == "mean":
+            return samples.mean(axis=0)
+        if reduction == "min":
+            return samples.min(axis=0)
+        if reduction == "max":
+            return samples.max(axis=0)
+        if reduction == "integral":
+            values = self.values[:self.n]
+            return 0.5 * np.sum((values[1:] + values[:-1]) * np.diff(self.times[:self.n])[:, None], axis=0)
+        if reduction == "count_above":
+            return np.count_nonzero(self.values[1:self.n] > threshold, axis=0).astype(np.float64)
+
+        raise ValueError(f"Unknown reduction '{reduction}'.")
+
+
+class RealReader:
+    """Reads a fixed set of Real (fmi v'3.0': Float64) variables into a preallocated buffer.
+        Uses the low-level FMI call when available (fmpy instances), to avoid allocating on every read.
+    """
+
+    def __init__(self, fmu, value_references):
+        """Prepare the buffers to read 'value_references' from the (instantiated) 'fmu'.
+        """
+
+        self.fmu = fmu
+        self.value_references = list(value_references)
+        self.buffer = np.zeros(len(self.value_references), dtype=np.float64)
+
+        self._fmi3 = not hasattr(fmu, "getReal") and hasattr(fmu, "getFloat64")
+        low_level_getter = "fmi3GetFloat64" if self._fmi3 else "fmi2GetReal"
+        self._low_level = hasattr(fmu, low_level_getter) and hasattr(fmu, "component")
+        if self._low_level:
+            self._vr = (c_uint * len(self.value_references))(*self.value_references)
+            self._buffer_ptr = self.buffer.ctypes.data_as(POINTER(c_double))
+
+
+    def read(self):
+        """Read the current values into the buffer (which is returned, and reused on the following read).
+        """
+
+        n_values = len(self.value_references)
+        if self._low_level and self._fmi3:
+            self.fmu.fmi3GetFloat64(self.fmu.component, self._vr, n_values, self._buffer_ptr, n_values)
+        elif self._low_level:
+            self.fmu.fmi2GetReal(self.fmu.component, self._vr, n_values, self._buffer_ptr)
+        elif self._fmi3:
+            self.buffer[:] = self.fmu.getFloat64(self.value_references)
+        else:
+            self.buffer[:] = self.fmu.getReal(self.value_references)
+        return self.buffer
@@ -0,0 +1,116 @@
+"""
+FMI 3.0 array variables (with "Dimension" elements), exchanged through a single contiguous NumPy buffer.
+"""
+
+import numpy as np
+
+from ctypes import POINTER, c_double, c_uint
+
+from typing import Any, Dict, List
+
+
+# Representations of array variables in the state (see "array_mode" in the YAML config file)
+ARRAY_MODES = ("nested", "flattened")
+
+
+def get_flat_names(var_name: str, shape: tuple):
+    """Get the names of the elements of an array variable when flattened (row-major order).
+
+    > E.g:  "T", shape (2, 2)  -->  ["T_0", "T_1", "T_2", "T_3"]
+    """
+
+    return [f"{var_name}_{i}" for i in range(int(np.prod(shape)))]
+
+
+def get_interface_type(shape: tuple, comment: str = None):
+    """Get the Bonsai interface type of an array variable of the given shape (nested arrays of numbers).
+    """
+
+    interface_type = {"category": "Number"}
+    for length in reversed(shape):
+        interface_type = {"category": "Array", "length": int(length), "type": interface_type}
+    interface_type["comment"] = comment
+    return interface_type
+
+
+def parse_start_value(start: Any, shape: tuple):
+    """Parse the start value of a Float64 array variable (space-separated values) into a flat tuple.
+        A single value is broadcast to every element.
+    """
+
+    values = [float(value) for value in str(start).split()]
+    size = int(np.prod(shape))
+    if len(values) == 1:
+        values = values * size
+    return tuple(values)
+
+
+class ArrayVariables:
+    """Float64 array variables of a model, read/written with a single getFloat64/setFloat64 call.
+        Each variable is exposed as a NumPy view (with its shape) on the buffer passed to the FMU.
+    """
+
+    def __init__(self, names: List[str], value_references: List[int], shapes: List[tuple]):
+        """Allocate a contiguous buffer for every element of the given array variables.
+        """
+
+        self.names = list(names)
+        self.value_references = list(value_references)
+        self.shapes = {name: tuple(shape) for name, shape in zip(self.names, shapes)}
+        self.sizes = {name: int(np.prod(shape)) for name, shape in self.shapes.items()}
+
+        self.buffer = np.zeros(sum(self.sizes.values()), dtype=np.float64)
+        self.views = {}
+        offset = 0
+        for name in self.names:
+            self.views[name] = self.buffer[offset:offset + self.sizes[name]].reshape(self.shapes[name])
+            offset += self.sizes[name]
+
+        self.fmu = None
+
+
+    def bind(self, fmu):
+        """Prepare the buffers to read from the fmu, using the low-level FMI call when available (fmpy instances).
+        """
+
+        self.fmu = fmu
+        self._low_level = hasattr(fmu, "fmi3GetFloat64")
+        if self._low_level:
+            self._vr = (c_uint * len(self.value_references))(*self.value_references)
+            self._buffer_ptr = self.buffer.ctypes.data_as(POINTER(c_double))
+
+
+    def read(self):
+        """Read every array into the buffer with a single call.
+            Returns the views per variable name (overwritten on the following read).
+        """
+
+        if self._low_level:
+            self.fmu.fmi3GetFloat64(self.fmu.component, self._vr, len(self.value_references), self._buffer_ptr, len(self.buffer))
+        else:
+            self.buffer[:] = self.fmu.getFloat64(self.value_references, len(self.buffer))
+        return self.views
+
+
+    def write(self, values: Dict[str, Any]):
+        """Write the given arrays (name: array-like, nested or flat) with a single call.
+        """
+
+        names = [name for name in self.names if name in values]
+        if not names:
+            return
+
+        data = []
+        for name in names:
+            value = np.asarray(values[name], dtype=np.float64).reshape(-1)
+            if value.size != self.sizes[name]:
+                raise ValueError(f"Array variable '{name}' expects {self.sizes[name]} values, but {value.size} were given.")
+            data.append(value)
+        data = np.concatenate(data)
+        vrs = [self.value_references[self.names.index(name)] for name in names]
+
+        if self._low_level:
+            self.fmu.fmi3SetFloat64(self.fmu.component, (c_uint * len(vrs))(*vrs), len(vrs),
+                                    data.ctypes.data_as(POINTER(c_double)), len(data))
+        else:
+            self.fmu.setFloat64(vrs, data.tolist())
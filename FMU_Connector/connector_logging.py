@@ -0,0 +1,189 @@
+"""
+Leveled logging for the connector and the samples, built on the standard 'logging' module.
+
+- Messages are written by a background thread (QueueHandler/QueueListener), so the simulation never waits on stdout.
+- Messages are rate limited per call site (e.g: at most 10 per second), with a count of the ones suppressed.
+- Messages on hot paths (e.g: per step) are logged at DEBUG level, and guarded with 'isEnabledFor' so they cost
+  nothing when disabled.
+
+The level defaults to INFO, and can be set with configure_logging (or the FMU_CONNECTOR_LOG_LEVEL environment variable).
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextlib
+import logging.handlers
+
+
+ROOT_LOGGER_NAME = "fmu_connector"
+
+# Messages are kept as they are (they carry their own prefix, e.g: "[FMU Connector]")
+DEFAULT_FORMAT = "%(message)s"
+
+_listener = None
+_queue = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Let through at most 'burst' messages per call site every 'interval_s' seconds.
+        The number of messages suppressed is appended to the next message let through.
+        Records logged with extra={"rate_limit": False} are never suppressed.
+    """
+
+    def __init__(self, interval_s: float = 1.0, burst: int = 10):
+        super().__init__()
+        self.interval_s = interval_s
+        self.burst = burst
+        self._windows = {}
+        self._lock = threading.Lock()
+
+
+    def filter(self, record: logging.LogRecord):
+        if self.interval_s <= 0 or not getattr(record, "rate_limit", True):
+            return True
+
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or record.created - window[0] >= self.interval_s:
+                # new window: [start, messages let through, messages suppressed]
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [record.created, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                return True
+            else:
+                window[2] += 1
+                return False
+
+        if suppressed > 0:
+            record.msg = f"{record.getMessage()} ({suppressed} similar message(s) suppressed)"
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects (e.g: for container log drivers).
+    """
+
+    def format(self, record: logging.LogRecord):
+        return json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+                           "level": record.levelname,
+                           "logger": record.name,
+                           "message": record.getMessage()})
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Stream handler writing to the current sys.stdout (e.g: so contextlib.redirect_stdout is honored).
+    """
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def get_logger(name: str = None):
+    """Get a logger under the connector's root logger (e.g: "connector" --> "fmu_connector.connector").
+        Logging is configured with the defaults on first use, unless configured already.
+    """
+
+    if _listener is None and not logging.getLogger(ROOT_LOGGER_NAME).handlers:
+        configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}" if name else ROOT_LOGGER_NAME)
+
+
+def configure_logging(level=None, fmt: str = DEFAULT_FORMAT, json_format: bool = False, rate_limit_s: float = 1.0,
+                      rate_limit_burst: int = 10, use_queue: bool = True):
+    """Configure the connector's loggers (replacing any previous configuration).
+
+    level: int or str
+        Logging level (e.g: "DEBUG" to include per-step messages). Defaults to FMU_CONNECTOR_LOG_LEVEL, or INFO.
+    fmt: str
+        Format of the messages (see logging.Formatter), unless 'json_format' is set.
+    json_format: bool
+        If True, messages are written as single-line JSON objects.
+    rate_limit_s, rate_limit_burst:
+        At most 'rate_limit_burst' messages per call site are written every 'rate_limit_s' seconds (0 to disable).
+    use_queue: bool
+        If True, messages are written to stdout by a background thread.
+    """
+
+    global _listener, _queue
+
+    if level is None:
+        level = os.environ.get("FMU_CONNECTOR_LOG_LEVEL", "INFO")
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+
+    root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    _stop_listener()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+
+    stream_handler = _StdoutHandler()
+    stream_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(fmt))
+    rate_limit_filter = RateLimitFilter(rate_limit_s, rate_limit_burst)
+
+    if use_queue:
+        # rate limited before being queued, so suppressed messages aren't formatted at all
+        _queue = queue.Queue()
+        queue_handler = logging.handlers.QueueHandler(_queue)
+        queue_handler.addFilter(rate_limit_filter)
+        root_logger.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(_queue, stream_handler)
+        _listener.start()
+    else:
+        stream_handler.addFilter(rate_limit_filter)
+        root_logger.addHandler(stream_handler)
+
+    root_logger.setLevel(level)
+    root_logger.propagate = False
+    return root_logger
+
+
+def flush():
+    """Wait until every message queued has been written (e.g: before prompting the user).
+    """
+
+    if _listener is not None:
+        _queue.join()
+
+
+@contextlib.contextmanager
+def temporary_level(logging_level):
+    """Temporarily set the level of the connector's loggers (e.g: logging.WARNING to silence a calibration run).
+    """
+
+    root_logger = get_logger()
+    previous_level = root_logger.level
+    root_logger.setLevel(logging_level)
+    try:
+        yield
+    finally:
+        flush()
+        root_logger.setLevel(previous_level)
+
+
+def _stop_listener():
+    global _listener, _queue
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        _queue = None
+
+
+atexit.register(_stop_listener)
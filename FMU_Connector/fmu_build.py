@@ -0,0 +1,381 @@
+"""
+Build source-carrying FMUs into optimized linux64 binaries.
+
+FMUs that ship their C 'sources/' (e.g: samples/vanDerPol.fmu) can be compiled for the host
+platform, even when the vendor only ships binaries for win64. The compiled binary is injected
+into a cached copy of the FMU, which FMUConnector prefers over the original file.
+
+The optimized build is checked against a reference build (the FMU's own linux64 binary if
+present, an unoptimized build of the same sources otherwise) before it is registered.
+
+Usage (e.g: at image-build time):
+    python fmu_build.py generic.fmu --opt-flags="-O3" --march native --lto
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import subprocess
+import zipfile
+
+import numpy as np
+import fmpy
+from fmpy import read_model_description, extract, simulate_fmu
+from fmpy import platform as fmpy_platform
+from fmpy import sharedLibraryExtension
+
+from typing import List
+
+
+# Default directory (next to the model) where optimized copies of the FMUs are stored
+BUILD_CACHE_DIR_NAME = ".fmu_build_cache"
+# Platform the binaries are built for (only linux64 is currently supported)
+BUILD_PLATFORM = "linux64"
+
+# Windows-only headers referenced by some FMU templates, mapped to their portable definitions
+COMPAT_HEADERS = {
+    "minmax.h": "#ifndef min\n#define min(a,b) ((a)<(b)?(a):(b))\n#endif\n"
+                "#ifndef max\n#define max(a,b) ((a)>(b)?(a):(b))\n#endif\n",
+}
+
+
+def get_cache_dir(model_filepath: str, cache_dir: str = None):
+    """Get the directory where optimized builds for the model are cached.
+    """
+
+    if cache_dir is None:
+        cache_dir = os.getenv("FMU_BUILD_CACHE", os.path.join(os.path.dirname(os.path.abspath(model_filepath)),
+                                                               BUILD_CACHE_DIR_NAME))
+    return cache_dir
+
+
+def _get_manifest_filepath(model_filepath: str, cache_dir: str = None):
+    model_name = os.path.basename(model_filepath).replace(".fmu", "")
+    return os.path.join(get_cache_dir(model_filepath, cache_dir), model_name + "_" + BUILD_PLATFORM + ".json")
+
+
+def _file_sha256(filepath: str):
+    sha = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def has_sources(model_filepath: str):
+    """Check if the FMU file carries C sources that can be compiled.
+    """
+
+    with zipfile.ZipFile(model_filepath, "r") as zip_file:
+        return any(name.startswith("sources/") and name.endswith(".c") for name in zip_file.namelist())
+
+
+def find_optimized_fmu(model_filepath: str, cache_dir: str = None):
+    """Get the filepath of the cached optimized build for the model, if any.
+        Returns None if no build exists, or if it is outdated w.r.t. the given FMU file.
+    """
+
+    if fmpy_platform != BUILD_PLATFORM:
+        return None
+
+    manifest_filepath = _get_manifest_filepath(model_filepath, cache_dir)
+    if not os.path.isfile(manifest_filepath) or not os.path.isfile(model_filepath):
+        return None
+
+    with open(manifest_filepath, "r") as file:
+        manifest = json.load(file)
+
+    built_filepath = os.path.join(os.path.dirname(manifest_filepath), manifest["fmu"])
+    if manifest.get("source_sha256") != _file_sha256(model_filepath) or not os.path.isfile(built_filepath):
+        return None
+
+    return built_filepath
+
+
+def _get_source_files(model_description, sources_dir: str, model_identifier: str):
+    """Get the list of C files to compile, and the preprocessor definitions and include dirs to use.
+    """
+
+    definitions = []
+    include_dirs = []
+    for build_configuration in getattr(model_description, "buildConfigurations", []):
+        if build_configuration.modelIdentifier not in (None, model_identifier):
+            continue
+        source_files = []
+        for source_file_set in build_configuration.sourceFileSets:
+            source_files += [os.path.join(sources_dir, f) for f in source_file_set.sourceFiles]
+            definitions += [(d.name, d.value) for d in source_file_set.preprocessorDefinitions]
+            include_dirs += [os.path.join(sources_dir, d) for d in source_file_set.includeDirectories]
+        if source_files:
+            return source_files, definitions, include_dirs
+
+    # No source files declared in the model description:
+    # - 'all.c' (single compilation unit) or '{modelIdentifier}.c' (which includes the FMU template)
+    for name in ("all.c", model_identifier + ".c"):
+        if os.path.isfile(os.path.join(sources_dir, name)):
+            return [os.path.join(sources_dir, name)], definitions, include_dirs
+
+    source_files = [os.path.join(sources_dir, f) for f in sorted(os.listdir(sources_dir)) if f.endswith(".c")]
+    return source_files, definitions, include_dirs
+
+
+def compile_binary(
+    unzipdir: str,
+    output_filepath: str,
+    opt_flags: List[str] = ["-O3"],
+    march: str = None,
+    lto: bool = False,
+    compiler: str = None,
+):
+    """Compile the sources of an unzipped FMU into a shared library.
+
+    Parameters
+    ----------
+    unzipdir: str
+        Directory with the extracted FMU.
+    output_filepath: str
+        Filepath of the shared library to be created.
+    opt_flags: list
+        Optimization flags passed to the compiler (e.g: ["-O3", "-ffast-math"]).
+    march: str
+        If given, target architecture passed as '-march' (e.g: "native", "x86-64-v3").
+    lto: bool
+        If True, enable link-time optimization.
+    compiler: str
+        C compiler to use. Defaults to $CC, or "gcc".
+    """
+
+    model_description = read_model_description(unzipdir, validate=False)
+    interface = model_description.coSimulation or model_description.modelExchange
+    if interface is None:
+        raise Exception("Only coSimulation and modelExchange FMUs can be built from sources.")
+
+    sources_dir = os.path.join(unzipdir, "sources")
+    source_files, definitions, include_dirs = _get_source_files(model_description, sources_dir, interface.modelIdentifier)
+    if not source_files:
+        raise Exception("FMU at '{}' does not contain any C source files.".format(unzipdir))
+
+    # portable replacements for platform-specific headers
+    compat_dir = os.path.join(unzipdir, "sources_compat")
+    os.makedirs(compat_dir, exist_ok=True)
+    for header, content in COMPAT_HEADERS.items():
+        with open(os.path.join(compat_dir, header), "w") as file:
+            file.write(content)
+
+    command = [compiler or os.getenv("CC", "gcc"), "-shared", "-fPIC"]
+    command += list(opt_flags)
+    if march:
+        command.append("-march=" + march)
+    if lto:
+        command.append("-flto")
+    if model_description.coSimulation is not None:
+        command.append("-DFMI_COSIMULATION")
+    command += ["-D{}={}".format(name, value) if value is not None else "-D" + name for name, value in definitions]
+    command += ["-I" + d for d in include_dirs]
+    command += ["-I" + sources_dir, "-I" + compat_dir, "-I" + os.path.join(os.path.dirname(fmpy.__file__), "c-code")]
+    command += source_files
+    command += ["-o", output_filepath, "-lm"]
+
+    print("[FMU Build] " + " ".join(command))
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise Exception("Compilation of '{}' failed:\n{}".format(unzipdir, process.stderr))
+
+    return output_filepath
+
+
+def _inject_binary(model_filepath: str, binary_filepath: str, binary_arcname: str, output_filepath: str):
+    """Copy the FMU file, replacing (or adding) the binary at the given archive name.
+    """
+
+    with zipfile.ZipFile(model_filepath, "r") as src, \
+         zipfile.ZipFile(output_filepath, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            if item.filename != binary_arcname:
+                dst.writestr(item, src.read(item.filename))
+        dst.write(binary_filepath, arcname=binary_arcname)
+
+
+def _simulate_outputs(unzipdir: str, model_description, n_steps: int):
+    """Simulate the unzipped FMU with default settings, and return all Real outputs as an array.
+    """
+
+    step_size = 0.01
+    start_time = 0.0
+    if model_description.defaultExperiment is not None:
+        if model_description.defaultExperiment.stepSize is not None:
+            step_size = float(model_description.defaultExperiment.stepSize)
+        if model_description.defaultExperiment.startTime is not None:
+            start_time = float(model_description.defaultExperiment.startTime)
+
+    outputs = [v.name for v in model_description.modelVariables
+               if v.type == "Real" and v.causality in ("output", "local", None)]
+    fmi_type = "CoSimulation" if model_description.coSimulation is not None else "ModelExchange"
+    result = simulate_fmu(unzipdir,
+                          validate=False,
+                          fmi_type=fmi_type,
+                          start_time=start_time,
+                          stop_time=start_time + n_steps * step_size,
+                          output_interval=step_size,
+                          output=outputs)
+    return np.column_stack([result[name] for name in outputs]) if outputs else np.zeros((len(result), 0))
+
+
+def check_equivalence(reference_unzipdir: str, candidate_unzipdir: str, n_steps: int = 100,
+                      rtol: float = 1e-6, atol: float = 1e-9):
+    """Compare the outputs of two builds of the same model over a short simulation.
+
+    Returns the maximum absolute deviation found. Raises an exception if builds differ.
+    """
+
+    model_description = read_model_description(reference_unzipdir, validate=False)
+    reference = _simulate_outputs(reference_unzipdir, model_description, n_steps)
+    candidate = _simulate_outputs(candidate_unzipdir, model_description, n_steps)
+
+    if reference.shape != candidate.shape:
+        raise Exception("Builds produced outputs of different shapes: {} vs {}".format(reference.shape, candidate.shape))
+
+    max_deviation = float(np.max(np.abs(reference - candidate))) if reference.size else 0.0
+    if not np.allclose(reference, candidate, rtol=rtol, atol=atol, equal_nan=True):
+        raise Exception("Optimized build deviates from the reference build (max abs deviation: {}).".format(max_deviation))
+
+    return max_deviation
+
+
+def build_optimized_fmu(
+    model_filepath: str,
+    cache_dir: str = None,
+    opt_flags: List[str] = ["-O3"],
+    march: str = None,
+    lto: bool = False,
+    reference_opt_flags: List[str] = ["-O0"],
+    check_steps: int = 100,
+    rtol: float = 1e-6,
+    atol: float = 1e-9,
+    compiler: str = None,
+):
+    """Compile a source-carrying FMU for linux64 and store it in the build cache.
+
+    The optimized build is only registered (i.e: used by FMUConnector) if its outputs match
+    the reference build over 'check_steps' steps. Set 'check_steps' to 0 to skip the check.
+
+    Returns the filepath of the cached FMU.
+    """
+
+    if fmpy_platform != BUILD_PLATFORM:
+        raise Exception("Optimized builds are only supported on '{}' (current platform: '{}').".format(
+            BUILD_PLATFORM, fmpy_platform))
+    if not has_sources(model_filepath):
+        raise Exception("FMU file '{}' does not carry C sources, so it cannot be built.".format(model_filepath))
+
+    cache_dir = get_cache_dir(model_filepath, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    model_description = read_model_description(model_filepath, validate=False)
+    interface = model_description.coSimulation or model_description.modelExchange
+    binary_arcname = "binaries/{}/{}{}".format(BUILD_PLATFORM, interface.modelIdentifier, sharedLibraryExtension)
+
+    work_dir = tempfile.mkdtemp(prefix="fmu_build_")
+    try:
+        # optimized build
+        optimized_dir = extract(model_filepath, unzipdir=os.path.join(work_dir, "optimized"))
+        has_vendor_binary = os.path.isfile(os.path.join(optimized_dir, binary_arcname))
+        os.makedirs(os.path.join(optimized_dir, "binaries", BUILD_PLATFORM), exist_ok=True)
+        compile_binary(optimized_dir, os.path.join(optimized_dir, binary_arcname),
+                       opt_flags=opt_flags, march=march, lto=lto, compiler=compiler)
+
+        # reference build: vendor linux64 binary if any, otherwise an unoptimized build of the same sources
+        max_deviation = None
+        if check_steps > 0:
+            reference_dir = extract(model_filepath, unzipdir=os.path.join(work_dir, "reference"))
+            if not has_vendor_binary:
+                os.makedirs(os.path.join(reference_dir, "binaries", BUILD_PLATFORM), exist_ok=True)
+                compile_binary(reference_dir, os.path.join(reference_dir, binary_arcname),
+                               opt_flags=reference_opt_flags, compiler=compiler)
+            max_deviation = check_equivalence(reference_dir, optimized_dir, n_steps=check_steps, rtol=rtol, atol=atol)
+            print("[FMU Build] Optimized build matches reference build (max abs deviation: {}).".format(max_deviation))
+
+        # inject binary into a cached copy of the FMU
+        model_name = os.path.basename(model_filepath).replace(".fmu", "")
+        built_filename = model_name + "_" + BUILD_PLATFORM + ".fmu"
+        built_filepath = os.path.join(cache_dir, built_filename)
+        _inject_binary(model_filepath, os.path.join(optimized_dir, binary_arcname), binary_arcname, built_filepath)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    manifest = {"fmu": built_filename,
+                "source_sha256": _file_sha256(model_filepath),
+                "opt_flags": list(opt_flags),
+                "march": march,
+                "lto": lto,
+                "reference": "vendor" if has_vendor_binary else " ".join(reference_opt_flags),
+                "max_abs_deviation": max_deviation}
+    with open(_get_manifest_filepath(model_filepath, cache_dir), "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    print("[FMU Build] Optimized FMU has been cached at: {}".format(built_filepath))
+    return built_filepath
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a source-carrying FMU into an optimized linux64 binary.")
+    parser.add_argument(
+        "fmu_path",
+        type=str,
+        help="Path of the FMU file to build.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory for the optimized FMU copy (default: '{}' next to the FMU file)".format(BUILD_CACHE_DIR_NAME),
+    )
+    parser.add_argument(
+        "--opt-flags",
+        type=str,
+        default="-O3",
+        help="Optimization flags passed to the compiler (given as --opt-flags=\"...\", since they start with a dash)",
+    )
+    parser.add_argument(
+        "--march",
+        type=str,
+        default=None,
+        help="Target architecture passed as -march (e.g: native)",
+    )
+    parser.add_argument(
+        "--lto",
+        action="store_true",
+        help="Enable link-time optimization",
+    )
+    parser.add_argument(
+        "--check-steps",
+        type=int,
+        default=100,
+        help="Number of steps to compare against the reference build (0 to skip the check)",
+    )
+    parser.add_argument(
+        "--rtol",
+        type=float,
+        default=1e-6,
+        help="Relative tolerance of the equivalence check",
+    )
+
+    args = parser.parse_args()
+
+    if not has_sources(args.fmu_path):
+        # binary-only FMUs are used as provided
+        print("[FMU Build] FMU file '{}' does not carry C sources. No build performed.".format(args.fmu_path))
+        raise SystemExit(0)
+
+    build_optimized_fmu(args.fmu_path,
+                        cache_dir=args.cache_dir,
+                        opt_flags=args.opt_flags.split(),
+                        march=args.march,
+                        lto=args.lto,
+                        check_steps=args.check_steps,
+                        rtol=args.rtol)
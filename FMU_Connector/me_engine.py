@@ -0,0 +1,716 @@
+"""
+Stepping engine for Model Exchange FMUs.
+
+Model Exchange FMUs do not provide 'doStep', since the importer is in charge of integrating
+the continuous states. ModelExchangeStepper integrates them between communication points,
+so FMUConnector can step these models the same way it steps co-simulation ones.
+
+Supported solvers:
+    "euler"     explicit Euler (fixed step)
+    "rk4"       classical explicit Runge-Kutta (fixed step)
+    "rk45"      Dormand-Prince 5(4) with error-controlled adaptive step size
+    "cvode"     SUNDIALS CVode (BDF), as provided by fmpy
+
+Time events (nextEventTime), state events (sign changes of the event indicators) and step
+events (completedIntegratorStep, called after every accepted internal step) are handled for
+FMI 2.0 models. CVode is run in one-step mode, so the FMU is notified of each of its steps too.
+"""
+
+import inspect
+from ctypes import POINTER, byref, c_double, c_int, c_void_p
+
+import numpy as np
+
+import connector_logging
+
+from typing import List
+
+
+logger = connector_logging.get_logger("connector")
+
+SOLVERS = ("euler", "rk4", "rk45", "cvode")
+
+# Dormand-Prince 5(4) Butcher tableau
+DP_C = np.array([0.0, 1/5, 3/10, 4/5, 8/9, 1.0, 1.0])
+DP_A = [np.array([]),
+        np.array([1/5]),
+        np.array([3/40, 9/40]),
+        np.array([44/45, -56/15, 32/9]),
+        np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+        np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]),
+        np.array([35/384, 0.0, 500/1113, 125/192, -2187/6784, 11/84])]
+DP_B = np.array([35/384, 0.0, 500/1113, 125/192, -2187/6784, 11/84, 0.0])
+DP_E = DP_B - np.array([5179/57600, 0.0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40])
+
+# Classical Runge-Kutta tableau
+RK4_C = np.array([0.0, 0.5, 0.5, 1.0])
+RK4_A = [np.array([]), np.array([0.5]), np.array([0.0, 0.5]), np.array([0.0, 0.0, 1.0])]
+RK4_B = np.array([1/6, 1/3, 1/3, 1/6])
+
+# Maximum number of iterations used to locate a state event within a step
+MAX_EVENT_ITERATIONS = 50
+
+# CVode task returning after each internal step (as in SUNDIALS' cvode.h, not exported by fmpy)
+CV_ONE_STEP = 2
+
+
+class ModelExchangeStepper:
+    def __init__(
+        self,
+        fmu,
+        model_description,
+        solver: str = "rk45",
+        relative_tolerance: float = 1e-5,
+        absolute_tolerance: float = None,
+        max_step: float = None,
+        event_tolerance: float = 1e-10,
+    ):
+        """Integrate the continuous states of an FMI 2.0 Model Exchange FMU.
+
+        Parameters
+        ----------
+        fmu: FMU2Model
+            Instantiated Model Exchange FMU.
+        model_description: ModelDescription
+            Model description of the FMU (number of states and event indicators).
+        solver: str
+            One of SOLVERS.
+        relative_tolerance: float
+            Relative tolerance for adaptive solvers ("rk45", "cvode").
+        absolute_tolerance: float
+            Absolute tolerance for "rk45". Defaults to relative_tolerance times the state nominals.
+        max_step: float
+            Maximum internal step size. For fixed step solvers, it sets the internal step size
+            (default: one internal step per communication step).
+        event_tolerance: float
+            Time resolution to which state events are located.
+        """
+
+        assert solver in SOLVERS, f"Solver '{solver}' is not supported. Choose one of: {SOLVERS}."
+        if solver == "cvode":
+            try:
+                from fmpy.sundials import CVodeSolver
+            except ImportError:
+                raise Exception("Solver 'cvode' requires the SUNDIALS binaries shipped with fmpy, which could not be loaded.")
+
+        self.fmu = fmu
+        self.solver = solver
+        self.relative_tolerance = relative_tolerance
+        self.absolute_tolerance = absolute_tolerance
+        self.max_step = max_step
+        self.event_tolerance = event_tolerance
+
+        self.nx = model_description.numberOfContinuousStates
+        self.nz = model_description.numberOfEventIndicators
+
+        # buffers passed to the FMU (allocated once)
+        self.x = np.zeros(self.nx)
+        self.dx = np.zeros(self.nx)
+        self.z = np.zeros(self.nz)
+        self.x_nominal = np.ones(self.nx)
+        self._px = self.x.ctypes.data_as(POINTER(c_double))
+        self._pdx = self.dx.ctypes.data_as(POINTER(c_double))
+        self._pz = self.z.ctypes.data_as(POINTER(c_double))
+        self._px_nominal = self.x_nominal.ctypes.data_as(POINTER(c_double))
+        # previous event indicators, to detect sign changes
+        self._z_prev = np.zeros(self.nz)
+
+        self.time = 0.0
+        self.next_event_time = None
+        self._h = None
+        self._cvode = None
+        self._cvode_set_stop_time = None
+
+        self.stats = {}
+        self._reset_stats()
+
+    def initialize(self, start_time: float):
+        """Complete the initialization of the FMU (after 'exitInitializationMode').
+        """
+
+        self._reset_stats()
+        self.time = float(start_time)
+        self._h = None
+
+        self._update_discrete_states()
+        self.fmu.enterContinuousTimeMode()
+
+        self._read_states()
+        if self.nx > 0:
+            self.fmu.getNominalsOfContinuousStates(self._px_nominal, self.nx)
+        self._read_event_indicators()
+        self._z_prev[:] = self.z
+
+        if self.solver == "cvode":
+            self._cvode = self._create_cvode_solver()
+
+    def do_step(self, current_time: float, step_size: float):
+        """Advance the model from 'current_time' to 'current_time + step_size'.
+            Mirrors the co-simulation 'doStep' call.
+        """
+
+        t_end = current_time + step_size
+        eps = 1e-13 * max(1.0, abs(t_end))
+
+        # inputs (or states) may have been set since the previous step
+        self.time = current_time
+        self.fmu.setTime(self.time)
+        self._read_states()
+        if self._cvode is not None:
+            self._cvode.reset(self.time)
+
+        while self.time < t_end - eps:
+
+            t_next = t_end
+            time_event = self.next_event_time is not None and self.next_event_time <= t_next + eps
+            if time_event:
+                t_next = min(self.next_event_time, t_end)
+
+            # (stopped early by a state or step event, if any)
+            event = self._integrate(t_next)
+
+            time_event = time_event and self.time >= self.next_event_time - eps
+            if time_event or event:
+                self._handle_event()
+
+        return
+
+    # -------------------------------------------------------------------------
+    # integration
+
+    def _integrate(self, t_next: float):
+        """Integrate from self.time to t_next (or until a state or step event is found).
+            The FMU is notified of every accepted internal step (completedIntegratorStep).
+            Returns True if the integration was stopped by an event.
+        """
+
+        if self.nx == 0:
+            self.time = t_next
+            step_event = self._complete_integrator_step()
+            return self._check_state_event() or step_event
+
+        if self.solver == "cvode":
+            return self._integrate_cvode(t_next)
+
+        eps = 1e-13 * max(1.0, abs(t_next))
+        while self.time < t_next - eps:
+            remaining = t_next - self.time
+            x_start = self.x.copy()
+
+            if self.solver == "rk45":
+                x_new, h = self._adaptive_step(remaining)
+            else:
+                h = remaining if self.max_step is None else min(self.max_step, remaining)
+                x_new, _ = self._rk_step(self.time, x_start, h)
+
+            # check for state events within the step
+            if self.nz > 0:
+                self._set_states(self.time + h, x_new)
+                if self._crossed(self._get_event_indicators()):
+                    h = self._locate_event(x_start, h)
+                    x_new, _ = self._rk_step(self.time, x_start, h)
+                    self._accept(h, x_new)
+                    step_event = self._complete_integrator_step()
+                    return self._check_state_event() or step_event
+                self._z_prev[:] = self.z
+
+            self._accept(h, x_new)
+            if self._complete_integrator_step():
+                return True
+
+        return False
+
+    def _integrate_cvode(self, t_next: float):
+        """Integrate from self.time to t_next with CVode, one internal step at a time (stopping at t_next).
+            Returns True if the integration was stopped by an event.
+        """
+
+        if self._cvode_set_stop_time is None:
+            # one-step mode is not available: the FMU is notified once per interval
+            state_event, _, self.time = self._cvode.step(self.time, t_next)
+            self.stats["n_steps"] += 1
+            step_event = self._complete_integrator_step()
+            if state_event:
+                self._read_event_indicators()
+                self._z_prev[:] = self.z
+            return state_event or step_event
+
+        from fmpy.sundials.cvode import CVode, CV_ROOT_RETURN
+
+        cvode = self._cvode
+        eps = 1e-13 * max(1.0, abs(t_next))
+        while self.time < t_next - eps:
+            cvode.get_x(cvode.px, cvode.nx)
+            self._cvode_set_stop_time(cvode.cvode_mem, t_next)
+            t_return = c_double(0.0)
+            flag = CVode(cvode.cvode_mem, t_next, cvode.x, byref(t_return), CV_ONE_STEP)
+            if flag < 0:
+                raise RuntimeError("CVode error (code %s) in module %s, function %s: %s" % cvode.error_info)
+
+            self.time = t_return.value
+            self._set_states(self.time, np.ctypeslib.as_array(cvode.px, (self.nx,)))
+            self.stats["n_steps"] += 1
+            step_event = self._complete_integrator_step()
+            if flag == CV_ROOT_RETURN:
+                self._read_event_indicators()
+                self._z_prev[:] = self.z
+                return True
+            if step_event:
+                return True
+
+        return False
+
+    def _complete_integrator_step(self):
+        """Notify the FMU of an accepted integrator step (at self.time). Returns True if it requests a step event.
+        """
+
+        self.fmu.setTime(self.time)
+        step_event, terminate_simulation = self.fmu.completedIntegratorStep()
+        if terminate_simulation:
+            raise Exception(f"Model requested termination at t={self.time}.")
+        return step_event
+
+    def _rhs(self, t: float, x: np.ndarray):
+        """Evaluate the derivatives of the model at (t, x).
+        """
+
+        self.fmu.setTime(t)
+        self.x[:] = x
+        self.fmu.setContinuousStates(self._px, self.nx)
+        self.fmu.getDerivatives(self._pdx, self.nx)
+        self.stats["n_rhs"] += 1
+        return self.dx.copy()
+
+    def _rk_step(self, t: float, x: np.ndarray, h: float):
+        """Perform a single explicit Runge-Kutta step.
+            Returns the new states and, for "rk45", the local error estimate.
+        """
+
+        if self.solver == "euler":
+            return x + h * self._rhs(t, x), None
+
+        if self.solver == "rk4":
+            c, a, b = RK4_C, RK4_A, RK4_B
+        else:
+            c, a, b = DP_C, DP_A, DP_B
+
+        k = np.empty((len(c), self.nx))
+        for i in range(len(c)):
+            k[i] = self._rhs(t + c[i] * h, x + h * (a[i] @ k[:i]))
+
+        x_new = x + h * (b @ k)
+        error = h * (DP_E @ k) if self.solver == "rk45" else None
+        return x_new, error
+
+    def _adaptive_step(self, remaining: float):
+        """Take one error-controlled Dormand-Prince step (at most 'remaining' long).
+        """
+
+        atol = self.absolute_tolerance
+        if atol is None:
+            atol = self.relative_tolerance * np.abs(self.x_nominal)
+
+        h = remaining if self._h is None else min(self._h, remaining)
+        if self.max_step is not None:
+            h = min(h, self.max_step)
+
+        x0 = self.x.copy()
+        while True:
+            x_new, error = self._rk_step(self.time, x0, h)
+            scale = atol + self.relative_tolerance * np.maximum(np.abs(x0), np.abs(x_new))
+            error_norm = np.sqrt(np.mean((error / scale) ** 2)) if self.nx > 0 else 0.0
+
+            if error_norm <= 1.0 or h <= self.event_tolerance:
+                # keep the proposed step for following steps, unless it was cut by the step end
+                if h < remaining or self._h is None:
+                    self._h = h * (5.0 if error_norm == 0 else min(5.0, max(0.2, 0.9 * error_norm ** -0.2)))
+                return x_new, h
+
+            self.stats["n_rejected"] += 1
+            h *= max(0.2, 0.9 * error_norm ** -0.2)
+            self._set_states(self.time, x0)
+
+    def _accept(self, h: float, x_new: np.ndarray):
+        self.time += h
+        self._set_states(self.time, x_new)
+        self.stats["n_steps"] += 1
+
+    def _locate_event(self, x0: np.ndarray, h: float):
+        """Find the (shortest) step from (self.time, x0) that crosses an event indicator.
+            Uses regula falsi on the step size, starting from [0, h].
+        """
+
+        z0 = self._z_prev.copy()
+        h_lo, h_hi = 0.0, h
+        z_hi = self.z.copy()
+
+        for _ in range(MAX_EVENT_ITERATIONS):
+            if h_hi - h_lo <= self.event_tolerance:
+                break
+
+            # estimate crossing time (first crossing indicator) by linear interpolation
+            crossed = np.sign(z0) != np.sign(z_hi)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                theta = np.where(crossed, z0 / (z0 - z_hi), 1.0)
+            h_try = min(max(h_lo + (h_hi - h_lo) * 0.01, float(np.min(theta)) * h_hi), h_hi - (h_hi - h_lo) * 0.01)
+
+            x_try, _ = self._rk_step(self.time, x0, h_try)
+            self._set_states(self.time + h_try, x_try)
+            z_try = self._get_event_indicators()
+            if self._crossed(z_try):
+                h_hi, z_hi = h_try, z_try
+            else:
+                h_lo = h_try
+
+        self._set_states(self.time, x0)
+        return h_hi
+
+    # -------------------------------------------------------------------------
+    # events
+
+    def _crossed(self, z: np.ndarray):
+        return bool(np.any((self._z_prev > 0) != (z > 0)))
+
+    def _check_state_event(self):
+        """Check (and acknowledge) sign changes of the event indicators at the current point.
+        """
+
+        if self.nz == 0:
+            return False
+        z = self._get_event_indicators()
+        state_event = self._crossed(z)
+        self._z_prev[:] = z
+        return state_event
+
+    def _handle_event(self):
+        """Event iteration at the current time instant.
+        """
+
+        self.stats["n_events"] += 1
+        self.fmu.enterEventMode()
+        values_changed = self._update_discrete_states()
+        self.fmu.enterContinuousTimeMode()
+
+        if values_changed:
+            self._read_states()
+        self._read_event_indicators()
+        self._z_prev[:] = self.z
+        if self._cvode is not None:
+            self._cvode.reset(self.time)
+
+    def _update_discrete_states(self):
+        """Run the discrete states update loop. Returns True if continuous state values changed.
+        """
+
+        new_discrete_states_needed = True
+        values_changed = False
+        self.next_event_time = None
+        while new_discrete_states_needed:
+            (new_discrete_states_needed,
+             terminate_simulation,
+             nominals_changed,
+             values_of_states_changed,
+             next_event_time_defined,
+             next_event_time) = self.fmu.newDiscreteStates()
+
+            if terminate_simulation:
+                raise Exception(f"Model requested termination during event update at t={self.time}.")
+            if nominals_changed and self.nx > 0:
+                self.fmu.getNominalsOfContinuousStates(self._px_nominal, self.nx)
+            values_changed = values_changed or values_of_states_changed
+            self.next_event_time = next_event_time if next_event_time_defined else None
+
+        return values_changed
+
+    # -------------------------------------------------------------------------
+    # buffers
+
+    def _read_states(self):
+        if self.nx > 0:
+            self.fmu.getContinuousStates(self._px, self.nx)
+
+    def _set_states(self, t: float, x: np.ndarray):
+        self.fmu.setTime(t)
+        if self.nx > 0:
+            self.x[:] = x
+            self.fmu.setContinuousStates(self._px, self.nx)
+
+    def _read_event_indicators(self):
+        if self.nz > 0:
+            self.fmu.getEventIndicators(self._pz, self.nz)
+
+    def _get_event_indicators(self):
+        self._read_event_indicators()
+        return self.z.copy()
+
+    def _create_cvode_solver(self):
+        """Create fmpy's CVode solver (constructor arguments vary across fmpy versions).
+        """
+
+        from fmpy.sundials import CVodeSolver
+
+        solver_args = {
+            "nx": self.nx,
+            "nz": self.nz,
+            "get_x": self.fmu.getContinuousStates,
+            "set_x": self.fmu.setContinuousStates,
+            "get_dx": self.fmu.getDerivatives,
+            "get_z": self.fmu.getEventIndicators,
+            "get_nominals": self.fmu.getNominalsOfContinuousStates,
+            "set_time": self.fmu.setTime,
+            "input": _HeldInputs(),
+            "startTime": self.time,
+            "relativeTolerance": self.relative_tolerance,
+        }
+        if self.max_step is not None:
+            solver_args["maxStep"] = self.max_step
+
+        # one-step mode needs a stop time, so CVode doesn't integrate past the communication point
+        from fmpy.sundials import cvode
+        set_stop_time = getattr(cvode.sundials_cvode, "CVodeSetStopTime", None)
+        if set_stop_time is not None:
+            set_stop_time.argtypes = [c_void_p, c_double]
+            set_stop_time.restype = c_int
+        self._cvode_set_stop_time = set_stop_time
+
+        accepted_args = inspect.signature(CVodeSolver.__init__).parameters
+        return CVodeSolver(**{k: v for k, v in solver_args.items() if k in accepted_args})
+
+    def _reset_stats(self):
+        self.stats = {"n_steps": 0, "n_rejected": 0, "n_rhs": 0, "n_events": 0}
+
+
+class _HeldInputs:
+    """Inputs are set by the connector and held constant over each communication step.
+    """
+
+    def apply(self, *args, **kwargs):
+        pass
+
+
+class BatchedModelExchangeStepper:
+    def __init__(self, steppers: List[ModelExchangeStepper]):
+        """Advance N Model Exchange instances of the same model together.
+
+        States and derivatives of all instances are gathered into (N, n_states) arrays, so the
+        solver arithmetic (stages, error norms, step size control) is vectorized across
+        instances. FMUs are only called to evaluate derivatives and event indicators.
+        Each instance keeps its own time and step size. When a step crosses a state event, that
+        instance integrates the step through its own ModelExchangeStepper (event location).
+
+        Parameters
+        ----------
+        steppers: list
+            ModelExchangeStepper of each instance (already initialized). All of them must share
+            the same model (number of states/event indicators) and solver settings.
+        """
+
+        assert len(steppers) > 0, "At least one stepper has to be provided."
+        reference = steppers[0]
+        for stepper in steppers:
+            assert stepper.nx == reference.nx and stepper.nz == reference.nz, "Steppers must share the same model."
+            assert stepper.solver == reference.solver, "Steppers must share the same solver."
+
+        self.steppers = steppers
+        self.n = len(steppers)
+        self.nx = reference.nx
+        self.nz = reference.nz
+        self.solver = reference.solver
+        self.relative_tolerance = reference.relative_tolerance
+        self.absolute_tolerance = reference.absolute_tolerance
+        self.max_step = reference.max_step
+
+        if self.solver == "euler":
+            self._c, self._a, self._b = np.array([0.0]), [np.array([])], np.array([1.0])
+        elif self.solver == "rk4":
+            self._c, self._a, self._b = RK4_C, RK4_A, RK4_B
+        else:
+            self._c, self._a, self._b = DP_C, DP_A, DP_B
+        n_stages = len(self._c)
+
+        # batched buffers (allocated once), with the row pointers handed over to each FMU
+        self.X = np.zeros((self.n, self.nx))
+        self.X_stage = np.zeros((self.n, self.nx))
+        self.X_new = np.zeros((self.n, self.nx))
+        self.K = np.zeros((n_stages, self.n, self.nx))
+        self.Z = np.zeros((self.n, self.nz))
+        self._x_stage_ptrs = [row.ctypes.data_as(POINTER(c_double)) for row in self.X_stage]
+        self._k_ptrs = [[row.ctypes.data_as(POINTER(c_double)) for row in stage] for stage in self.K]
+        self._z_ptrs = [row.ctypes.data_as(POINTER(c_double)) for row in self.Z]
+        self._h = np.full(self.n, np.nan)
+
+        self.stats = {"n_steps": 0, "n_rejected": 0, "n_rhs": 0, "n_events": 0, "n_fallbacks": 0}
+
+    def do_step(self, current_times, step_sizes, active: np.ndarray = None):
+        """Advance each (active) instance from current_times[i] to current_times[i] + step_sizes[i].
+            Returns a boolean array flagging the instances whose FMU raised an error.
+        """
+
+        t = np.broadcast_to(np.asarray(current_times, dtype=np.float64), (self.n,)).copy()
+        t_end = t + np.broadcast_to(np.asarray(step_sizes, dtype=np.float64), (self.n,))
+        eps = 1e-13 * np.maximum(1.0, np.abs(t_end))
+        active = np.ones(self.n, dtype=bool) if active is None else np.asarray(active, dtype=bool)
+        failed = np.zeros(self.n, dtype=bool)
+
+        # inputs (or states) may have been set since the previous step
+        for i in np.flatnonzero(active):
+            stepper = self.steppers[i]
+            stepper.time = t[i]
+            stepper.fmu.setTime(t[i])
+            stepper._read_states()
+            self.X[i] = stepper.x
+
+        # CVode keeps its own internal state per instance: nothing to vectorize
+        if self.solver == "cvode" or self.nx == 0:
+            for i in np.flatnonzero(active):
+                failed[i] = not self._scalar_step(i, t[i], t_end[i] - t[i])
+            return failed
+
+        while True:
+            running = active & ~failed & (t < t_end - eps)
+            if not running.any():
+                break
+
+            # each instance integrates up to its communication point or its next time event
+            t_next = t_end.copy()
+            for i in np.flatnonzero(running):
+                next_event_time = self.steppers[i].next_event_time
+                if next_event_time is not None and next_event_time < t_next[i]:
+                    t_next[i] = next_event_time
+
+            h, x_new = self._batch_step(running, t, t_next - t, failed)
+            running &= ~failed
+
+            # state events: sign changes of the event indicators within the step
+            crossed = np.zeros(self.n, dtype=bool)
+            if self.nz > 0:
+                for i in np.flatnonzero(running):
+                    if not self._call(i, failed, self._read_event_indicators_row, i, t[i] + h[i], x_new[i]):
+                        continue
+                    stepper = self.steppers[i]
+                    crossed[i] = bool(np.any((stepper._z_prev > 0) != (self.Z[i] > 0)))
+                    if not crossed[i]:
+                        stepper._z_prev[:] = self.Z[i]
+                running &= ~failed
+
+            for i in np.flatnonzero(running):
+                stepper = self.steppers[i]
+                if crossed[i]:
+                    # integrate the step through the scalar stepper, which locates the event
+                    self.stats["n_fallbacks"] += 1
+                    stepper._set_states(t[i], self.X[i])
+                    if not self._scalar_step(i, t[i], h[i]):
+                        failed[i] = True
+                        continue
+                    t[i] += h[i]
+                    self.X[i] = stepper.x
+                    continue
+
+                t[i] += h[i]
+                self.X[i] = x_new[i]
+                if not self._call(i, failed, self._complete_step, i, t[i], eps[i]):
+                    continue
+
+        return failed
+
+    # -------------------------------------------------------------------------
+
+    def _batch_step(self, rows: np.ndarray, t: np.ndarray, remaining: np.ndarray, failed: np.ndarray):
+        """Take one (accepted) step for each of the given rows.
+            Returns the step sizes taken, and the new states (only valid for the given rows).
+        """
+
+        h = np.where(np.isnan(self._h), remaining, np.minimum(self._h, remaining))
+        if self.max_step is not None:
+            h = np.minimum(h, self.max_step)
+        x_new = self.X_new
+
+        pending = rows.copy()
+        while pending.any():
+            k_rows = np.flatnonzero(pending)
+            for s in range(len(self._c)):
+                # X_stage = X + h * sum_j a[s, j] * K[j]
+                self.X_stage[k_rows] = self.X[k_rows] + h[k_rows, None] * np.tensordot(self._a[s], self.K[:s, k_rows], axes=(0, 0))
+                for i in k_rows:
+                    if failed[i]:
+                        continue
+                    self._call(i, failed, self._rhs_row, i, s, t[i] + self._c[s] * h[i])
+            pending &= ~failed
+            k_rows = np.flatnonzero(pending)
+
+            x_new[k_rows] = self.X[k_rows] + h[k_rows, None] * np.tensordot(self._b, self.K[:, k_rows], axes=(0, 0))
+            if self.solver != "rk45":
+                break
+
+            # error control (vectorized across instances)
+            error = h[k_rows, None] * np.tensordot(DP_E, self.K[:, k_rows], axes=(0, 0))
+            atol = self.absolute_tolerance
+            if atol is None:
+                atol = self.relative_tolerance * np.abs(np.stack([self.steppers[i].x_nominal for i in k_rows]))
+            scale = atol + self.relative_tolerance * np.maximum(np.abs(self.X[k_rows]), np.abs(x_new[k_rows]))
+            error_norm = np.sqrt(np.mean((error / scale) ** 2, axis=1))
+
+            factor = np.where(error_norm == 0, 5.0, np.clip(0.9 * np.power(np.maximum(error_norm, 1e-300), -0.2), 0.2, 5.0))
+            accepted = (error_norm <= 1.0) | (h[k_rows] <= self.steppers[0].event_tolerance)
+
+            # keep the proposed step for following steps, unless it was cut by the step end
+            keep = accepted & ((h[k_rows] < remaining[k_rows]) | np.isnan(self._h[k_rows]))
+            self._h[k_rows[keep]] = h[k_rows[keep]] * factor[keep]
+
+            rejected_rows = k_rows[~accepted]
+            self.stats["n_rejected"] += len(rejected_rows)
+            h[rejected_rows] *= np.maximum(0.2, factor[~accepted])
+            pending[:] = False
+            pending[rejected_rows] = True
+
+        self.stats["n_steps"] += int(rows.sum())
+        return h, x_new
+
+    def _rhs_row(self, i: int, stage: int, t: float):
+        """Evaluate the derivatives of instance 'i' at the current stage.
+        """
+
+        fmu = self.steppers[i].fmu
+        fmu.setTime(t)
+        fmu.setContinuousStates(self._x_stage_ptrs[i], self.nx)
+        fmu.getDerivatives(self._k_ptrs[stage][i], self.nx)
+        self.stats["n_rhs"] += 1
+
+    def _read_event_indicators_row(self, i: int, t: float, x: np.ndarray):
+        self.steppers[i]._set_states(t, x)
+        self.steppers[i].fmu.getEventIndicators(self._z_ptrs[i], self.nz)
+
+    def _complete_step(self, i: int, t: float, eps: float):
+        """Finish an accepted step of instance 'i', handling time and step events.
+        """
+
+        stepper = self.steppers[i]
+        stepper.time = t
+        stepper._set_states(t, self.X[i])
+        stepper.stats["n_steps"] += 1
+
+        step_event, terminate_simulation = stepper.fmu.completedIntegratorStep()
+        if terminate_simulation:
+            raise Exception(f"Model requested termination at t={t}.")
+
+        time_event = stepper.next_event_time is not None and t >= stepper.next_event_time - eps
+        if time_event or step_event:
+            self.stats["n_events"] += 1
+            stepper._handle_event()
+            self.X[i] = stepper.x
+
+    def _scalar_step(self, i: int, t: float, h: float):
+        return self._call(i, None, self.steppers[i].do_step, t, h)
+
+    def _call(self, i: int, failed: np.ndarray, function, *args):
+        """Call function(*args) for instance 'i', flagging it as failed if the FMU raises.
+        """
+
+        try:
+            function(*args)
+            return True
+        except Exception as err:
+            logger.error(f"[BatchedModelExchangeStepper] Instance {i} failed at t={self.steppers[i].time:.3f}: {err}")
+            if failed is not None:
+                failed[i] = True
+            return False
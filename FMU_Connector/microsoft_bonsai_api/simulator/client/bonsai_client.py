@@ -1,5 +1,6 @@
 from microsoft_bonsai_api.simulator.generated import SimulatorAPI
 from .config import BonsaiClientConfig, validate_config
+from . import transport
 
 # The API object that handles the REST connection to the bonsai platform.
 class BonsaiClient(SimulatorAPI):
@@ -10,9 +11,22 @@ class BonsaiClient(SimulatorAPI):
             "Authorization": config.access_key,
         }
 
+        # transport options of the config (unless a transport is given)
+        kwargs.setdefault("transport", transport.create_transport(config))
+        kwargs.setdefault("per_call_policies", transport.create_policies(config))
+
         super(BonsaiClient, self).__init__(
             base_url=config.server,
             headers=self._headers,
             logging_enable=config.enable_logging,
-            kwargs=kwargs,
+            **kwargs
         )
+
+        if config.prewarm_connections > 0:
+            self.prewarm(config.prewarm_connections)
+
+    def prewarm(self, count: int) -> int:
+        """Open connections to the server ahead of the first requests."""
+        pipeline_transport = self._client._pipeline._transport
+        pipeline_transport.open()
+        return transport.prewarm(pipeline_transport, self._client._base_url, count)
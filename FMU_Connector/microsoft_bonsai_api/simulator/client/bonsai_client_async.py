@@ -1,5 +1,6 @@
 from microsoft_bonsai_api.simulator.generated.aio import SimulatorAPI
 from .config import BonsaiClientConfig, validate_config
+from . import transport
 
 # The API object that handles the REST connection to the bonsai platform.
 class BonsaiClientAsync(SimulatorAPI):
@@ -10,9 +11,32 @@ class BonsaiClientAsync(SimulatorAPI):
             "Authorization": config.access_key,
         }
 
+        # transport options of the config (unless a transport is given)
+        if "transport" not in kwargs:
+            # aiohttp is only required by the async client
+            from . import transport_async
+
+            kwargs["transport"] = transport_async.create_transport(config)
+        kwargs.setdefault("per_call_policies", transport.create_policies(config))
+        self._prewarm_connections = config.prewarm_connections
+
         super(BonsaiClientAsync, self).__init__(
             base_url=config.server,
             headers=self._headers,
             logging_enable=config.enable_logging,
-            kwargs=kwargs,
+            **kwargs
+        )
+
+    async def prewarm(self, count: int) -> int:
+        """Open connections to the server ahead of the first requests."""
+        from . import transport_async
+
+        return await transport_async.prewarm(
+            self._client._pipeline._transport, self._client._base_url, count
         )
+
+    async def __aenter__(self) -> "BonsaiClientAsync":
+        await super(BonsaiClientAsync, self).__aenter__()
+        if self._prewarm_connections > 0:
+            await self.prewarm(self._prewarm_connections)
+        return self
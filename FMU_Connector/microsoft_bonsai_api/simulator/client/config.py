@@ -28,6 +28,16 @@ _SIM_CONTEXT_HELP = """
     """
 
 
+def _getenv_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _getenv_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
 class BonsaiClientConfig:
     """Configuration information needed to connect to the service."""
 
@@ -36,18 +46,44 @@ class BonsaiClientConfig:
     access_key = ""  # type: str
     simulator_context = ""  # type: str
 
+    # transport options (see transport.py)
+    pool_maxsize = 10  # type: int
+    keep_alive_s = None  # type: Optional[float]
+    compress_threshold = None  # type: Optional[int]
+    advance_timeout = None  # type: Optional[float]
+    prewarm_connections = 0  # type: int
+
     def __init__(
         self,
         workspace: str = "",
         access_key: str = "",
         enable_logging: bool = False,
         argv: Optional[List[str]] = sys.argv,
+        pool_maxsize: int = 10,
+        keep_alive_s: Optional[float] = None,
+        compress_threshold: Optional[int] = None,
+        advance_timeout: Optional[float] = None,
+        prewarm_connections: int = 0,
     ):
         """
         Initialize a config object.
 
         Command line argument switches will take priority over environment variables.
         Environment variables will take priority over initializer parameters.
+
+        Transport options:
+            pool_maxsize: connections kept open per host (e.g: one per simulator
+                session sharing the client). Env: SIM_POOL_MAXSIZE.
+            keep_alive_s: keep idle connections usable for at least this long
+                (e.g: across long Idle events), with TCP keep-alive probes (sync)
+                and the pool's keep-alive timeout (async). Env: SIM_KEEP_ALIVE.
+            compress_threshold: gzip request bodies of at least this many bytes
+                (None to never compress). Env: SIM_COMPRESS_THRESHOLD.
+            advance_timeout: read timeout of 'advance' calls, in seconds (None for
+                the transport default). Env: SIM_ADVANCE_TIMEOUT.
+            prewarm_connections: connections opened when the client is created,
+                so the first requests don't pay for connection setup.
+                Env: SIM_PREWARM_CONNECTIONS.
         """
 
         # defaults
@@ -57,6 +93,12 @@ class BonsaiClientConfig:
         self.simulator_context = os.getenv("SIM_CONTEXT", "")
         self.enable_logging = enable_logging
 
+        self.pool_maxsize = _getenv_int("SIM_POOL_MAXSIZE", pool_maxsize)
+        self.keep_alive_s = _getenv_float("SIM_KEEP_ALIVE", keep_alive_s)
+        self.compress_threshold = _getenv_int("SIM_COMPRESS_THRESHOLD", compress_threshold)
+        self.advance_timeout = _getenv_float("SIM_ADVANCE_TIMEOUT", advance_timeout)
+        self.prewarm_connections = _getenv_int("SIM_PREWARM_CONNECTIONS", prewarm_connections)
+
         if enable_logging:
             logging.basicConfig()
             logger = logging.getLogger("azure")
@@ -104,3 +146,8 @@ def validate_config(config: BonsaiClientConfig):
             "pass in access_key in config constructor, or set the access_key property "
             "on the config object."
         )
+    if config.pool_maxsize < 1:
+        raise RuntimeError(
+            "Connection pool size must be at least 1. Please set env variable "
+            "SIM_POOL_MAXSIZE, or pass in pool_maxsize in config constructor."
+        )
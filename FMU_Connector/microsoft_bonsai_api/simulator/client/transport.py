@@ -0,0 +1,143 @@
+"""
+Transport tuning for the simulator API clients (see BonsaiClientConfig)
+"""
+__copyright__ = "Copyright 2020, Microsoft Corp."
+
+import os
+import gzip
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+from azure.core.pipeline import PipelineRequest
+from azure.core.pipeline.policies import SansIOHTTPPolicy
+from azure.core.pipeline.transport import RequestsTransport
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+from .config import BonsaiClientConfig
+
+
+class GzipRequestPolicy(SansIOHTTPPolicy):
+    """Compress request bodies of at least 'threshold' bytes with gzip."""
+
+    def __init__(self, threshold: int, compresslevel: int = 6):
+        super(GzipRequestPolicy, self).__init__()
+        self.threshold = threshold
+        self.compresslevel = compresslevel
+
+    def on_request(self, request: PipelineRequest) -> None:
+        http_request = request.http_request
+        data = http_request.data
+        if data is None or "Content-Encoding" in http_request.headers:
+            return
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not isinstance(data, bytes) or len(data) < self.threshold:
+            return
+
+        http_request.data = gzip.compress(data, compresslevel=self.compresslevel)
+        http_request.headers["Content-Encoding"] = "gzip"
+        http_request.headers["Content-Length"] = str(len(http_request.data))
+
+
+class AdvanceTimeoutPolicy(SansIOHTTPPolicy):
+    """Set the read timeout of 'advance' calls (unless given per call)."""
+
+    def __init__(self, timeout: float):
+        super(AdvanceTimeoutPolicy, self).__init__()
+        self.timeout = timeout
+
+    def on_request(self, request: PipelineRequest) -> None:
+        if request.http_request.url.split("?")[0].endswith("/advance"):
+            request.context.options.setdefault("read_timeout", self.timeout)
+
+
+def create_policies(config: BonsaiClientConfig) -> List[SansIOHTTPPolicy]:
+    """Per-call policies for the transport options of a config (before retries,
+    so bodies are compressed once)."""
+    policies = []  # type: List[SansIOHTTPPolicy]
+    if config.compress_threshold is not None:
+        policies.append(GzipRequestPolicy(config.compress_threshold))
+    if config.advance_timeout is not None:
+        policies.append(AdvanceTimeoutPolicy(config.advance_timeout))
+    return policies
+
+
+def keep_alive_socket_options(keep_alive_s: float) -> List[Any]:
+    """Socket options sending TCP keep-alive probes on idle connections, so
+    connections (and the middleboxes on their way) stay open while idle."""
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    interval = max(1, int(min(keep_alive_s, 30)))
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, interval))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval))
+    elif hasattr(socket, "TCP_KEEPALIVE"):
+        # macOS
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, interval))
+    return options
+
+
+class PooledHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTP adapter with a sized connection pool, and optional TCP keep-alive."""
+
+    def __init__(self, pool_maxsize: int, keep_alive_s: Optional[float] = None):
+        self.socket_options = None
+        if keep_alive_s is not None:
+            self.socket_options = HTTPConnection.default_socket_options + keep_alive_socket_options(keep_alive_s)
+        # retries are left to the pipeline's RetryPolicy (as azure-core does)
+        super(PooledHTTPAdapter, self).__init__(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(total=False, redirect=False, raise_on_status=False),
+        )
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        if self.socket_options is not None:
+            kwargs["socket_options"] = self.socket_options
+        super(PooledHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+def create_transport(config: BonsaiClientConfig) -> RequestsTransport:
+    """Requests transport with the pool size and keep-alive of a config."""
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(config.pool_maxsize, config.keep_alive_s)
+    for protocol in ("http://", "https://"):
+        session.mount(protocol, adapter)
+    transport_kwargs = resolve_environment_settings(session, config.server)
+    return RequestsTransport(session=session, session_owner=True, **transport_kwargs)
+
+
+def resolve_environment_settings(session: requests.Session, url: str) -> Dict[str, Any]:
+    """Resolve the proxies and CA bundle of the environment once, for the only
+    server the client talks to, instead of on every request (requests does so
+    when trust_env is set, which takes milliseconds per request).
+    Returns the transport kwargs of the settings resolved."""
+    session.proxies = requests.utils.get_environ_proxies(url)
+    session.trust_env = False
+    ca_bundle = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE")
+    return {"connection_verify": ca_bundle} if ca_bundle else {}
+
+
+def prewarm(transport: RequestsTransport, url: str, count: int, timeout: float = 10.0) -> int:
+    """Open up to 'count' connections to the server (concurrently, so each one
+    gets its own connection), and keep them in the pool.
+    Returns the number of connections opened."""
+
+    def head(_: int) -> bool:
+        try:
+            # same TLS settings as the pipeline's requests, so connections land in the same pool
+            transport.session.head(
+                url,
+                timeout=timeout,
+                allow_redirects=False,
+                verify=transport.connection_config.verify,
+                cert=transport.connection_config.cert,
+            )
+            return True
+        except requests.RequestException:
+            return False
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return sum(executor.map(head, range(count)))
@@ -0,0 +1,60 @@
+"""
+Transport tuning for the async simulator API client (requires aiohttp)
+"""
+__copyright__ = "Copyright 2020, Microsoft Corp."
+
+import asyncio
+from typing import Optional
+
+import aiohttp
+from azure.core.pipeline.transport import AioHttpTransport
+
+from .config import BonsaiClientConfig
+
+
+class PooledAioHttpTransport(AioHttpTransport):
+    """aiohttp transport with a sized connection pool, keeping idle connections
+    for 'keep_alive_s' seconds (aiohttp's default is 15s)."""
+
+    def __init__(self, pool_maxsize: int, keep_alive_s: Optional[float] = None, **kwargs):
+        super(PooledAioHttpTransport, self).__init__(**kwargs)
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive_s = keep_alive_s
+
+    async def open(self):
+        if not self.session and self._session_owner:
+            # same session settings as AioHttpTransport.open, with our connector
+            connector_kwargs = {"limit": self.pool_maxsize, "limit_per_host": self.pool_maxsize}
+            if self.keep_alive_s is not None:
+                connector_kwargs["keepalive_timeout"] = self.keep_alive_s
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**connector_kwargs),
+                trust_env=self._use_env_settings,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                auto_decompress=False,
+            )
+        await super(PooledAioHttpTransport, self).open()
+
+
+def create_transport(config: BonsaiClientConfig) -> PooledAioHttpTransport:
+    """aiohttp transport with the pool size and keep-alive of a config."""
+    return PooledAioHttpTransport(config.pool_maxsize, config.keep_alive_s)
+
+
+async def prewarm(transport: AioHttpTransport, url: str, count: int, timeout: float = 10.0) -> int:
+    """Open up to 'count' connections to the server (concurrently, so each one
+    gets its own connection), and keep them in the pool.
+    Returns the number of connections opened."""
+    await transport.open()
+
+    async def head() -> bool:
+        try:
+            async with transport.session.head(
+                url, timeout=aiohttp.ClientTimeout(total=timeout), allow_redirects=False
+            ) as response:
+                await response.read()
+            return True
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    return sum(await asyncio.gather(*(head() for _ in range(count))))
@@ -0,0 +1,289 @@
+"""
+Single-pass reader of the modelDescription.xml of FMU models, for models with a very large number of variables.
+
+The file is streamed with 'iterparse', so the XML tree is never built in memory, and only the fields used by the
+connector are kept per variable. Variables can be filtered while reading (e.g: by causality, or by the names
+selected in the YAML config file), so the ones the connector will never access are not kept at all.
+
+The description returned follows the interface of fmpy's 'ModelDescription' for the attributes used by the connector.
+"""
+
+import os
+import re
+import zipfile
+import contextlib
+
+import xml.etree.ElementTree as ET
+
+import connector_logging
+
+from fmpy import read_model_description
+from fmpy.model_description import ModelDescription, DefaultExperiment, CoSimulation, ModelExchange, ScheduledExecution, SimpleType, Item
+
+from typing import Iterable
+
+
+logger = connector_logging.get_logger("validator")
+
+# Variable types per fmi version (elements holding the type in fmi v'2.0', variable elements in fmi v'3.0')
+FMI2_TYPES = ("Real", "Integer", "Enumeration", "Boolean", "String")
+FMI3_TYPES = ("Float32", "Float64", "Int8", "UInt8", "Int16", "UInt16", "Int32", "UInt32", "Int64", "UInt64",
+              "Boolean", "String", "Binary", "Enumeration", "Clock")
+
+# Elements of the model structure counted for modelExchange models (continuous states and event indicators)
+FMI2_DERIVATIVES = "Derivatives"
+FMI3_DERIVATIVES = "ContinuousStateDerivative"
+FMI3_EVENT_INDICATORS = "EventIndicator"
+
+
+def clean_name(name: str):
+    """Remove non-alphanumeric characters to make names valid with Bonsai interaction.
+    """
+
+    return re.sub(r'[^a-zA-Z0-9_]', '', name)
+
+
+class VariableDescription:
+    """Fields of a model variable used by the connector (see fmpy's 'ScalarVariable' for their meaning).
+    """
+
+    __slots__ = ("name", "valueReference", "type", "causality", "variability", "start", "description",
+                 "declaredType", "shape")
+
+    def __init__(self, name: str, valueReference: int):
+        self.name = name
+        self.valueReference = valueReference
+        self.type = None
+        self.causality = None
+        self.variability = None
+        self.start = None
+        self.description = None
+        self.declaredType = None
+        self.shape = ()
+
+    def __repr__(self):
+        return '%s "%s"' % (self.type, self.name)
+
+
+@contextlib.contextmanager
+def _open_model_description(filename: str):
+    """Open the modelDescription.xml of an FMU file, an unzipped FMU directory, or the XML file itself.
+    """
+
+    if os.path.isdir(filename):
+        with open(os.path.join(filename, "modelDescription.xml"), "rb") as file:
+            yield file
+    elif filename.endswith(".xml"):
+        with open(filename, "rb") as file:
+            yield file
+    else:
+        # streamed from the archive, without extracting it
+        with zipfile.ZipFile(filename, "r") as archive, archive.open("modelDescription.xml") as file:
+            yield file
+
+
+def _read_fmi_version(filename: str):
+    """Read the fmi version from the root element, without parsing the rest of the file.
+    """
+
+    with _open_model_description(filename) as file:
+        for _, element in ET.iterparse(file, events=("start",)):
+            return element.get("fmiVersion")
+
+
+def _to_bool(value: str):
+    return value == "true"
+
+
+def _read_interface(interface, element):
+    """Read the attributes of a CoSimulation/ModelExchange/ScheduledExecution element.
+    """
+
+    interface.modelIdentifier = element.get("modelIdentifier")
+    # note, fmi v'3.0' spells it 'canGetAndSetFMUState'
+    interface.canGetAndSetFMUstate = _to_bool(element.get("canGetAndSetFMUstate", element.get("canGetAndSetFMUState")))
+    interface.canSerializeFMUstate = _to_bool(element.get("canSerializeFMUstate", element.get("canSerializeFMUState")))
+    interface.providesDirectionalDerivative = _to_bool(element.get("providesDirectionalDerivative",
+                                                                   element.get("providesDirectionalDerivatives")))
+    if isinstance(interface, CoSimulation):
+        interface.canHandleVariableCommunicationStepSize = _to_bool(element.get("canHandleVariableCommunicationStepSize"))
+        interface.canInterpolateInputs = _to_bool(element.get("canInterpolateInputs"))
+        interface.maxOutputDerivativeOrder = int(element.get("maxOutputDerivativeOrder", 0))
+        if element.get("fixedInternalStepSize") is not None:
+            interface.fixedInternalStepSize = float(element.get("fixedInternalStepSize"))
+    return interface
+
+
+def read_model_description_streaming(filename: str, causalities: Iterable[str] = None, names: Iterable[str] = None,
+                                     patterns: Iterable = None):
+    """Read the model description of an FMU in a single pass, keeping only the variables needed.
+
+    Parameters
+    ----------
+    filename: str
+        Filepath to the FMU model, its unzipped directory, or its modelDescription.xml.
+    causalities: Iterable[str]
+        If given, only variables with these causalities are kept (e.g: ["parameter", "input", "output"]).
+    names: Iterable[str]
+        If given, only variables with these (cleaned) names are kept (e.g: those selected in the YAML config).
+        Takes precedence over 'causalities'.
+    patterns: Iterable[re.Pattern]
+        If given along with 'names', variables with an original (dotted) name matching any of these are kept too
+        (e.g: patterns of the YAML config, see variable_selection.py).
+    """
+
+    fmi_version = _read_fmi_version(filename)
+    if fmi_version not in ("2.0", "3.0"):
+        # fmi v'1.0' descriptions are structured differently, and read with fmpy instead
+        return read_model_description(filename, validate=False)
+    is_fmi3 = fmi_version != "2.0"
+
+    causalities = set(causalities) if causalities is not None else None
+    names = set(names) if names is not None else None
+    patterns = list(patterns or [])
+
+    model_description = ModelDescription()
+    model_description.fmiVersion = fmi_version
+    type_definitions = {}
+    declared_types = []
+    n_derivatives = 0
+    n_event_indicators = 0
+
+    variables_element = None
+    variable_element = None
+    dimensions = []
+    in_variables = False
+    in_structure = False
+
+    with _open_model_description(filename) as file:
+        context = ET.iterparse(file, events=("start", "end"))
+        _, root = next(context)
+        model_description.guid = root.get("guid", root.get("instantiationToken"))
+        model_description.modelName = root.get("modelName")
+        model_description.description = root.get("description")
+        model_description.generationTool = root.get("generationTool")
+        model_description.variableNamingConvention = root.get("variableNamingConvention", "flat")
+        if root.get("numberOfEventIndicators") is not None:
+            model_description.numberOfEventIndicators = int(root.get("numberOfEventIndicators"))
+
+        for event, element in context:
+            tag = element.tag
+
+            if event == "start":
+                if tag == "ModelVariables":
+                    in_variables = True
+                    variables_element = element
+                elif tag == "ModelStructure":
+                    in_structure = True
+                elif in_variables and variable_element is None and (tag == "ScalarVariable" or (is_fmi3 and tag in FMI3_TYPES)):
+                    # new variable (its type is given by a child element in fmi v'2.0')
+                    variable_element = element
+                    dimensions = []
+                continue
+
+            # --- end events (attributes and children are complete) ---
+            if in_variables and element is variable_element:
+                variable_element = None
+                variable = _read_variable(element, is_fmi3, dimensions)
+                # drop the parsed elements, so memory doesn't grow with the number of variables
+                variables_element.clear()
+                if variable is None:
+                    continue
+                if names is not None:
+                    if clean_name(variable.name) not in names and not any(pattern.fullmatch(variable.name) for pattern in patterns):
+                        continue
+                elif causalities is not None and variable.causality not in causalities:
+                    continue
+                model_description.modelVariables.append(variable)
+                if variable.declaredType is not None:
+                    declared_types.append(variable)
+
+            elif in_variables and tag == "Dimension":
+                dimensions.append(element.get("start"))
+
+            elif tag == "ModelVariables":
+                in_variables = False
+                root.clear()
+
+            elif tag == "ModelStructure":
+                in_structure = False
+
+            elif in_structure:
+                if tag == "Unknown" and not is_fmi3:
+                    continue
+                if tag == FMI2_DERIVATIVES or tag == FMI3_DERIVATIVES:
+                    n_derivatives += len(element) if tag == FMI2_DERIVATIVES else 1
+                elif tag == FMI3_EVENT_INDICATORS:
+                    n_event_indicators += 1
+                element.clear()
+
+            elif tag == "DefaultExperiment":
+                experiment = DefaultExperiment()
+                for attribute in ("startTime", "stopTime", "tolerance", "stepSize"):
+                    if element.get(attribute) is not None:
+                        setattr(experiment, attribute, float(element.get(attribute)))
+                model_description.defaultExperiment = experiment
+
+            elif tag == "CoSimulation":
+                model_description.coSimulation = _read_interface(CoSimulation(), element)
+            elif tag == "ModelExchange":
+                model_description.modelExchange = _read_interface(ModelExchange(), element)
+            elif tag == "ScheduledExecution":
+                model_description.scheduledExecution = _read_interface(ScheduledExecution(), element)
+
+            elif tag == "SimpleType" or tag == "EnumerationType":
+                # only enumerations are kept (their items describe the integer codes exchanged)
+                enumeration = element if tag == "EnumerationType" else element.find("Enumeration")
+                if enumeration is not None:
+                    items = [Item(name=item.get("name"), value=int(item.get("value")), description=item.get("description"))
+                             for item in enumeration.findall("Item")]
+                    type_definitions[element.get("name")] = SimpleType(name=element.get("name"), type="Enumeration", items=items)
+                element.clear()
+
+    if n_derivatives > 0:
+        model_description.numberOfContinuousStates = n_derivatives
+    if is_fmi3:
+        model_description.numberOfEventIndicators = n_event_indicators
+
+    # resolve declared types (only enumerations are kept)
+    model_description.typeDefinitions = list(type_definitions.values())
+    for variable in declared_types:
+        variable.declaredType = type_definitions.get(variable.declaredType)
+
+    return model_description
+
+
+def _read_variable(element, is_fmi3: bool, dimensions: list):
+    """Read the fields kept of a variable element (ScalarVariable in fmi v'2.0', typed element in fmi v'3.0').
+    """
+
+    variable = VariableDescription(element.get("name"), int(element.get("valueReference")))
+    variable.description = element.get("description")
+    variable.causality = element.get("causality", "local")
+
+    if is_fmi3:
+        variable.type = element.tag
+        value_element = element
+        variable.declaredType = element.get("declaredType")
+        if dimensions:
+            if any(start is None for start in dimensions):
+                logger.warning(f"Variable '{variable.name}' will be skipped. FMU connector cannot currently handle arrays with variable dimensions.")
+                return None
+            variable.shape = tuple(int(start) for start in dimensions)
+    else:
+        value_element = next((child for child in element if child.tag in FMI2_TYPES), None)
+        if value_element is None:
+            return None
+        variable.type = value_element.tag
+        variable.declaredType = value_element.get("declaredType")
+
+    default_variability = "continuous" if variable.type in ("Real", "Float32", "Float64") else "discrete"
+    variable.variability = element.get("variability", default_variability)
+    if is_fmi3 and variable.type in ("String", "Binary"):
+        # starts of String and Binary variables are given by <Start value="..."/> elements (as read by fmpy)
+        start_element = element.find("Start")
+        variable.start = start_element.get("value") if start_element is not None else None
+    else:
+        variable.start = value_element.get("start")
+
+    return variable
@@ -0,0 +1,538 @@
+"""
+Local RPC server exposing FMUConnector instances to external trainers on the same host, over a Unix domain socket.
+
+Each request applies one operation to a batch of instances (by index), and each response carries the results for the
+whole batch, so a trainer driving many instances pays a single round trip per operation:
+    - "reset":          reset the instances with a config each, and return their states
+    - "step":           apply an action to each instance, run a step, and return their states
+    - "get_state":      return the states of the instances
+    - "snapshot":       save the state of each instance (see FMUConnector.save_snapshot), returning snapshot ids
+    - "restore":        restore each instance to a snapshot id, and return their states
+    - "free_snapshot":  release snapshot ids
+
+Values are exchanged in the fixed field order of the server's layouts ("config", "action", and "state"), sent once in
+the handshake (see RPCServer.get_info). Messages are length-prefixed, and encoded with one of the codecs:
+    - "msgpack":  rows of values (requires msgpack)
+    - "struct":   fixed-layout binary records, with a struct format derived from the variable table (float64, int64,
+                  or bool fields, with array variables flattened). Config fields are float64, with NaN for the values
+                  not given.
+The codec is chosen by the client, per connection (msgpack if available, by default).
+
+Note, Unix domain sockets are not available on every platform (e.g: Python on Windows).
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import socketserver
+import threading
+
+import numpy as np
+
+import connector_logging
+
+from typing import Any, Dict, List, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+logger = connector_logging.get_logger()
+
+# Operations, with the kind of payload of their requests and responses (None: no payload)
+OPS = {
+    "reset": ("config", "state"),
+    "step": ("action", "state"),
+    "get_state": (None, "state"),
+    "snapshot": (None, "snapshot"),
+    "restore": ("snapshot", "state"),
+    "free_snapshot": ("snapshot", None),
+}
+OP_NAMES = tuple(OPS.keys())
+
+ENCODINGS = ("msgpack", "struct")
+DEFAULT_ENCODING = "msgpack" if msgpack is not None else "struct"
+
+# Frames are prefixed by their length, requests by their op code and number of instances, responses by their status
+FRAME_HEADER = struct.Struct("<I")
+REQUEST_HEADER = struct.Struct("<BI")
+RESPONSE_HEADER = struct.Struct("<BI")
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Field kinds (NumPy type codes) per value type, and their struct format characters
+TYPES_TO_KINDS = {float: "<f8", int: "<i8", bool: "?"}
+KINDS_TO_STRUCT_CODES = {"<f8": "d", "<i8": "q", "?": "?"}
+
+
+def get_layout(names: List[str], types_f: Dict[str, Any], shapes: Dict[str, tuple], values: Dict[str, Any] = None,
+               kind: str = None):
+    """Get the layout of the given fields: a list of (name, kind, shape), in order.
+        Kinds are taken from the value types of the variable table (or from sample 'values', for fields not in the
+        table, e.g: reserved FMU_* states), unless a 'kind' is given. Non-numeric fields are left out.
+    """
+
+    values = values or {}
+    layout = []
+    for name in names:
+        type_f = types_f.get(name)
+        if type_f is None and name in values:
+            type_f = bool if isinstance(values[name], (bool, np.bool_)) else int if isinstance(values[name], (int, np.integer)) else float
+        if type_f not in TYPES_TO_KINDS:
+            logger.warning(f"[FMU Connector] Field '{name}' is not numeric, and is left out of the RPC layout.")
+            continue
+        shape = tuple(shapes.get(name, ()))
+        if not shape and name in values and np.ndim(values[name]) > 0:
+            shape = np.shape(values[name])
+        layout.append((name, kind or TYPES_TO_KINDS[type_f], shape))
+    return layout
+
+
+def _to_builtin(value):
+    """Convert NumPy values (e.g: arrays of actions) for msgpack.
+    """
+
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Cannot encode value of type {type(value).__name__}")
+
+
+class MsgpackCodec:
+    """Messages as msgpack arrays: requests [op code, ids, payload], responses [status, payload].
+        Rows are lists of values in layout order (arrays as nested lists, None for config values not given).
+    """
+
+    name = "msgpack"
+
+    def __init__(self, layouts: Dict[str, List[tuple]]):
+        if msgpack is None:
+            raise ImportError("The 'msgpack' codec requires msgpack (pip install msgpack), use the 'struct' codec instead.")
+        self.layouts = layouts
+
+    def encode_request(self, op: str, ids: List[int], payload=None):
+        return msgpack.packb([OP_NAMES.index(op), list(ids), payload], default=_to_builtin)
+
+    def decode_request(self, data: bytes):
+        op_code, ids, payload = msgpack.unpackb(data)
+        return OP_NAMES[op_code], ids, payload
+
+    def encode_response(self, op: str, payload=None):
+        return msgpack.packb([STATUS_OK, payload], default=_to_builtin)
+
+    def encode_error(self, message: str):
+        return msgpack.packb([STATUS_ERROR, message])
+
+    def decode_response(self, op: str, data: bytes):
+        status, payload = msgpack.unpackb(data)
+        if status == STATUS_ERROR:
+            raise RuntimeError(f"[FMU Connector] RPC '{op}' failed: {payload}")
+        return payload
+
+
+class StructCodec:
+    """Messages as fixed-layout binary records: a header, the instance ids (uint32), and a record per instance,
+        packed with a struct format compiled from the layout (array variables are flattened, in row-major order).
+        States are followed by their halted flags (bool), and snapshot ids are uint32.
+    """
+
+    name = "struct"
+
+    def __init__(self, layouts: Dict[str, List[tuple]]):
+        self.layouts = layouts
+        self.formats = {"snapshot": struct.Struct("<I")}
+        self.array_sizes = {}
+        for kind, layout in layouts.items():
+            sizes = [int(np.prod(shape)) if shape else 0 for _, _, shape in layout]
+            self.formats[kind] = struct.Struct("<" + "".join(KINDS_TO_STRUCT_CODES[field_kind] * max(1, size)
+                                                             for (_, field_kind, _), size in zip(layout, sizes)))
+            if any(sizes):
+                self.array_sizes[kind] = sizes
+
+    def encode_request(self, op: str, ids: List[int], payload=None):
+        data = REQUEST_HEADER.pack(OP_NAMES.index(op), len(ids)) + struct.pack(f"<{len(ids)}I", *ids)
+        kind = OPS[op][0]
+        if kind is not None:
+            data += self._pack(kind, payload)
+        return data
+
+    def decode_request(self, data: bytes):
+        op_code, count = REQUEST_HEADER.unpack_from(data)
+        op = OP_NAMES[op_code]
+        offset = REQUEST_HEADER.size
+        ids = list(struct.unpack_from(f"<{count}I", data, offset))
+        offset += 4 * count
+        payload = None
+        kind = OPS[op][0]
+        if kind is not None:
+            payload = self._unpack(kind, data, offset, count)
+            if kind == "config":
+                payload = [[None if value != value else value for value in row] for row in payload]
+        return op, ids, payload
+
+    def encode_response(self, op: str, payload=None):
+        kind = OPS[op][1]
+        if kind is None:
+            return RESPONSE_HEADER.pack(STATUS_OK, 0)
+        if kind == "state":
+            rows, halted = payload
+            return (RESPONSE_HEADER.pack(STATUS_OK, len(rows)) + self._pack(kind, rows)
+                    + struct.pack(f"<{len(halted)}?", *halted))
+        return RESPONSE_HEADER.pack(STATUS_OK, len(payload)) + self._pack(kind, payload)
+
+    def encode_error(self, message: str):
+        return RESPONSE_HEADER.pack(STATUS_ERROR, 0) + message.encode("utf-8")
+
+    def decode_response(self, op: str, data: bytes):
+        status, count = RESPONSE_HEADER.unpack_from(data)
+        if status == STATUS_ERROR:
+            raise RuntimeError(f"[FMU Connector] RPC '{op}' failed: {data[RESPONSE_HEADER.size:].decode('utf-8')}")
+        kind = OPS[op][1]
+        if kind is None:
+            return None
+        values = self._unpack(kind, data, RESPONSE_HEADER.size, count)
+        if kind == "state":
+            offset = RESPONSE_HEADER.size + self.formats[kind].size * count
+            return values, list(struct.unpack_from(f"<{count}?", data, offset))
+        return values
+
+    def _pack(self, kind: str, rows) -> bytes:
+        if isinstance(rows, np.ndarray):
+            rows = rows.tolist()
+        if kind == "snapshot":
+            return struct.pack(f"<{len(rows)}I", *rows)
+        if kind == "config":
+            rows = [[np.nan if value is None else value for value in row] for row in rows]
+        if kind in self.array_sizes:
+            rows = [self._flatten(row, self.array_sizes[kind]) for row in rows]
+        pack = self.formats[kind].pack
+        return b"".join(pack(*row) for row in rows)
+
+    def _unpack(self, kind: str, data: bytes, offset: int, count: int):
+        if kind == "snapshot":
+            return list(struct.unpack_from(f"<{count}I", data, offset))
+        record = self.formats[kind]
+        rows = list(record.iter_unpack(memoryview(data)[offset:offset + record.size * count]))
+        if kind in self.array_sizes:
+            rows = [self._unflatten(row, self.layouts[kind], self.array_sizes[kind]) for row in rows]
+        return rows
+
+    @staticmethod
+    def _flatten(row, sizes: List[int]):
+        values = []
+        for value, size in zip(row, sizes):
+            if size:
+                values.extend(np.ravel(value).tolist())
+            else:
+                values.append(value)
+        return values
+
+    @staticmethod
+    def _unflatten(values, layout: List[tuple], sizes: List[int]):
+        row = []
+        offset = 0
+        for (_, _, shape), size in zip(layout, sizes):
+            if size:
+                row.append(np.reshape(values[offset:offset + size], shape).tolist())
+                offset += size
+            else:
+                row.append(values[offset])
+                offset += 1
+        return row
+
+
+CODECS = {"msgpack": MsgpackCodec, "struct": StructCodec}
+
+
+def send_frame(sock: socket.socket, data: bytes):
+    sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+
+def recv_frame(rfile):
+    """Read a frame from a (buffered) socket file. Returns None once the connection is closed.
+    """
+
+    header = rfile.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    data = rfile.read(size)
+    if len(data) < size:
+        return None
+    return data
+
+
+class _UnixStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Serve the requests of a connection: a JSON handshake choosing the codec, then framed requests.
+    """
+
+    def handle(self):
+        rpc_server = self.server.rpc_server
+        handshake = recv_frame(self.rfile)
+        if handshake is None:
+            return
+        try:
+            encoding = json.loads(handshake).get("encoding", DEFAULT_ENCODING)
+            codec = CODECS[encoding](rpc_server.layouts)
+            send_frame(self.connection, json.dumps(rpc_server.get_info(encoding)).encode("utf-8"))
+        except Exception as err:
+            send_frame(self.connection, json.dumps({"error": repr(err)}).encode("utf-8"))
+            return
+
+        while True:
+            data = recv_frame(self.rfile)
+            if data is None:
+                return
+            op = None
+            try:
+                op, ids, payload = codec.decode_request(data)
+                response = codec.encode_response(op, rpc_server.call(op, ids, payload))
+            except Exception as err:
+                logger.warning(f"[FMU Connector] RPC '{op}' failed: {err!r}")
+                response = codec.encode_error(repr(err))
+            send_frame(self.connection, response)
+
+
+class RPCServer:
+    """Serve operations on a list of FMUConnector instances (of the same model) over a Unix domain socket.
+        Operations are serialized: requests of concurrent connections are applied one at a time.
+    """
+
+    def __init__(self, connectors: List, socket_path: str):
+        """
+        connectors: list
+            Initialized FMUConnector instances of the same model.
+        socket_path: str
+            Path of the Unix domain socket to listen on (removed first, if it exists).
+        """
+
+        self.connectors = connectors
+        self.socket_path = socket_path
+        self.layouts = self._get_layouts(connectors[0])
+        self.snapshots = {}
+        self._next_snapshot_id = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+
+    @staticmethod
+    def _get_layouts(connector):
+        """Get the layouts of configs, actions and states, from the variable table (and a state of the model).
+        """
+
+        state = connector.get_state_vars()
+        types_f = connector.vars_to_type_f
+        shapes = connector.vars_to_shape
+        return {
+            "config": get_layout(connector.sim_config_params, types_f, shapes, kind="<f8"),
+            "action": get_layout(connector.sim_inputs, types_f, shapes),
+            "state": get_layout(list(state.keys()), types_f, shapes, values=state),
+        }
+
+
+    def get_info(self, encoding: str = DEFAULT_ENCODING):
+        """Get the description sent to clients on connection: instances, codec, and layouts.
+        """
+
+        return {"num_instances": len(self.connectors), "encoding": encoding,
+                "layouts": {kind: [[name, field_kind, list(shape)] for name, field_kind, shape in layout]
+                            for kind, layout in self.layouts.items()}}
+
+
+    def call(self, op: str, ids: List[int], payload=None):
+        """Apply an operation to the instances given (see OPS), and return its payload.
+        """
+
+        with self._lock:
+            return getattr(self, "_" + op)(ids, payload)
+
+
+    def _reset(self, ids, configs):
+        names = [name for name, _, _ in self.layouts["config"]]
+        for index, row in zip(ids, configs):
+            config = {name: value for name, value in zip(names, row) if value is not None}
+            self.connectors[index].reset(config)
+        return self._get_state(ids)
+
+
+    def _step(self, ids, actions):
+        names = [name for name, _, _ in self.layouts["action"]]
+        for index, row in zip(ids, actions):
+            connector = self.connectors[index]
+            if names:
+                connector.apply_actions(dict(zip(names, row)))
+            connector.run_step()
+        return self._get_state(ids)
+
+
+    def _get_state(self, ids, payload=None):
+        rows = []
+        halted = []
+        for index in ids:
+            connector = self.connectors[index]
+            state = connector.get_state_vars()
+            rows.append([self._to_value(state.get(name, 0), shape) for name, _, shape in self.layouts["state"]])
+            halted.append(connector.halted())
+        return rows, halted
+
+
+    def _snapshot(self, ids, payload=None):
+        snapshot_ids = []
+        for index in ids:
+            snapshot = self.connectors[index].save_snapshot()
+            self._next_snapshot_id += 1
+            self.snapshots[self._next_snapshot_id] = (index, snapshot)
+            snapshot_ids.append(self._next_snapshot_id)
+        return snapshot_ids
+
+
+    def _restore(self, ids, snapshot_ids):
+        for index, snapshot_id in zip(ids, snapshot_ids):
+            self.connectors[index].restore_snapshot(self._get_snapshot(index, snapshot_id))
+        return self._get_state(ids)
+
+
+    def _free_snapshot(self, ids, snapshot_ids):
+        for index, snapshot_id in zip(ids, snapshot_ids):
+            snapshot = self._get_snapshot(index, snapshot_id)
+            self.connectors[index].free_snapshot(snapshot)
+            del self.snapshots[snapshot_id]
+
+
+    def _get_snapshot(self, index: int, snapshot_id: int):
+        if snapshot_id not in self.snapshots:
+            raise Exception(f"Unknown snapshot id: {snapshot_id}.")
+        snapshot_index, snapshot = self.snapshots[snapshot_id]
+        if snapshot_index != index:
+            raise Exception(f"Snapshot {snapshot_id} was saved from instance {snapshot_index}, not {index}.")
+        return snapshot
+
+
+    @staticmethod
+    def _to_value(value, shape):
+        if shape:
+            return np.asarray(value).tolist()
+        return value
+
+
+    def serve_forever(self):
+        """Listen on the socket, and serve connections until 'stop' is called (or interrupted).
+        """
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = _UnixStreamServer(self.socket_path, _RequestHandler)
+        self._server.rpc_server = self
+        logger.info(f"[FMU Connector] Serving {len(self.connectors)} instance(s) at {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+    def start(self):
+        """Serve in a background thread (returns once the socket is listening).
+        """
+
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        while self._server is None or not os.path.exists(self.socket_path):
+            time.sleep(0.01)
+        return self
+
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+        for index, snapshot in self.snapshots.values():
+            self.connectors[index].free_snapshot(snapshot)
+        self.snapshots = {}
+
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class RPCClient:
+    """Client of an RPCServer. Each method applies an operation to a batch of instances (by index).
+        Rows are sequences of values in the order of the server's layouts (see 'config_names', 'action_names'
+        and 'state_names'), and states are returned with their halted flags.
+    """
+
+    def __init__(self, socket_path: str, encoding: str = DEFAULT_ENCODING, timeout: float = None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self.rfile = self.sock.makefile("rb")
+
+        send_frame(self.sock, json.dumps({"encoding": encoding}).encode("utf-8"))
+        info = json.loads(recv_frame(self.rfile))
+        if "error" in info:
+            self.close()
+            raise RuntimeError(f"[FMU Connector] RPC connection refused: {info['error']}")
+
+        self.num_instances = info["num_instances"]
+        self.layouts = {kind: [(name, field_kind, tuple(shape)) for name, field_kind, shape in layout]
+                        for kind, layout in info["layouts"].items()}
+        self.config_names = [name for name, _, _ in self.layouts["config"]]
+        self.action_names = [name for name, _, _ in self.layouts["action"]]
+        self.state_names = [name for name, _, _ in self.layouts["state"]]
+        self.codec = CODECS[encoding](self.layouts)
+
+
+    def call(self, op: str, ids: List[int], payload=None):
+        send_frame(self.sock, self.codec.encode_request(op, ids, payload))
+        data = recv_frame(self.rfile)
+        if data is None:
+            raise ConnectionError("[FMU Connector] RPC server closed the connection.")
+        return self.codec.decode_response(op, data)
+
+
+    def reset(self, ids: List[int], configs: List[Dict[str, Any]] = None) -> Tuple[List, List[bool]]:
+        """Reset the instances, with a config dict each (fields not given keep their defaults).
+        """
+
+        configs = configs or [{}] * len(ids)
+        rows = [[config.get(name) for name in self.config_names] for config in configs]
+        return self.call("reset", ids, rows)
+
+    def step(self, ids: List[int], actions) -> Tuple[List, List[bool]]:
+        return self.call("step", ids, actions)
+
+    def get_state(self, ids: List[int]) -> Tuple[List, List[bool]]:
+        return self.call("get_state", ids)
+
+    def snapshot(self, ids: List[int]) -> List[int]:
+        return self.call("snapshot", ids)
+
+    def restore(self, ids: List[int], snapshot_ids: List[int]) -> Tuple[List, List[bool]]:
+        return self.call("restore", ids, snapshot_ids)
+
+    def free_snapshot(self, ids: List[int], snapshot_ids: List[int]):
+        return self.call("free_snapshot", ids, snapshot_ids)
+
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
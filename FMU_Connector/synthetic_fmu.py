@@ -0,0 +1,517 @@
+"""
+Pure-Python stand-in for an fmpy FMU instance.
+
+Implements the subset of the fmpy 'FMU2Slave' (and 'FMU2Model') interface used by FMUConnector,
+so the connector can be exercised (and benchmarked) on machines where the vendor binaries
+cannot be loaded -- e.g. the win64-only samples on a Linux build box.
+
+Usage:
+    model_description = make_model_description(n_real=1000, n_integer=10)
+    fmu_factory = synthetic_fmu_factory(model_description, step_cost=1e-4)
+    connector = FMUConnector("synthetic.fmu",
+                             model_description=model_description,
+                             fmu_factory=fmu_factory)
+"""
+
+import os
+import time
+import random
+import contextlib
+import tempfile
+
+import numpy as np
+from fmpy.model_description import ModelDescription, ScalarVariable, DefaultExperiment, CoSimulation, ModelExchange
+
+from typing import Dict
+
+
+# default share of variables per causality (remaining variables are set as "local")
+DEFAULT_CAUSALITIES = {"parameter": 0.1, "input": 0.1, "output": 0.4, "local": 0.4}
+
+
+def make_model_description(
+    n_real: int = 10,
+    n_integer: int = 0,
+    causalities: Dict[str, float] = None,
+    model_name: str = "Synthetic",
+    step_size: float = 0.1,
+    stop_time: float = None,
+    can_get_and_set_state: bool = True,
+    model_type: str = "coSimulation",
+    n_event_indicators: int = 0,
+):
+    """Build an fmpy ModelDescription for a synthetic model.
+
+    Parameters
+    ----------
+    n_real: int
+        Number of variables of type "Real" (named 'r0', 'r1', ...).
+    n_integer: int
+        Number of variables of type "Integer" (named 'i0', 'i1', ...).
+    causalities: dict
+        Share of variables per causality (e.g: {"input": 0.2, "output": 0.8}).
+        Each type gets at least one "input" and one "output" variable.
+    model_type: str
+        "coSimulation" or "modelExchange". For modelExchange, every Real variable that is
+        neither an input nor a parameter is a continuous state.
+    n_event_indicators: int
+        Number of event indicators (modelExchange only), crossing zero when the first
+        continuous states cross SyntheticFMU2Model.EVENT_THRESHOLD.
+    """
+
+    if causalities is None:
+        causalities = DEFAULT_CAUSALITIES
+    total_share = float(sum(causalities.values()))
+    assert total_share > 0, "Provided causalities do not add up to a positive share: {}".format(causalities)
+
+    model_description = ModelDescription()
+    model_description.fmiVersion = "2.0"
+    model_description.modelName = model_name
+    model_description.guid = "{synthetic-%d-%d}" % (n_real, n_integer)
+    model_description.description = "Synthetic model for connector scale and load testing."
+    model_description.defaultExperiment = DefaultExperiment(startTime=0.0, stopTime=stop_time, stepSize=step_size)
+    if model_type == "modelExchange":
+        model_description.modelExchange = ModelExchange(modelIdentifier=model_name)
+        model_description.modelExchange.canGetAndSetFMUstate = can_get_and_set_state
+    else:
+        model_description.coSimulation = CoSimulation(modelIdentifier=model_name)
+        model_description.coSimulation.canHandleVariableCommunicationStepSize = True
+        model_description.coSimulation.canGetAndSetFMUstate = can_get_and_set_state
+
+    value_reference = 0
+    for var_type, prefix, n_vars in (("Real", "r", n_real), ("Integer", "i", n_integer)):
+        var_causalities = _distribute_causalities(n_vars, causalities, total_share)
+        for i in range(n_vars):
+            causality = var_causalities[i]
+            variable = ScalarVariable(name="{}{}".format(prefix, i), valueReference=value_reference)
+            variable.type = var_type
+            variable.causality = causality
+            variable.variability = "fixed" if causality == "parameter" else "continuous"
+            if var_type == "Integer":
+                variable.variability = "fixed" if causality == "parameter" else "discrete"
+            variable.initial = "exact"
+            variable.start = "1" if var_type == "Integer" else "0.5"
+            variable.description = "synthetic {} {}".format(causality, var_type)
+            model_description.modelVariables.append(variable)
+            value_reference += 1
+
+    if model_type == "modelExchange":
+        model_description.numberOfContinuousStates = len([v for v in model_description.modelVariables
+                                                          if v.type == "Real" and v.causality not in ("input", "parameter")])
+        model_description.numberOfEventIndicators = min(n_event_indicators, model_description.numberOfContinuousStates)
+
+    return model_description
+
+
+def _distribute_causalities(n_vars: int, causalities: Dict[str, float], total_share: float):
+    """Assign a causality to each of 'n_vars' variables following the given shares.
+    """
+
+    if n_vars == 0:
+        return []
+
+    var_causalities = []
+    for causality, share in causalities.items():
+        var_causalities.extend([causality] * int(round(n_vars * share / total_share)))
+    var_causalities = (var_causalities + ["local"] * n_vars)[:n_vars]
+
+    # ensure each type exposes at least one input and one output to the brain
+    if n_vars > 1:
+        if "input" not in var_causalities:
+            var_causalities[0] = "input"
+        if "output" not in var_causalities:
+            var_causalities[-1] = "output"
+
+    return var_causalities
+
+
+class SyntheticFMU2Slave:
+    def __init__(
+        self,
+        model_description,
+        instanceName: str = "synthetic",
+        step_cost: float = 0.0,
+        failure_rate: float = 0.0,
+        fail_at_time: float = None,
+        seed: int = None,
+        **kwargs
+    ):
+        """Synthetic co-simulation FMU instance (fmpy 'FMU2Slave' look-alike).
+
+        Every non-parameter variable relaxes towards the value of an input (or parameter)
+        variable with a variable-specific rate, so outputs depend on both config and actions.
+
+        Parameters
+        ----------
+        model_description: ModelDescription
+            Description to be simulated, e.g: as built by make_model_description.
+        step_cost: float
+            Seconds of (busy) compute to spend in each call to doStep.
+        failure_rate: float
+            Probability of each call to doStep raising an exception.
+        fail_at_time: float
+            If given, every call to doStep past this simulation time raises an exception.
+        """
+
+        self.model_description = model_description
+        self.instanceName = instanceName
+        self.step_cost = step_cost
+        self.failure_rate = failure_rate
+        self.fail_at_time = fail_at_time
+        self.fmiCallLogger = None
+        self._random = random.Random(seed)
+
+        # value reference lookup tables: vr --> position in the real/integer buffers
+        real_vars = [v for v in model_description.modelVariables if v.type == "Real"]
+        int_vars = [v for v in model_description.modelVariables if v.type != "Real"]
+        n_vrs = 1 + max([v.valueReference for v in model_description.modelVariables], default=0)
+        self._vr_is_real = np.zeros(n_vrs, dtype=bool)
+        self._vr_to_pos = np.zeros(n_vrs, dtype=np.int64)
+        for pos, variable in enumerate(real_vars):
+            self._vr_is_real[variable.valueReference] = True
+            self._vr_to_pos[variable.valueReference] = pos
+        for pos, variable in enumerate(int_vars):
+            self._vr_to_pos[variable.valueReference] = pos
+
+        self._real_starts = np.array([float(v.start or 0.0) for v in real_vars], dtype=np.float64)
+        self._int_starts = np.array([int(v.start or 0) for v in int_vars], dtype=np.int64)
+        self._reals = self._real_starts.copy()
+        self._ints = self._int_starts.copy()
+
+        # dynamics: each driven variable relaxes towards its driving (input/parameter) variable
+        def dynamics(variables):
+            drivers = [pos for pos, v in enumerate(variables) if v.causality in ("input", "parameter")]
+            driven = [pos for pos, v in enumerate(variables) if v.causality not in ("input", "parameter")]
+            if not drivers:
+                drivers = [0] if variables else []
+            driving = [drivers[k % len(drivers)] for k in range(len(driven))]
+            return np.array(driven, dtype=np.int64), np.array(driving, dtype=np.int64)
+
+        self._real_driven, self._real_driving = dynamics(real_vars)
+        self._int_driven, _ = dynamics(int_vars)
+        self._rates = 0.5 + np.arange(len(self._real_driven), dtype=np.float64) % 7
+
+        self._time = 0.0
+
+    # -------------------------------------------------------------------------
+    # life cycle
+
+    def instantiate(self, visible=False, loggingOn=False):
+        self._log("fmi2Instantiate", self.instanceName)
+        self.reset()
+
+    def setupExperiment(self, tolerance=None, startTime=0.0, stopTime=None):
+        self._log("fmi2SetupExperiment", startTime)
+        self._time = float(startTime)
+
+    def enterInitializationMode(self):
+        self._log("fmi2EnterInitializationMode")
+
+    def exitInitializationMode(self):
+        self._log("fmi2ExitInitializationMode")
+
+    def reset(self):
+        self._log("fmi2Reset")
+        np.copyto(self._reals, self._real_starts)
+        np.copyto(self._ints, self._int_starts)
+        self._time = 0.0
+
+    def terminate(self):
+        self._log("fmi2Terminate")
+
+    def freeInstance(self):
+        self._log("fmi2FreeInstance")
+
+    # -------------------------------------------------------------------------
+    # simulation
+
+    def doStep(self, currentCommunicationPoint, communicationStepSize, noSetFMUStatePriorToCurrentPoint=True):
+        self._log("fmi2DoStep", currentCommunicationPoint, communicationStepSize)
+
+        if self.step_cost > 0:
+            # busy wait to emulate the cost of solving the model equations
+            end_time = time.perf_counter() + self.step_cost
+            while time.perf_counter() < end_time:
+                pass
+
+        failed = self.failure_rate > 0 and self._random.random() < self.failure_rate
+        if self.fail_at_time is not None and currentCommunicationPoint >= self.fail_at_time:
+            failed = True
+        if failed:
+            raise Exception("fmi2DoStep failed with status 3 (error).")
+
+        h = communicationStepSize
+        if len(self._real_driven) > 0:
+            x = self._reals[self._real_driven]
+            u = self._reals[self._real_driving]
+            # exact solution of x' = rate * (u - x) over the step, stable for any step size
+            self._reals[self._real_driven] = u + (x - u) * np.exp(-self._rates * h)
+        if len(self._int_driven) > 0:
+            self._ints[self._int_driven] += 1
+
+        self._time = currentCommunicationPoint + communicationStepSize
+
+    # -------------------------------------------------------------------------
+    # variable access
+
+    def getReal(self, vr):
+        self._log("fmi2GetReal", vr)
+        vr = np.asarray(vr, dtype=np.int64)
+        is_real = self._vr_is_real[vr]
+        if is_real.all():
+            return self._reals[self._vr_to_pos[vr]].tolist()
+        values = np.where(is_real,
+                          self._reals[np.where(is_real, self._vr_to_pos[vr], 0)] if len(self._reals) else 0.0,
+                          self._ints[np.where(is_real, 0, self._vr_to_pos[vr])] if len(self._ints) else 0)
+        return values.astype(np.float64).tolist()
+
+    def setReal(self, vr, value):
+        self._log("fmi2SetReal", vr, value)
+        vr = np.asarray(vr, dtype=np.int64)
+        value = np.asarray(value, dtype=np.float64)
+        is_real = self._vr_is_real[vr]
+        self._reals[self._vr_to_pos[vr[is_real]]] = value[is_real]
+        self._ints[self._vr_to_pos[vr[~is_real]]] = value[~is_real].astype(np.int64)
+
+    def getInteger(self, vr):
+        self._log("fmi2GetInteger", vr)
+        vr = np.asarray(vr, dtype=np.int64)
+        return self._ints[self._vr_to_pos[vr]].tolist()
+
+    def setInteger(self, vr, value):
+        self._log("fmi2SetInteger", vr, value)
+        vr = np.asarray(vr, dtype=np.int64)
+        self._ints[self._vr_to_pos[vr]] = np.asarray(value, dtype=np.int64)
+
+    # -------------------------------------------------------------------------
+    # FMU state
+
+    def getFMUstate(self):
+        self._log("fmi2GetFMUstate")
+        return (self._time, self._reals.copy(), self._ints.copy())
+
+    def setFMUstate(self, state):
+        self._log("fmi2SetFMUstate")
+        self._time = state[0]
+        np.copyto(self._reals, state[1])
+        np.copyto(self._ints, state[2])
+
+    def freeFMUstate(self, state):
+        self._log("fmi2FreeFMUstate")
+
+    def _log(self, function_name: str, *args):
+        """Mimic fmpy's call logger, if one has been set.
+        """
+
+        if self.fmiCallLogger is not None:
+            self.fmiCallLogger("{}{} -> 0".format(function_name, args))
+
+
+class SyntheticFMU2Model(SyntheticFMU2Slave):
+
+    # value of the continuous states at which event indicators cross zero
+    EVENT_THRESHOLD = 0.25
+
+    def __init__(self, model_description, **kwargs):
+        """Synthetic Model Exchange FMU instance (fmpy 'FMU2Model' look-alike).
+
+        Continuous states are the driven Real variables of SyntheticFMU2Slave, and their
+        derivatives follow: der(x) = rate * (u - x). Buffers are exchanged through ctypes
+        pointers, as with fmpy. 'step_cost' is spent on each derivatives evaluation.
+        """
+
+        super().__init__(model_description, **kwargs)
+        self.nx = len(self._real_driven)
+        self.nz = model_description.numberOfEventIndicators
+
+    def doStep(self, *args, **kwargs):
+        raise AttributeError("Model Exchange FMUs do not implement 'doStep'.")
+
+    def __dir__(self):
+        return [name for name in super().__dir__() if name != "doStep"]
+
+    def enterEventMode(self):
+        self._log("fmi2EnterEventMode")
+
+    def newDiscreteStates(self):
+        self._log("fmi2NewDiscreteStates")
+        return False, False, False, False, False, 0.0
+
+    def enterContinuousTimeMode(self):
+        self._log("fmi2EnterContinuousTimeMode")
+
+    def completedIntegratorStep(self, noSetFMUStatePriorToCurrentPoint=True):
+        self._log("fmi2CompletedIntegratorStep")
+        return False, False
+
+    def setTime(self, time):
+        self._time = time
+
+    def setContinuousStates(self, x, nx):
+        self._reals[self._real_driven] = np.ctypeslib.as_array(x, (nx,))
+
+    def getContinuousStates(self, x, nx):
+        np.ctypeslib.as_array(x, (nx,))[:] = self._reals[self._real_driven]
+
+    def getNominalsOfContinuousStates(self, x_nominal, nx):
+        np.ctypeslib.as_array(x_nominal, (nx,))[:] = 1.0
+
+    def getDerivatives(self, dx, nx):
+        if self.step_cost > 0:
+            end_time = time.perf_counter() + self.step_cost
+            while time.perf_counter() < end_time:
+                pass
+        x = self._reals[self._real_driven]
+        u = self._reals[self._real_driving]
+        np.ctypeslib.as_array(dx, (nx,))[:] = self._rates * (u - x)
+
+    def getEventIndicators(self, z, nz):
+        np.ctypeslib.as_array(z, (nz,))[:] = self._reals[self._real_driven[:nz]] - self.EVENT_THRESHOLD
+
+
+def synthetic_fmu_factory(model_description, **fmu_options):
+    """Get a factory hook (see FMUConnector's 'fmu_factory') creating synthetic instances.
+        Model Exchange instances are created if the description defines 'modelExchange'.
+
+    fmu_options: dict
+        Options forwarded to SyntheticFMU2Slave (step_cost, failure_rate, fail_at_time, seed).
+    """
+
+    fmu_class = SyntheticFMU2Model if model_description.coSimulation is None else SyntheticFMU2Slave
+
+    def fmu_factory(guid: str = None, unzipDirectory: str = None, modelIdentifier: str = None,
+                    instanceName: str = "synthetic"):
+        return fmu_class(model_description, instanceName=instanceName, **fmu_options)
+
+    return fmu_factory
+
+
+def benchmark_connector(n_vars: int, n_steps: int = 100, step_cost: float = 0.0):
+    """Measure FMUConnector overhead for a synthetic model with 'n_vars' variables.
+
+    Returns a dict with the time (in seconds) spent on construction, reset, and per step.
+    """
+
+    from FMU_Connector import FMUConnector
+
+    results = {"n_vars": n_vars}
+    model_description = make_model_description(n_real=n_vars)
+    action_names = [v.name for v in model_description.modelVariables if v.causality == "input"]
+
+    # validation dumps YAML/JSON files next to the model and in the cwd: keep them in a temp dir
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, "w") as devnull:
+        os.chdir(work_dir)
+        try:
+            with contextlib.redirect_stdout(devnull):
+                tic = time.perf_counter()
+                connector = FMUConnector(os.path.join(work_dir, "synthetic.fmu"),
+                                         model_description=model_description,
+                                         fmu_factory=synthetic_fmu_factory(model_description, step_cost=step_cost))
+                connector.initialize_model()
+                results["construct_s"] = time.perf_counter() - tic
+
+                tic = time.perf_counter()
+                connector.reset({})
+                results["reset_s"] = time.perf_counter() - tic
+
+                tic = time.perf_counter()
+                for i in range(n_steps):
+                    connector.apply_actions({name: float(i % 2) for name in action_names})
+                    connector.run_step()
+                    connector.get_state_vars()
+                results["step_s"] = (time.perf_counter() - tic) / n_steps
+                connector.close_model()
+        finally:
+            os.chdir(cwd)
+
+    results["steps_per_s"] = 1.0 / results["step_s"] if results["step_s"] > 0 else float("inf")
+    return results
+
+
+def benchmark_me_batch(n_instances: int, n_vars: int = 10, n_steps: int = 100, solver: str = "rk45"):
+    """Compare stepping 'n_instances' synthetic modelExchange connectors one by one vs in batch.
+
+    Returns a dict with the environment steps per second achieved by each approach.
+    """
+
+    from FMU_Connector import FMUConnector, FMUConnectorBatch
+
+    results = {"n_instances": n_instances}
+    model_description = make_model_description(n_real=n_vars, model_type="modelExchange")
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, "w") as devnull:
+        os.chdir(work_dir)
+        try:
+            with contextlib.redirect_stdout(devnull):
+                connectors = []
+                for i in range(n_instances):
+                    connector = FMUConnector(os.path.join(work_dir, "synthetic.fmu"),
+                                             model_description=model_description,
+                                             fmu_factory=synthetic_fmu_factory(model_description),
+                                             me_solver=solver)
+                    connector.initialize_model()
+                    connectors.append(connector)
+
+                for mode in ("sequential", "batched"):
+                    for connector in connectors:
+                        connector.reset({})
+                    batch = FMUConnectorBatch(connectors)
+                    tic = time.perf_counter()
+                    for _ in range(n_steps):
+                        if mode == "batched":
+                            batch.run_step()
+                        else:
+                            for connector in connectors:
+                                connector.run_step()
+                    results[mode + "_steps_per_s"] = n_instances * n_steps / (time.perf_counter() - tic)
+        finally:
+            os.chdir(cwd)
+
+    return results
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark FMUConnector overhead using a synthetic FMU.")
+    parser.add_argument(
+        "--num-vars",
+        type=int,
+        nargs="+",
+        default=[10, 1000, 100000],
+        help="Number of (Real) model variables to benchmark with",
+    )
+    parser.add_argument(
+        "--num-steps",
+        type=int,
+        default=100,
+        help="Number of steps to run per benchmark",
+    )
+    parser.add_argument(
+        "--step-cost",
+        type=float,
+        default=0.0,
+        help="Seconds of compute spent by the synthetic FMU in each doStep",
+    )
+    parser.add_argument(
+        "--me-batch",
+        type=int,
+        default=0,
+        help="If set, benchmark batched modelExchange stepping with this number of instances instead",
+    )
+    args = parser.parse_args()
+
+    if args.me_batch > 0:
+        for n_vars in args.num_vars:
+            r = benchmark_me_batch(args.me_batch, n_vars=n_vars, n_steps=args.num_steps)
+            print(f"[Synthetic FMU] modelExchange vars: {n_vars:>7}, instances: {r['n_instances']}, "
+                  f"sequential: {r['sequential_steps_per_s']:.1f} steps/s, batched: {r['batched_steps_per_s']:.1f} steps/s")
+        raise SystemExit(0)
+
+    for n_vars in args.num_vars:
+        r = benchmark_connector(n_vars, n_steps=args.num_steps, step_cost=args.step_cost)
+        print(f"[Synthetic FMU] vars: {r['n_vars']:>7}, construct: {r['construct_s']:.3f} s, "
+              f"reset: {r['reset_s'] * 1e3:.3f} ms, step: {r['step_s'] * 1e3:.3f} ms ({r['steps_per_s']:.1f} steps/s)")
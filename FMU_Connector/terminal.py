@@ -0,0 +1,147 @@
+"""
+Terminal (halt) conditions over the model variables, declared in the "terminal" section of the YAML config file.
+
+> E.g:  terminal:
+          bounds:
+            x1: [-10, 10]
+          non_finite: [x1, derx0]
+          stop_time: true
+          expressions:
+            - "abs(x1) > 5 and FMU_time > 2"
+"""
+
+import numpy as np
+
+from typing import Any, Callable, Dict
+
+
+# Functions (and constants) available to terminal expressions
+EXPRESSION_NAMESPACE = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "isnan": np.isnan,
+    "isinf": np.isinf,
+    "isfinite": np.isfinite,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "log": np.log,
+    "inf": np.inf,
+    "nan": np.nan,
+    "__builtins__": {},
+}
+
+
+class TerminalConditions:
+    """Predicate over the model variables, compiled once from the "terminal" section of the YAML config.
+        Variables involved are read with a single call, and bounds/non-finite checks are vectorized.
+    """
+
+    def __init__(self, terminal_config: Dict[str, Any], vars_to_idx: Dict[str, int], stop_time: float):
+        """Compile the terminal conditions for the variables known to the connector (see 'vars_to_idx').
+        """
+
+        terminal_config = terminal_config or {}
+
+        # bounds: {var_name: [lower, upper]} (use null for no bound)
+        bounds = terminal_config.get("bounds") or {}
+        # non_finite: list of var names, or true to check every variable with bounds or in expressions
+        non_finite = terminal_config.get("non_finite") or []
+        expressions = terminal_config.get("expressions") or []
+        if isinstance(expressions, str):
+            expressions = [expressions]
+
+        # stop_time: true to halt once the model's stop time is reached, or the time to halt at
+        stop_time_config = terminal_config.get("stop_time", False)
+        if stop_time_config is True:
+            self.stop_time = stop_time
+        elif stop_time_config is False or stop_time_config is None:
+            self.stop_time = None
+        else:
+            self.stop_time = float(stop_time_config)
+
+        self.expressions = []
+        expression_names = []
+        for expression in expressions:
+            code = compile(str(expression), "<terminal>", "eval")
+            names = [name for name in code.co_names if name not in EXPRESSION_NAMESPACE]
+            unknown_names = [name for name in names if name not in vars_to_idx and name != "FMU_time"]
+            if unknown_names:
+                raise ValueError(f"Terminal expression '{expression}' refers to unknown variables: {unknown_names}.")
+            self.expressions.append((str(expression), code))
+            expression_names.extend(names)
+
+        unknown_names = [name for name in bounds if name not in vars_to_idx]
+        if unknown_names:
+            raise ValueError(f"Terminal bounds refer to unknown variables: {unknown_names}.")
+        if non_finite is not True:
+            unknown_names = [name for name in non_finite if name not in vars_to_idx]
+            if unknown_names:
+                raise ValueError(f"Terminal non_finite checks refer to unknown variables: {unknown_names}.")
+
+        # variables to read: those with bounds, checked for non-finite values, or used in expressions
+        if non_finite is True:
+            non_finite = list(bounds) + expression_names
+        self.var_names = list(dict.fromkeys(list(bounds) + list(non_finite) + expression_names))
+        self.var_names = [name for name in self.var_names if name in vars_to_idx]
+        positions = {name: i for i, name in enumerate(self.var_names)}
+
+        self.bound_indices = np.array([positions[name] for name in bounds], dtype=np.intp)
+        self.lower_bounds = np.array([-np.inf if bounds[name][0] is None else bounds[name][0] for name in bounds], dtype=np.float64)
+        self.upper_bounds = np.array([np.inf if bounds[name][1] is None else bounds[name][1] for name in bounds], dtype=np.float64)
+        self.non_finite_indices = np.array([positions[name] for name in non_finite if name in positions], dtype=np.intp)
+
+        self.reader = None
+
+
+    def is_empty(self):
+        """Check whether any condition has been declared.
+        """
+
+        return (self.stop_time is None and len(self.bound_indices) == 0
+                and len(self.non_finite_indices) == 0 and len(self.expressions) == 0)
+
+
+    def bind(self, read_values: Callable[[], np.ndarray]):
+        """Set the function reading the values of the variables involved ('var_names', in order) as a float array,
+            e.g: through the typed access of the connector (see FMUConnector._get_reader).
+        """
+
+        self.reader = read_values if self.var_names else None
+
+
+    def evaluate(self, sim_time: float):
+        """Evaluate the terminal conditions at the current state of the model.
+            Returns the reason for halting (a non-empty string), or None if none of the conditions hold.
+        """
+
+        # (tolerance for the accumulated float error of sim time)
+        if self.stop_time is not None and sim_time >= self.stop_time - 1e-9 * max(1.0, abs(self.stop_time)):
+            return f"sim time {sim_time:.3f} reached stop time {self.stop_time}"
+
+        if self.reader is None:
+            values = np.zeros(0, dtype=np.float64)
+        else:
+            values = self.reader()
+
+        if len(self.non_finite_indices) > 0:
+            non_finite = ~np.isfinite(values[self.non_finite_indices])
+            if non_finite.any():
+                return f"non-finite value of '{self.var_names[self.non_finite_indices[np.argmax(non_finite)]]}'"
+
+        if len(self.bound_indices) > 0:
+            bounded_values = values[self.bound_indices]
+            out_of_bounds = (bounded_values < self.lower_bounds) | (bounded_values > self.upper_bounds)
+            if out_of_bounds.any():
+                index = np.argmax(out_of_bounds)
+                var_name = self.var_names[self.bound_indices[index]]
+                return f"'{var_name}' = {bounded_values[index]} out of bounds [{self.lower_bounds[index]}, {self.upper_bounds[index]}]"
+
+        if self.expressions:
+            namespace = dict(zip(self.var_names, values.tolist()))
+            namespace["FMU_time"] = sim_time
+            for expression, code in self.expressions:
+                if eval(code, EXPRESSION_NAMESPACE, namespace):
+                    return f"'{expression}' holds"
+
+        return None
@@ -0,0 +1,305 @@
+"""
+Declarative transforms of the states and actions exchanged with the brain, declared in the "transforms" section of the
+YAML config file. Each list of stages is compiled once per episode into NumPy operations over an array of the fields
+involved, so transforms don't run as Python code per field and step, and can be applied to a batch of instances at once.
+
+> E.g:  transforms:
+          state:
+            - scale: {x1: 2.0}                  # x1 * 2.0
+            - offset: {x1: -1.0}                # x1 - 1.0
+            - convert: {T: [K, degC]}           # unit conversion (from, to)
+            - derive: {x_norm: "x1 / mu"}       # derived fields (fields, config values, and numpy functions)
+            - clip: {x_norm: [-1, 1]}           # use null for no bound
+            - rename: {x1: position}
+          action:
+            - clip: {x0: [-2, 2]}
+
+Stages run in order, and refer to fields by their current name (i.e: after renames). Fields not involved are passed
+through untouched, and derived or renamed fields replace any existing field of the same name. The user-overridable
+Transform class (see transform.py) remains available, closest to the brain.
+"""
+
+import numpy as np
+
+import connector_logging
+
+from typing import Any, Dict, List
+
+
+logger = connector_logging.get_logger("connector")
+
+STAGES = ("scale", "offset", "clip", "convert", "derive", "rename")
+
+# Units per quantity, as (factor, offset) to the reference unit of the quantity: reference = value * factor + offset
+UNITS = {
+    # temperature
+    "K": (1.0, 0.0), "degC": (1.0, 273.15), "degF": (5.0 / 9.0, 273.15 - 32.0 * 5.0 / 9.0),
+    # length
+    "m": (1.0, 0.0), "mm": (1e-3, 0.0), "cm": (1e-2, 0.0), "km": (1e3, 0.0), "in": (0.0254, 0.0), "ft": (0.3048, 0.0),
+    # time
+    "s": (1.0, 0.0), "ms": (1e-3, 0.0), "min": (60.0, 0.0), "h": (3600.0, 0.0),
+    # pressure
+    "Pa": (1.0, 0.0), "kPa": (1e3, 0.0), "MPa": (1e6, 0.0), "bar": (1e5, 0.0), "psi": (6894.757293168, 0.0),
+    # angle
+    "rad": (1.0, 0.0), "deg": (np.pi / 180.0, 0.0),
+    # speed
+    "m/s": (1.0, 0.0), "km/h": (1.0 / 3.6, 0.0),
+    # energy and power
+    "J": (1.0, 0.0), "kJ": (1e3, 0.0), "kWh": (3.6e6, 0.0), "W": (1.0, 0.0), "kW": (1e3, 0.0),
+}
+UNIT_QUANTITIES = {
+    "K": "temperature", "degC": "temperature", "degF": "temperature",
+    "m": "length", "mm": "length", "cm": "length", "km": "length", "in": "length", "ft": "length",
+    "s": "time", "ms": "time", "min": "time", "h": "time",
+    "Pa": "pressure", "kPa": "pressure", "MPa": "pressure", "bar": "pressure", "psi": "pressure",
+    "rad": "angle", "deg": "angle",
+    "m/s": "speed", "km/h": "speed",
+    "J": "energy", "kJ": "energy", "kWh": "energy", "W": "power", "kW": "power",
+}
+
+# Functions (and constants) available to derived expressions (applied elementwise, so they work over batches)
+EXPRESSION_NAMESPACE = {
+    "abs": np.abs,
+    "min": np.minimum,
+    "max": np.maximum,
+    "clip": np.clip,
+    "where": np.where,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "log": np.log,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "arctan2": np.arctan2,
+    "tanh": np.tanh,
+    "pi": np.pi,
+    "inf": np.inf,
+    "__builtins__": {},
+}
+
+
+def get_unit_conversion(from_unit: str, to_unit: str):
+    """Get the (factor, offset) converting values from a unit to another of the same quantity.
+    """
+
+    for unit in (from_unit, to_unit):
+        if unit not in UNITS:
+            raise ValueError(f"Unknown unit '{unit}'. Valid units are {tuple(UNITS.keys())}.")
+    if UNIT_QUANTITIES[from_unit] != UNIT_QUANTITIES[to_unit]:
+        raise ValueError(f"Cannot convert '{from_unit}' ({UNIT_QUANTITIES[from_unit]}) to '{to_unit}' ({UNIT_QUANTITIES[to_unit]}).")
+
+    from_factor, from_offset = UNITS[from_unit]
+    to_factor, to_offset = UNITS[to_unit]
+    return from_factor / to_factor, (from_offset - to_offset) / to_factor
+
+
+def parse_stages(stages: List[Dict[str, Any]]):
+    """Parse the stages of a pipeline (e.g: "transforms: state" section of the YAML config file).
+        Returns a list of (stage, {field: parameters}) tuples, with expressions compiled.
+    """
+
+    parsed = []
+    for stage in stages or []:
+        if not isinstance(stage, dict) or len(stage) != 1:
+            raise ValueError(f"Transform stage '{stage}' is invalid. Each stage must be a single-key dict, e.g: {{'scale': {{'x1': 2.0}}}}.")
+        (name, fields), = stage.items()
+        if name not in STAGES:
+            raise ValueError(f"Unknown transform stage '{name}'. Valid stages are {STAGES}.")
+
+        fields = dict(fields or {})
+        if name in ("scale", "offset"):
+            fields = {field: float(value) for field, value in fields.items()}
+        elif name == "clip":
+            fields = {field: (-np.inf if lower is None else float(lower), np.inf if upper is None else float(upper))
+                      for field, (lower, upper) in fields.items()}
+        elif name == "convert":
+            fields = {field: get_unit_conversion(*units) for field, units in fields.items()}
+        elif name == "derive":
+            fields = {field: (str(expression), compile(str(expression), "<transform>", "eval"))
+                      for field, expression in fields.items()}
+        elif name == "rename":
+            fields = {field: str(new_name) for field, new_name in fields.items()}
+        parsed.append((name, fields))
+
+    return parsed
+
+
+class TransformPipeline:
+    """Declared stages of transforms, compiled per set of fields transformed (e.g: the state fields of an episode).
+    """
+
+    def __init__(self, stages: List[Dict[str, Any]] = None):
+        """Parse (and validate) the stages declared.
+        """
+
+        self.stages = parse_stages(stages)
+        self.constants = {}
+        self._compiled = {}
+
+
+    def is_empty(self):
+        return len(self.stages) == 0
+
+
+    def bind(self, constants: Dict[str, Any] = None):
+        """Set the constants available to derived expressions (e.g: the episode config), for the following episode.
+            Compiled pipelines are discarded, and compiled again on first use.
+        """
+
+        self.constants = {name: value for name, value in (constants or {}).items()
+                          if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        self._compiled = {}
+
+
+    def get_field_names(self):
+        """Get the names of every field referred to by the stages (e.g: to read them from the model).
+        """
+
+        names = []
+        for name, fields in self.stages:
+            names.extend(fields.keys())
+            if name == "derive":
+                for _, code in fields.values():
+                    names.extend(code.co_names)
+        return list(dict.fromkeys(names))
+
+
+    def compile(self, field_names):
+        """Get the pipeline compiled for the given fields (in order), cached until the next 'bind'.
+        """
+
+        key = tuple(field_names)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = CompiledPipeline(self.stages, key, self.constants)
+            self._compiled[key] = compiled
+        return compiled
+
+
+    def transform(self, values: Dict[str, Any]):
+        """Transform a dict of (field: value) pairs.
+        """
+
+        if not self.stages:
+            return values
+        return self.compile(values.keys()).transform(values)
+
+
+class CompiledPipeline:
+    """Stages compiled into NumPy operations over the columns of an array, one per field involved (and derived).
+        Fields not involved in any stage are passed through.
+    """
+
+    def __init__(self, stages, field_names, constants: Dict[str, float]):
+        """Compile the stages for the given fields.
+        """
+
+        # fields in output order: current name --> ("field", original name) or ("column", column index)
+        self.fields = {name: ("field", name) for name in field_names}
+        # original names of the fields gathered into the first columns
+        self.gathered_names = []
+        self.n_columns = 0
+        self.operations = []
+
+        for stage, parameters in stages:
+            if stage == "rename":
+                # fields renamed onto an existing field replace it (renames within a stage apply at once, e.g: swaps)
+                targets = {parameters[name] for name in self.fields if name in parameters}
+                self.fields = {parameters.get(name, name): source for name, source in self.fields.items()
+                               if name in parameters or name not in targets}
+                continue
+
+            if stage == "derive":
+                for name, (expression, code) in parameters.items():
+                    names = [var_name for var_name in code.co_names if var_name not in EXPRESSION_NAMESPACE]
+                    unknown_names = [var_name for var_name in names if var_name not in self.fields and var_name not in constants]
+                    if unknown_names:
+                        logger.warning(f"[FMU Connector] Transform '{name} = {expression}' is skipped: {unknown_names} not available.")
+                        continue
+                    columns = {var_name: self._get_column(var_name) for var_name in names if var_name in self.fields}
+                    column = self._new_column(name)
+                    self.operations.append(("derive", column, code, columns))
+                continue
+
+            names = [name for name in parameters if name in self.fields]
+            if not names:
+                continue
+            columns = np.array([self._get_column(name) for name in names], dtype=np.intp)
+            if stage == "scale":
+                self.operations.append(("affine", columns, np.array([parameters[name] for name in names]), 0.0))
+            elif stage == "offset":
+                self.operations.append(("affine", columns, 1.0, np.array([parameters[name] for name in names])))
+            elif stage == "convert":
+                self.operations.append(("affine", columns, np.array([parameters[name][0] for name in names]),
+                                        np.array([parameters[name][1] for name in names])))
+            elif stage == "clip":
+                self.operations.append(("clip", columns, np.array([parameters[name][0] for name in names]),
+                                        np.array([parameters[name][1] for name in names])))
+
+        self.constants = dict(constants)
+        self.output_names = list(self.fields.keys())
+        self._buffer = np.zeros(self.n_columns, dtype=np.float64)
+
+
+    def _get_column(self, name: str):
+        """Get the column of a field, gathering it into a new column the first time it's involved.
+        """
+
+        kind, source = self.fields[name]
+        if kind == "column":
+            return source
+        column = self.n_columns
+        self.n_columns += 1
+        self.gathered_names.append(source)
+        self.fields[name] = ("column", column)
+        return column
+
+
+    def _new_column(self, name: str):
+        """Add a column for a derived field (replacing the field, if it already exists).
+        """
+
+        column = self.n_columns
+        self.n_columns += 1
+        self.fields[name] = ("column", column)
+        return column
+
+
+    def apply(self, values: np.ndarray):
+        """Apply the stages over an array of the gathered fields (see 'gathered_names').
+            Values can be given per instance, as rows of an (n_instances, n_gathered) array.
+            Returns the array of every column (gathered and derived), in place when possible.
+        """
+
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[-1] != self.n_columns:
+            columns = np.zeros(values.shape[:-1] + (self.n_columns,), dtype=np.float64)
+            columns[..., :values.shape[-1]] = values
+            values = columns
+
+        for operation in self.operations:
+            kind = operation[0]
+            if kind == "affine":
+                _, columns, factor, offset = operation
+                values[..., columns] = values[..., columns] * factor + offset
+            elif kind == "clip":
+                _, columns, lower, upper = operation
+                values[..., columns] = np.clip(values[..., columns], lower, upper)
+            else:
+                _, column, code, columns = operation
+                namespace = dict(self.constants)
+                namespace.update({name: values[..., index] for name, index in columns.items()})
+                values[..., column] = eval(code, EXPRESSION_NAMESPACE, namespace)
+        return values
+
+
+    def transform(self, values: Dict[str, Any]):
+        """Transform a dict of (field: value) pairs, with the fields this pipeline was compiled for.
+        """
+
+        buffer = self._buffer
+        for column, name in enumerate(self.gathered_names):
+            buffer[column] = values[name]
+        columns = self.apply(buffer).tolist()
+
+        return {name: (values[source] if kind == "field" else columns[source]) for name, (kind, source) in self.fields.items()}
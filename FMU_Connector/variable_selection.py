@@ -0,0 +1,168 @@
+"""
+Pattern-based selection of model variables in the YAML config file lists (config_params, inputs, outputs, other_vars).
+
+Entries of the lists can be:
+    - exact (cleaned) variable names, as before               e.g:  "x1"
+    - glob patterns over the original (dotted) names          e.g:  "plant.pump*.T", "plant.**.p_out"
+        ("*" and "?" match within a component, "**" matches across components)
+    - regular expressions over the original (dotted) names    e.g:  "re:plant\\.valve[0-9]+\\.opening"
+    - exclusions of any of the above, prefixed with "!"       e.g:  "!plant.pump3.*"
+
+Patterns are resolved once against the variable table, into arrays of row indices (cached per pattern).
+Candidates are narrowed through a prefix index over the sorted dotted names, using the literal prefix of each pattern,
+so resolution stays fast with a very large number of variables.
+"""
+
+import re
+import bisect
+
+import numpy as np
+
+import connector_logging
+
+from typing import List
+
+
+logger = connector_logging.get_logger("validator")
+
+REGEX_PREFIX = "re:"
+EXCLUSION_PREFIX = "!"
+
+# characters that make an entry a glob pattern (note, "[" is part of Modelica array names, so it isn't one)
+GLOB_CHARS = ("*", "?")
+
+
+def is_pattern(entry: str):
+    """Check whether a list entry is a pattern or exclusion, instead of an exact name.
+    """
+
+    entry = str(entry)
+    return (entry.startswith(REGEX_PREFIX) or entry.startswith(EXCLUSION_PREFIX)
+            or any(char in entry for char in GLOB_CHARS))
+
+
+def compile_pattern(pattern: str):
+    """Compile a glob pattern (or regular expression, with the "re:" prefix) into a regular expression.
+        Returns the compiled expression, and the literal prefix of the names it can match.
+    """
+
+    if pattern.startswith(REGEX_PREFIX):
+        expression = pattern[len(REGEX_PREFIX):]
+        return re.compile(expression), _get_regex_prefix(expression)
+
+    expression = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**", i):
+            expression += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            expression += "[^.]*"
+            i += 1
+        elif pattern[i] == "?":
+            expression += "[^.]"
+            i += 1
+        else:
+            expression += re.escape(pattern[i])
+            i += 1
+
+    prefix = re.split(r"[*?]", pattern, maxsplit=1)[0]
+    return re.compile(expression), prefix
+
+
+def _get_regex_prefix(expression: str):
+    """Get the literal prefix of a regular expression (escaped dots included), if any.
+    """
+
+    if "|" in expression:
+        # alternatives may not share a prefix
+        return ""
+
+    prefix = ""
+    i = 1 if expression.startswith("^") else 0
+    while i < len(expression):
+        char = expression[i]
+        if char == "\\" and i + 1 < len(expression) and expression[i + 1] in ".[]()":
+            prefix += expression[i + 1]
+            i += 2
+        elif char.isalnum() or char == "_":
+            prefix += char
+            i += 1
+        else:
+            break
+
+    # a quantifier applies to the last literal character, which is then not part of the prefix
+    if i < len(expression) and expression[i] in "?*{" and prefix:
+        prefix = prefix[:-1]
+    return prefix
+
+
+class VariableSelector:
+    """Resolves the entries of the YAML config lists against the variables of the model.
+    """
+
+    def __init__(self, names: List[str], original_names: List[str]):
+        """Build the prefix index over the original (dotted) names.
+
+        names: List[str]
+            (Cleaned) names of the variables, per row of the variable table.
+        original_names: List[str]
+            Names of the variables as given in the model description, per row of the variable table.
+        """
+
+        self.names = names
+        self.sorted_rows = sorted(range(len(original_names)), key=original_names.__getitem__)
+        self.sorted_names = [original_names[row] for row in self.sorted_rows]
+        self._cache = {}
+
+
+    def match(self, pattern: str):
+        """Get the rows of the variables matching a pattern (in order of appearance in the model).
+        """
+
+        rows = self._cache.get(pattern)
+        if rows is not None:
+            return rows
+
+        expression, prefix = compile_pattern(pattern)
+        lo = bisect.bisect_left(self.sorted_names, prefix)
+        hi = bisect.bisect_left(self.sorted_names, prefix + "\U0010ffff") if prefix else len(self.sorted_names)
+        rows = np.sort(np.array([self.sorted_rows[k] for k in range(lo, hi) if expression.fullmatch(self.sorted_names[k])],
+                                dtype=np.intp))
+
+        self._cache[pattern] = rows
+        return rows
+
+
+    def resolve(self, entries: List[str]):
+        """Resolve the entries of a list into variable names (exact names are kept as given).
+            Exclusions are applied over every other entry of the list.
+        """
+
+        selected = []
+        excluded = set()
+        for entry in entries or []:
+            entry = str(entry)
+            if entry.startswith(EXCLUSION_PREFIX):
+                pattern = entry[len(EXCLUSION_PREFIX):]
+                if is_pattern(pattern):
+                    excluded.update(self.names[row] for row in self.match(pattern))
+                else:
+                    excluded.add(pattern)
+            elif is_pattern(entry):
+                rows = self.match(entry)
+                if len(rows) == 0:
+                    logger.warning(f"[FMU Validator] Pattern '{entry}' doesn't match any variable of the model.")
+                selected.extend(self.names[row] for row in rows)
+            else:
+                selected.append(entry)
+
+        return [name for name in dict.fromkeys(selected) if name not in excluded]
+
+
+def get_selection_expressions(entries: List[str]):
+    """Get the compiled expressions of the (non-excluding) patterns in a list, e.g: to filter variables while reading.
+    """
+
+    return [compile_pattern(str(entry))[0] for entry in entries or []
+            if is_pattern(entry) and not str(entry).startswith(EXCLUSION_PREFIX)]
@@ -0,0 +1,197 @@
+"""
+Columnar table of the model variables used by the connector.
+
+A single NumPy structured array holds the value reference, type, causality, variability and (numeric) start value
+of every variable (floating-point starts in a float64 column, integer and boolean starts in an int64 one), with an index from (interned) names to rows. Read-only mapping views over the columns
+(e.g: 'value_references', 'start_values') give the connector name-based lookups without a dict per attribute,
+nor keeping the per-variable objects of the model description alive.
+"""
+
+import sys
+
+import numpy as np
+
+from collections.abc import Mapping
+
+
+# Value types per FMI type (fmi v'3.0' types included)
+FMI_TYPES_TO_TYPE_F = {"Real": float, "Float64": float, "Float32": float,
+                       "Integer": int, "Enumeration": int,
+                       "Int8": int, "UInt8": int, "Int16": int, "UInt16": int,
+                       "Int32": int, "UInt32": int, "Int64": int, "UInt64": int,
+                       "Boolean": bool,
+                       "String": str}
+
+# Codes of the categorical columns (index in the tuple)
+FMI_TYPES = tuple(FMI_TYPES_TO_TYPE_F.keys())
+CAUSALITIES = ("parameter", "calculatedParameter", "input", "output", "local", "independent", "structuralParameter")
+VARIABILITIES = ("constant", "fixed", "tunable", "discrete", "continuous")
+
+VARIABLE_DTYPE = np.dtype([("value_reference", np.uint32),
+                           ("type", np.uint8),
+                           ("causality", np.uint8),
+                           ("variability", np.uint8),
+                           ("has_start", np.bool_),
+                           ("start", np.float64),
+                           ("integer_start", np.int64)])
+
+# Range of the integer starts held in the int64 column (e.g: UInt64 starts above it are kept aside)
+INT64_MIN, INT64_MAX = int(np.iinfo(np.int64).min), int(np.iinfo(np.int64).max)
+
+
+class VariableTable:
+    """Columnar table of model variables, filled with 'append' and then frozen into a structured array.
+        String start values, integer start values out of the int64 range, and the shape/start values of array
+        variables, are kept aside (they're few).
+    """
+
+    def __init__(self):
+        """Create an empty table, ready to append variables to.
+        """
+
+        self.names = []
+        self.index = {}
+        self.shapes = {}
+        self.string_starts = {}
+        self.large_integer_starts = {}
+        self.array_starts = {}
+        self.rows = None
+        self._pending_rows = []
+
+        # name-based views over the columns
+        self.value_references = _ColumnView(self, lambda row: int(self.rows["value_reference"][row]))
+        self.types_f = _ColumnView(self, lambda row: FMI_TYPES_TO_TYPE_F[FMI_TYPES[self.rows["type"][row]]])
+        self.fmi_types = _ColumnView(self, lambda row: FMI_TYPES[self.rows["type"][row]])
+        self.start_values = _StartValuesView(self)
+
+
+    def append(self, name: str, value_reference: int, fmi_type: str, causality: str = None, variability: str = None,
+               start=None, shape: tuple = ()):
+        """Append a variable (with its start value already cast to its type, as a flat tuple for arrays).
+        """
+
+        name = sys.intern(name)
+        self.index[name] = len(self.names)
+        self.names.append(name)
+
+        has_start = start is not None
+        numeric_start = 0.0
+        integer_start = 0
+        if has_start:
+            if len(shape) > 0:
+                self.array_starts[name] = start
+            elif fmi_type == "String":
+                self.string_starts[name] = start
+            elif FMI_TYPES_TO_TYPE_F[fmi_type] is float:
+                numeric_start = float(start)
+            elif INT64_MIN <= int(start) <= INT64_MAX:
+                # (not cast through float64, which is exact up to 2**53 only)
+                integer_start = int(start)
+            else:
+                self.large_integer_starts[name] = int(start)
+        if len(shape) > 0:
+            self.shapes[name] = tuple(shape)
+
+        self._pending_rows.append((value_reference,
+                                   FMI_TYPES.index(fmi_type),
+                                   CAUSALITIES.index(causality) if causality in CAUSALITIES else CAUSALITIES.index("local"),
+                                   VARIABILITIES.index(variability) if variability in VARIABILITIES else VARIABILITIES.index("continuous"),
+                                   has_start,
+                                   numeric_start,
+                                   integer_start))
+
+
+    def freeze(self):
+        """Build the structured array from the variables appended.
+        """
+
+        self.rows = np.array(self._pending_rows, dtype=VARIABLE_DTYPE)
+        self._pending_rows = []
+        return self
+
+
+    def get_names(self, causalities, exclude: bool = False):
+        """Get the names of the variables with any of the given causalities (in order of appearance).
+            If 'exclude' is True, the names of the variables with any other causality are returned instead.
+        """
+
+        mask = np.isin(self.rows["causality"], [CAUSALITIES.index(causality) for causality in causalities])
+        return [self.names[row] for row in np.flatnonzero(~mask if exclude else mask)]
+
+
+    def get_value_references(self, names):
+        """Get the value references of the given (known) names, as an array.
+        """
+
+        return self.rows["value_reference"][[self.index[name] for name in names]]
+
+
+    def __contains__(self, name):
+        return name in self.index
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def nbytes(self):
+        """Get the size of the columns, in bytes (excluding the name index).
+        """
+
+        return self.rows.nbytes
+
+
+class _ColumnView(Mapping):
+    """Read-only mapping from variable names to the value of a column (see VariableTable).
+    """
+
+    def __init__(self, table: VariableTable, get_value):
+        self._table = table
+        self._get_value = get_value
+
+    def __getitem__(self, name):
+        return self._get_value(self._table.index[name])
+
+    def __contains__(self, name):
+        return name in self._table.index
+
+    def __iter__(self):
+        return iter(self._table.names)
+
+    def __len__(self):
+        return len(self._table.names)
+
+
+class _StartValuesView(Mapping):
+    """Read-only mapping from the names of the variables with a start value to their start value (cast to their type).
+    """
+
+    def __init__(self, table: VariableTable):
+        self._table = table
+
+    def __getitem__(self, name):
+        table = self._table
+        row = table.index[name]
+        if not table.rows["has_start"][row]:
+            raise KeyError(name)
+        if name in table.array_starts:
+            return table.array_starts[name]
+        if name in table.string_starts:
+            return table.string_starts[name]
+        if name in table.large_integer_starts:
+            return table.large_integer_starts[name]
+        type_f = table.types_f[name]
+        if type_f is float:
+            return type_f(table.rows["start"][row].item())
+        return type_f(table.rows["integer_start"][row].item())
+
+    def __contains__(self, name):
+        row = self._table.index.get(name)
+        return row is not None and bool(self._table.rows["has_start"][row])
+
+    def __iter__(self):
+        names = self._table.names
+        return (names[row] for row in np.flatnonzero(self._table.rows["has_start"]))
+
+    def __len__(self):
+        return int(np.count_nonzero(self._table.rows["has_start"]))
@@ -0,0 +1,461 @@
+"""
+Gymnasium vector environment over FMUConnector instances, to run local RL and evaluation loops with standard libraries
+against the same FMU integrations used with Bonsai.
+
+Observation and action spaces are derived from the interface.json file generated by the connector (see
+FMUSimValidation._dump_config_to_interface_json_file): a flat Box over the numeric state fields returned by the
+connector, and a flat Box over the numeric action fields (reserved FMU_* actions are left out, unless requested).
+
+Instances run in one of three backends:
+    - "sync":    every instance in this process, stepped in turn
+    - "thread":  instances split into groups stepped by a thread pool (FMU calls release the GIL)
+    - "process": instances split into groups stepped by worker processes
+
+Episodes end when the connector halts (error or terminal condition: terminated), or after 'max_episode_steps'
+(truncated). Finished instances are reset automatically on the following step (gymnasium's "next step" autoreset),
+and the reset is prepared in the background as soon as the episode ends (see FMUConnector.prepare_reset), so it
+overlaps with the policy computing the next actions.
+
+Note, gymnasium is an optional dependency (pip install gymnasium).
+"""
+
+import json
+import time
+import multiprocessing
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+from FMU_Connector import FMUConnector
+import connector_logging
+
+from typing import Any, Callable, Dict, List
+
+try:
+    import gymnasium
+    from gymnasium.vector import VectorEnv
+    from gymnasium.vector.utils import batch_space
+except ImportError:
+    gymnasium = None
+    VectorEnv = object
+
+
+logger = connector_logging.get_logger("connector")
+
+BACKENDS = ("sync", "thread", "process")
+
+# Reserved actions of the interface (see FMUSimValidation._dump_config_to_interface_json_file)
+RESERVED_PREFIX = "FMU_"
+
+
+def get_interface_fields(interface_filepath: str = "interface.json", section: str = "state"):
+    """Get the numeric fields of a section of interface.json ("state", "action", or "config"), as a list of
+        (name, shape, low, high) tuples. Arrays are given their shape, and ranges their bounds (if declared).
+        String fields are left out.
+    """
+
+    with open(interface_filepath, "r") as file:
+        interface = json.load(file)
+
+    fields = []
+    for field in interface["description"][section]["fields"]:
+        field_type = field["type"]
+        shape = []
+        while field_type.get("category") == "Array":
+            shape.append(int(field_type["length"]))
+            field_type = field_type["type"]
+        if field_type.get("category") != "Number":
+            logger.warning(f"[FMU Connector] Field '{field['name']}' of the {section} is skipped: only numeric fields are supported.")
+            continue
+        low = field_type.get("start", -np.inf)
+        high = field_type.get("stop", np.inf)
+        fields.append((field["name"], tuple(shape), -np.inf if low is None else float(low), np.inf if high is None else float(high)))
+
+    return fields
+
+
+def make_box(fields, bounds: Dict[str, Any] = None):
+    """Make a flat float32 Box over the given (name, shape, low, high) fields. Bounds can be overridden per field.
+    """
+
+    bounds = bounds or {}
+    lows, highs = [], []
+    for name, shape, low, high in fields:
+        low, high = bounds.get(name, (low, high))
+        size = int(np.prod(shape)) if shape else 1
+        lows.extend([low] * size)
+        highs.extend([high] * size)
+    return gymnasium.spaces.Box(np.array(lows, dtype=np.float32), np.array(highs, dtype=np.float32), dtype=np.float32)
+
+
+class ConnectorGroup:
+    """Group of FMUConnector instances of the same model, stepped in turn (the unit of work of every backend).
+    """
+
+    def __init__(self, model_filepath: str, num_instances: int, connector_kwargs: Dict[str, Any],
+                 action_fields, reward_fn: Callable = None, max_episode_steps: int = None):
+        """Instance and initialize the connectors.
+        """
+
+        self.connectors = []
+        for _ in range(num_instances):
+            connector = FMUConnector(model_filepath=model_filepath, **connector_kwargs)
+            connector.initialize_model()
+            self.connectors.append(connector)
+
+            if num_instances > 1 and self._once_per_process(connector):
+                self.close()
+                raise Exception("Model can only be instantiated once per process: use the 'process' backend, with one worker per instance.")
+
+        self.action_fields = action_fields
+        self.reward_fn = reward_fn
+        self.max_episode_steps = max_episode_steps
+        self.observation_fields = None
+        self.episode_steps = np.zeros(num_instances, dtype=np.int64)
+
+
+    def get_state_names(self):
+        """Get the names of the state fields returned by the connectors (after a first reset).
+        """
+
+        connector = self.connectors[0]
+        connector.reset({})
+        return list(connector.get_state_vars().keys())
+
+
+    def set_observation_fields(self, observation_fields):
+        self.observation_fields = observation_fields
+
+
+    def reset(self, indices, configs):
+        """Reset the given instances with their configs. Returns their observations.
+        """
+
+        for i, config in zip(indices, configs):
+            self.connectors[i].reset(dict(config or {}))
+            self.episode_steps[i] = 0
+        return np.array([self._get_observation(self.connectors[i]) for i in indices], dtype=np.float32).reshape(len(indices), -1)
+
+
+    def step(self, actions: np.ndarray, reset_configs: List[Dict[str, Any]]):
+        """Apply an action per instance, and move it one step forward. Instances given a reset config (i.e: whose
+            episode ended on the previous step) are reset instead, completing the reset prepared in the background.
+            Returns observations, rewards, terminations, and truncations.
+        """
+
+        n = len(self.connectors)
+        observations = []
+        rewards = np.zeros(n, dtype=np.float64)
+        terminations = np.zeros(n, dtype=np.bool_)
+        truncations = np.zeros(n, dtype=np.bool_)
+
+        for i, connector in enumerate(self.connectors):
+            if reset_configs[i] is not None:
+                connector.reset(dict(reset_configs[i]))
+                self.episode_steps[i] = 0
+                observations.append(self._get_observation(connector))
+                continue
+
+            action = self._get_action(actions[i])
+            connector.apply_actions(action)
+            connector.run_step()
+            state = connector.get_state_vars()
+            observations.append(self._get_observation(connector, state))
+            self.episode_steps[i] += 1
+            if self.reward_fn is not None:
+                rewards[i] = self.reward_fn(state, action)
+            terminations[i] = connector.halted()
+            truncations[i] = self.max_episode_steps is not None and self.episode_steps[i] >= self.max_episode_steps
+            if terminations[i] or truncations[i]:
+                # reset the model in the background, while the policy computes the next actions
+                connector.prepare_reset()
+
+        return np.array(observations, dtype=np.float32).reshape(n, -1), rewards, terminations, truncations
+
+
+    def close(self):
+        for connector in self.connectors:
+            connector.close_model()
+
+
+    @staticmethod
+    def _once_per_process(connector: FMUConnector):
+        model_description = connector.model_description
+        return any(getattr(kind, "canBeInstantiatedOnlyOncePerProcess", False)
+                   for kind in (model_description.coSimulation, model_description.modelExchange) if kind is not None)
+
+
+    def _get_observation(self, connector: FMUConnector, state: Dict[str, Any] = None):
+        if state is None:
+            state = connector.get_state_vars()
+        values = []
+        for name, shape in self.observation_fields:
+            if shape:
+                values.extend(np.ravel(state[name]).tolist())
+            else:
+                values.append(state[name])
+        return values
+
+
+    def _get_action(self, values: np.ndarray):
+        action = {}
+        offset = 0
+        for name, shape, _, _ in self.action_fields:
+            if shape:
+                size = int(np.prod(shape))
+                action[name] = np.reshape(values[offset:offset + size], shape).tolist()
+                offset += size
+            else:
+                action[name] = float(values[offset])
+                offset += 1
+        return action
+
+
+def _run_worker(connection, group_args, log_level):
+    """Serve the calls to a ConnectorGroup in a worker process, until it's closed.
+    """
+
+    # messages are written directly (a queue inherited from the parent process has no listener here)
+    connector_logging.configure_logging(level=log_level, use_queue=False)
+    try:
+        group = ConnectorGroup(*group_args)
+        connection.send(("ok", None))
+    except Exception as err:
+        connection.send(("error", repr(err)))
+        return
+
+    while True:
+        method, args = connection.recv()
+        try:
+            result = getattr(group, method)(*args)
+            connection.send(("ok", result))
+        except Exception as err:
+            connection.send(("error", repr(err)))
+        if method == "close":
+            break
+
+
+class _ProcessGroup:
+    """Proxy to a ConnectorGroup running in a worker process.
+    """
+
+    def __init__(self, context, group_args):
+        self.connection, worker_connection = context.Pipe()
+        log_level = connector_logging.get_logger().level
+        self.process = context.Process(target=_run_worker, args=(worker_connection, group_args, log_level), daemon=True)
+        self.process.start()
+        self._receive()
+
+    def call_async(self, method: str, *args):
+        self.connection.send((method, args))
+
+    def _receive(self):
+        status, result = self.connection.recv()
+        if status == "error":
+            raise RuntimeError(f"[FMU Connector] Worker process failed: {result}")
+        return result
+
+    def call(self, method: str, *args):
+        self.call_async(method, *args)
+        return self._receive()
+
+
+class FMUVectorEnv(VectorEnv):
+    """Vector environment of 'num_envs' instances of an FMU model (see module docstring).
+    """
+
+    def __init__(
+        self,
+        model_filepath: str,
+        num_envs: int,
+        interface_filepath: str = "interface.json",
+        backend: str = "sync",
+        num_workers: int = None,
+        config: Any = None,
+        reward_fn: Callable[[Dict[str, Any], Dict[str, Any]], float] = None,
+        max_episode_steps: int = None,
+        include_reserved_actions: bool = False,
+        action_bounds: Dict[str, Any] = None,
+        observation_bounds: Dict[str, Any] = None,
+        connector_kwargs: Dict[str, Any] = None,
+        mp_context: str = None,
+    ):
+        """
+        model_filepath: str
+            Full filepath to FMU model.
+        num_envs: int
+            Number of instances of the model.
+        interface_filepath: str
+            interface.json file the spaces are derived from.
+        backend: str
+            "sync", "thread", or "process" (see BACKENDS).
+        num_workers: int
+            Number of threads/processes the instances are split across. Defaults to one per instance (at most the
+            number of CPUs, for processes).
+        config: dict or callable
+            Episode config (SimConfig), or a callable returning it per episode, given the instance index and the
+            environment's random generator, e.g: lambda i, rng: {"mu": rng.uniform(0.5, 2.0)}.
+            Can be given per reset too, through options={"config": ...}: it then applies to the following autoresets
+            as well, until the next reset.
+        reward_fn: callable
+            Reward of each step, given the state (dict of fields) and the action applied. Defaults to 0.
+            Must be picklable (e.g: a module-level function) with the "process" backend.
+        max_episode_steps: int
+            Episodes are truncated after this number of steps (None for no limit).
+        include_reserved_actions: bool
+            If True, reserved actions (e.g: "FMU_step_size") are part of the action space.
+        action_bounds, observation_bounds: Dict[str, Any]
+            (low, high) bounds per field, overriding the ranges of interface.json (unbounded by default).
+        connector_kwargs: Dict[str, Any]
+            Extra arguments of each FMUConnector.
+        mp_context: str
+            Multiprocessing start method of the "process" backend (e.g: "spawn"). Defaults to the platform's.
+        """
+
+        if gymnasium is None:
+            raise ImportError("[FMU Connector] FMUVectorEnv requires gymnasium (pip install gymnasium).")
+        assert backend in BACKENDS, f"Backend '{backend}' is not supported. Choose one of: {BACKENDS}."
+
+        self.num_envs = num_envs
+        self.backend = backend
+        self.config = config
+        # config of the autoresets: the one of the last reset
+        self._episode_config = config
+        self.max_episode_steps = max_episode_steps
+        self.closed = False
+        self.render_mode = None
+        self.metadata = {"autoreset_mode": gymnasium.vector.AutoresetMode.NEXT_STEP}
+        self._np_random = np.random.default_rng()
+
+        # spaces from interface.json
+        action_fields = [field for field in get_interface_fields(interface_filepath, "action")
+                         if include_reserved_actions or not field[0].startswith(RESERVED_PREFIX)]
+        state_fields = get_interface_fields(interface_filepath, "state")
+        self.action_names = [field[0] for field in action_fields]
+
+        # instances split into groups (one group per thread/process)
+        if backend == "sync":
+            num_workers = 1
+        elif num_workers is None:
+            num_workers = num_envs if backend == "thread" else min(num_envs, multiprocessing.cpu_count())
+        num_workers = max(1, min(num_workers, num_envs))
+        sizes = [len(chunk) for chunk in np.array_split(np.arange(num_envs), num_workers)]
+        self.group_slices = []
+        start = 0
+        for size in sizes:
+            self.group_slices.append(slice(start, start + size))
+            start += size
+
+        connector_kwargs = dict(connector_kwargs or {})
+        group_args = [(model_filepath, size, connector_kwargs, action_fields, reward_fn, max_episode_steps) for size in sizes]
+        self._executor = None
+        if backend == "process":
+            context = multiprocessing.get_context(mp_context)
+            self.groups = [_ProcessGroup(context, args) for args in group_args]
+        else:
+            self.groups = [ConnectorGroup(*args) for args in group_args]
+            if backend == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=len(self.groups))
+
+        # observations: the numeric state fields of interface.json returned by the connector (e.g: reserved fields and
+        # fields only included on request are left out, unless enabled)
+        state_names = set(self._call(0, "get_state_names"))
+        observation_fields = [field for field in state_fields if field[0] in state_names]
+        missing_names = [field[0] for field in state_fields if field[0] not in state_names]
+        if missing_names:
+            logger.info(f"[FMU Connector] State fields of interface.json not returned by the model (left out of the observations): {missing_names}")
+        self.observation_names = [field[0] for field in observation_fields]
+        self._map("set_observation_fields", [([(name, shape) for name, shape, _, _ in observation_fields],)] * len(self.groups))
+
+        self.single_observation_space = make_box(observation_fields, observation_bounds)
+        self.single_action_space = make_box(action_fields, action_bounds)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+
+        self._autoreset = np.zeros(num_envs, dtype=np.bool_)
+        self.total_steps = 0
+        self.step_time_s = 0.0
+
+
+    def reset(self, *, seed: int = None, options: Dict[str, Any] = None):
+        """Reset every instance (with the config given in options={"config": ...}, if any).
+            The config is kept for the autoresets that follow (until the next reset).
+        """
+
+        if seed is not None:
+            self._np_random = np.random.default_rng(seed)
+        self._episode_config = (options or {}).get("config", self.config)
+        configs = [self._get_config(self._episode_config, i) for i in range(self.num_envs)]
+
+        observations = self._map("reset", [(list(range(s.stop - s.start)), configs[s]) for s in self.group_slices])
+        self._autoreset[:] = False
+        return np.concatenate(observations).astype(np.float32, copy=False), {}
+
+
+    def step(self, actions):
+        """Apply an action per instance and move every instance one step forward. Instances whose episode ended
+            on the previous step are reset instead (reward 0, not done, action ignored), as in gymnasium's
+            "next step" autoreset.
+        """
+
+        tic = time.perf_counter()
+        actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, -1)
+        reset_configs = [self._get_config(self._episode_config, i) if self._autoreset[i] else None for i in range(self.num_envs)]
+        stepped = self._map("step", [(actions[s], reset_configs[s]) for s in self.group_slices])
+
+        observations = np.concatenate([result[0] for result in stepped])
+        rewards = np.concatenate([result[1] for result in stepped])
+        terminations = np.concatenate([result[2] for result in stepped])
+        truncations = np.concatenate([result[3] for result in stepped])
+        self._autoreset = terminations | truncations
+
+        self.total_steps += self.num_envs
+        self.step_time_s += time.perf_counter() - tic
+        return observations.astype(np.float32, copy=False), rewards, terminations, truncations, {}
+
+
+    def get_throughput(self):
+        """Get the number of environment steps per second (instances x vector steps, over the time spent in 'step').
+        """
+
+        return self.total_steps / self.step_time_s if self.step_time_s > 0 else 0.0
+
+
+    def close(self, **kwargs):
+        if self.closed:
+            return
+        self._map("close", [()] * len(self.groups))
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self.backend == "process":
+            for group in self.groups:
+                group.process.join()
+        self.closed = True
+
+
+    def _get_config(self, config, index: int):
+        if callable(config):
+            return config(index, self._np_random)
+        return config or {}
+
+
+    def _call(self, group_index: int, method: str, *args):
+        group = self.groups[group_index]
+        if self.backend == "process":
+            return group.call(method, *args)
+        return getattr(group, method)(*args)
+
+
+    def _map(self, method: str, args_per_group: List[tuple]):
+        """Call a method of every group (concurrently, with the thread and process backends).
+        """
+
+        if self.backend == "process":
+            for group, args in zip(self.groups, args_per_group):
+                group.call_async(method, *args)
+            return [group._receive() for group in self.groups]
+        if self.backend == "thread":
+            futures = [self._executor.submit(getattr(group, method), *args) for group, args in zip(self.groups, args_per_group)]
+            return [future.result() for future in futures]
+        return [getattr(group, method)(*args) for group, args in zip(self.groups, args_per_group)]
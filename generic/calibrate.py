@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+"""
+Offline step size calibration for FMU models.
+
+Runs the model with FMUConnector under representative configs and random actions (see policies.py)
+across a ladder of substep sizes, and compares the trajectories with a fine-step reference run.
+The largest substep that stays within tolerance is recommended, and written to the "calibration"
+section of the model's YAML config file (e.g: "generic_conf.yaml"), so FMUConnector uses it by default.
+
+Usage:
+    python calibrate.py --model generic.fmu --configs '[{"mu": 1.0}, {"mu": 2.0}]' --tolerance 0.01
+"""
+
+import os
+import sys
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, dir_path + "//..//..//FMU_Connector")
+sys.path.insert(0, dir_path + "//..//FMU_Connector")
+
+import json
+import logging
+import time
+import random
+
+import numpy as np
+import yaml
+
+from typing import Any, Dict, List
+
+from FMU_Connector import FMUConnector
+import connector_logging
+from policies import POLICIES
+
+
+def get_capabilities(model_description):
+    """Get the capability flags of the model relevant for choosing step sizes.
+    """
+
+    co_simulation = model_description.coSimulation
+    interface = co_simulation or model_description.modelExchange
+    capabilities = {
+        "modelType": "coSimulation" if co_simulation is not None else "modelExchange",
+        "canGetAndSetFMUstate": bool(getattr(interface, "canGetAndSetFMUstate", False)),
+    }
+    if co_simulation is not None:
+        capabilities["canHandleVariableCommunicationStepSize"] = bool(co_simulation.canHandleVariableCommunicationStepSize)
+        capabilities["canInterpolateInputs"] = bool(co_simulation.canInterpolateInputs)
+        capabilities["maxOutputDerivativeOrder"] = int(co_simulation.maxOutputDerivativeOrder or 0)
+        fixed_internal_step_size = getattr(co_simulation, "fixedInternalStepSize", None)
+        capabilities["fixedInternalStepSize"] = float(fixed_internal_step_size) if fixed_internal_step_size else None
+
+    return capabilities
+
+
+def get_substep_ladder(step_size: float, n_levels: int, capabilities: Dict[str, Any]):
+    """Get the substep sizes to evaluate (largest first), restricted by the model capabilities.
+    """
+
+    ladder = [step_size / 2 ** k for k in range(n_levels)]
+
+    fixed_internal_step_size = capabilities.get("fixedInternalStepSize")
+    if fixed_internal_step_size:
+        # substeps below the internal step size of the model would not be any more accurate
+        ladder = [h for h in ladder if h >= fixed_internal_step_size * (1 - 1e-9)] or [step_size]
+        # and substeps that are not a whole number of internal steps cut the last one short
+        ladder = [h for h in ladder if divides_evenly(h, fixed_internal_step_size)] or ladder
+
+    # (substeps of the ladder always divide the step evenly, as required by models that cannot handle variable
+    # communication step sizes)
+    return ladder
+
+
+def get_reference_substep_size(step_size: float, ladder: List[float], capabilities: Dict[str, Any]):
+    """Get the substep size of the reference run (finer than the ladder), restricted by the model capabilities.
+    """
+
+    reference_substep_size = ladder[-1] / 4
+
+    fixed_internal_step_size = capabilities.get("fixedInternalStepSize")
+    if fixed_internal_step_size:
+        # a whole number of internal steps (at least one)
+        n_internal_steps = max(1, int(reference_substep_size / fixed_internal_step_size * (1 + 1e-9)))
+        reference_substep_size = n_internal_steps * fixed_internal_step_size
+
+    if capabilities.get("canHandleVariableCommunicationStepSize") is False:
+        # every substep has to be the same size (the last substep of a step is never cut short)
+        if not divides_evenly(step_size, reference_substep_size):
+            reference_substep_size = ladder[-1]
+
+    return reference_substep_size
+
+
+def divides_evenly(step_size: float, substep_size: float):
+    """Check whether a step is a whole number of substeps (up to float precision).
+    """
+
+    n_substeps = step_size / substep_size
+    return abs(n_substeps - round(n_substeps)) <= 1e-9 * max(1.0, n_substeps)
+
+
+def run_trajectory(connector: FMUConnector, config: Dict[str, Any], actions: List[Dict[str, Any]]):
+    """Run an episode with the given config and sequence of actions.
+
+    Returns the numeric state fields at each step (n_steps, n_fields), leaving out the reserved FMU_* fields,
+    and the elapsed wall time.
+    """
+
+    with connector_logging.temporary_level(logging.WARNING):
+        connector.reset(dict(config))
+        names = [name for name, value in connector.get_state_vars(full=True).items()
+                 if not name.startswith("FMU_") and isinstance(value, (int, float)) and not isinstance(value, bool)]
+        outputs = np.full((len(actions), len(names)), np.nan)
+
+        tic = time.perf_counter()
+        for i, action in enumerate(actions):
+            connector.apply_actions(dict(action))
+            connector.run_step()
+            if connector.error_occurred:
+                break
+            states = connector.get_state_vars(full=True)
+            outputs[i] = [states.get(name, np.nan) for name in names]
+        elapsed = time.perf_counter() - tic
+
+    return outputs, elapsed
+
+
+def calibrate(
+    model_filepath: str,
+    configs: List[Dict[str, Any]] = [{}],
+    step_size: float = None,
+    n_levels: int = 7,
+    n_episodes: int = 2,
+    n_steps: int = 100,
+    tolerance: float = 0.01,
+    policy: str = "random",
+    seed: int = 0,
+):
+    """Find the largest substep size that keeps trajectories within tolerance of a fine reference.
+
+    The deviation of each output is measured relative to its range over the reference trajectory.
+
+    Returns a dict with the recommended values, the model capabilities and the results per substep.
+    """
+
+    connector = FMUConnector(model_filepath=model_filepath, user_validation=False)
+    connector.initialize_model()
+
+    capabilities = get_capabilities(connector.model_description)
+    if step_size is None:
+        step_size = connector.step_size
+    ladder = get_substep_ladder(step_size, n_levels, capabilities)
+    reference_substep_size = get_reference_substep_size(step_size, ladder, capabilities)
+
+    # same random actions for every substep size
+    random.seed(seed)
+    episodes = []
+    for config in configs:
+        for _ in range(n_episodes):
+            episodes.append((config, [POLICIES[policy]() for _ in range(n_steps)]))
+
+    def run_all(substep_size: float):
+        trajectories = []
+        elapsed = 0.0
+        for config, actions in episodes:
+            run_config = {**config, "FMU_step_size": step_size, "FMU_substep_size": substep_size}
+            outputs, episode_elapsed = run_trajectory(connector, run_config, actions)
+            trajectories.append(outputs)
+            elapsed += episode_elapsed
+        return trajectories, len(episodes) * n_steps / elapsed
+
+    print(f"[Calibration] Running reference with substep size {reference_substep_size}")
+    references, reference_steps_per_s = run_all(reference_substep_size)
+
+    results = []
+    for substep_size in ladder:
+        trajectories, steps_per_s = run_all(substep_size)
+        max_error = 0.0
+        for outputs, reference in zip(trajectories, references):
+            scale = np.nanmax(reference, axis=0) - np.nanmin(reference, axis=0)
+            scale = np.where(scale > 0, scale, np.maximum(1.0, np.nanmax(np.abs(reference), axis=0)))
+            with np.errstate(invalid="ignore"):
+                error = np.abs(outputs - reference) / scale
+            # failed or diverged runs are never within tolerance
+            max_error = max(max_error, float(np.nanmax(error)) if not np.isnan(error).all() else np.inf)
+            if np.isnan(outputs).any() and not np.isnan(reference).any():
+                max_error = np.inf
+        results.append({"substep_size": substep_size, "max_error": max_error, "steps_per_s": steps_per_s})
+        print(f"[Calibration] Substep size {substep_size:.6g}: max relative error {max_error:.3g}, {steps_per_s:.1f} steps/s")
+
+    valid = [r for r in results if r["max_error"] <= tolerance]
+    recommended = valid[0] if valid else {"substep_size": reference_substep_size, "steps_per_s": reference_steps_per_s,
+                                          "max_error": 0.0}
+    if not valid:
+        print("[Calibration] No substep size of the ladder is within tolerance. Recommending the reference substep size.")
+
+    connector.close_model()
+
+    return {"FMU_step_size": float(step_size),
+            "FMU_substep_size": float(recommended["substep_size"]),
+            "tolerance": float(tolerance),
+            "max_error": float(recommended["max_error"]),
+            "steps_per_s": float(recommended["steps_per_s"]),
+            "capabilities": capabilities,
+            "ladder": [{k: float(v) for k, v in r.items()} for r in results]}
+
+
+def write_calibration(sim_config_filepath: str, calibration: Dict[str, Any]):
+    """Write the calibration results into the "calibration" section of the model's YAML config.
+    """
+
+    simulation_config = {}
+    if os.path.isfile(sim_config_filepath):
+        with open(sim_config_filepath, 'r') as file:
+            simulation_config = yaml.load(file, Loader=yaml.FullLoader) or {}
+
+    simulation_config["calibration"] = calibration
+    with open(sim_config_filepath, 'w') as file:
+        file.write(yaml.dump(simulation_config, sort_keys=False, default_flow_style=False))
+
+    print(f"[Calibration] Recommended values have been written to: {sim_config_filepath}")
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calibrate FMU_step_size/FMU_substep_size for an FMU model.")
+    parser.add_argument(
+        "--model",
+        type=str,
+        default="generic.fmu",
+        help="Filepath to the FMU model (relative to this script)",
+    )
+    parser.add_argument(
+        "--configs",
+        type=str,
+        default="[{}]",
+        help="JSON list of representative configs (e.g: '[{\"mu\": 1.0}, {\"mu\": 2.0}]')",
+    )
+    parser.add_argument(
+        "--step-size",
+        type=float,
+        default=None,
+        help="Step size of each Bonsai iteration (default: the model's default step size)",
+    )
+    parser.add_argument(
+        "--levels",
+        type=int,
+        default=7,
+        help="Number of substep sizes to evaluate: step_size, step_size/2, ..., step_size/2^(levels-1)",
+    )
+    parser.add_argument(
+        "--episodes",
+        type=int,
+        default=2,
+        help="Number of episodes to run per config",
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        default=100,
+        help="Number of steps per episode",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.01,
+        help="Maximum deviation from the reference, relative to each output's range",
+    )
+    parser.add_argument(
+        "--policy",
+        choices=list(POLICIES.keys()),
+        default="random",
+        help="Policy used to generate actions (see policies.py)",
+    )
+    parser.add_argument(
+        "--write",
+        type=lambda x: x.lower() in ("true", "1", "yes"),
+        default=True,
+        help="Write the recommended values into the model's YAML config file",
+    )
+
+    args = parser.parse_args()
+
+    model_filepath = os.path.join(dir_path, args.model)
+    calibration = calibrate(model_filepath,
+                            configs=json.loads(args.configs),
+                            step_size=args.step_size,
+                            n_levels=args.levels,
+                            n_episodes=args.episodes,
+                            n_steps=args.steps,
+                            tolerance=args.tolerance,
+                            policy=args.policy)
+
+    print(f"[Calibration] Recommended FMU_step_size: {calibration['FMU_step_size']}, "
+          f"FMU_substep_size: {calibration['FMU_substep_size']} ({calibration['steps_per_s']:.1f} steps/s)")
+    print(f"[Calibration] Model capabilities: {calibration['capabilities']}")
+
+    if args.write:
+        write_calibration(model_filepath.replace(".fmu", "_conf.yaml"), calibration)
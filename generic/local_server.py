@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the Bonsai simulator API (register, advance, unregister), to run simulators without the platform.
+
+Episodes are scripted (EpisodeStart, a number of EpisodeSteps with default actions, EpisodeFinish), and faults can be
+injected into the responses, by request number or at random:
+
+    - "error_503":    the request fails with a 503 (Service Unavailable) response
+    - "drop":         the connection is closed without a response
+    - "session_lost": the session is forgotten, and the request fails with a 404 (Not Found) response
+    - "unregister":   the session is forgotten, and an Unregister event is returned
+    - "outage":       every request fails with a 503 response for a while (see 'outage_s')
+
+Latency can be injected into every response, and into the first response of each connection (standing in for
+connection setup, e.g: the TLS handshake). Request bodies compressed with gzip are accepted. Run as a script to verify how long the simulator takes to recover
+from each fault (see session_manager.py):
+
+    python local_server.py --faults "20:error_503,40:drop,60:session_lost,80:unregister,100:outage"
+"""
+
+import os
+import sys
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, dir_path + "//..//..//FMU_Connector")
+sys.path.insert(0, dir_path + "//..//FMU_Connector")
+
+import re
+import gzip
+import json
+import time
+import uuid
+import random
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from typing import Any, Callable, Dict, List
+
+
+FAULTS = ("error_503", "drop", "session_lost", "unregister", "outage")
+
+SESSIONS_PATH = re.compile(r"^/v2/workspaces/(?P<workspace>[^/]+)/simulatorSessions(/(?P<session_id>[^/]+))?(/(?P<operation>[^/]+))?$")
+
+
+def parse_faults(faults: str):
+    """Parse a schedule of faults, given as comma-separated "request_number:fault" entries.
+
+    > E.g:  "20:error_503,40:drop"  -->  {20: "error_503", 40: "drop"}
+    """
+
+    schedule = {}
+    for entry in (faults or "").split(","):
+        if not entry.strip():
+            continue
+        request_number, fault = entry.split(":")
+        if fault.strip() not in FAULTS:
+            raise ValueError(f"Unknown fault '{fault}'. Valid faults are {FAULTS}.")
+        schedule[int(request_number)] = fault.strip()
+    return schedule
+
+
+class FaultInjector:
+    """Faults injected into the responses of the stand-in server, by request number or at random.
+    """
+
+    def __init__(self, schedule: Dict[int, str] = None, probabilities: Dict[str, float] = None, outage_s: float = 2.0,
+                 seed: int = 0):
+        """
+        schedule: Dict[int, str]
+            Fault per (1-based) number of request received, e.g: {20: "error_503"}.
+        probabilities: Dict[str, float]
+            Probability of each fault per request, e.g: {"drop": 0.01}.
+        outage_s: float
+            Duration of outages.
+        """
+
+        self.schedule = dict(schedule or {})
+        self.probabilities = dict(probabilities or {})
+        self.outage_s = outage_s
+        self.random = random.Random(seed)
+        self.injected = []
+        self._outage_end = 0.0
+        self._requests = 0
+        self._lock = threading.Lock()
+
+
+    def next_fault(self):
+        """Get the fault to inject into the following response (None for a regular response).
+        """
+
+        with self._lock:
+            self._requests += 1
+            if time.time() < self._outage_end:
+                return "outage"
+            fault = self.schedule.get(self._requests)
+            if fault is None:
+                for candidate, probability in self.probabilities.items():
+                    if self.random.random() < probability:
+                        fault = candidate
+                        break
+            if fault == "outage":
+                self._outage_end = time.time() + self.outage_s
+            if fault is not None:
+                self.injected.append((self._requests, fault, time.time()))
+            return fault
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # many simulators may connect at once (the default backlog of 5 drops connections, retried after a second)
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # clients may disconnect before getting their response (e.g: on timeouts)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class LocalBonsaiServer:
+    """HTTP server standing in for the Bonsai simulator API, running in a background thread.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        episode_length: int = 10,
+        latency_s: float = 0.0,
+        connect_latency_s: float = 0.0,
+        faults: FaultInjector = None,
+        config: Dict[str, Any] = None,
+        action_fn: Callable[[List[str]], Dict[str, Any]] = None,
+    ):
+        """
+        episode_length: int
+            Number of EpisodeStep events per episode (episodes finish earlier if the simulator halts).
+        latency_s: float
+            Latency added to every response.
+        connect_latency_s: float
+            Latency added to the first response of each connection.
+        faults: FaultInjector
+            Faults injected into the responses, if any.
+        config: Dict[str, Any]
+            Config sent with every EpisodeStart event.
+        action_fn: callable
+            Returns the action of each EpisodeStep, given the action names of the interface (defaults to zeros).
+        """
+
+        self.episode_length = episode_length
+        self.latency_s = latency_s
+        self.connect_latency_s = connect_latency_s
+        self.faults = faults
+        self.config = dict(config or {})
+        self.action_fn = action_fn or (lambda names: {name: 0.0 for name in names})
+
+        self.sessions = {}
+        self.stats = {"requests": 0, "registrations": 0, "advances": 0, "unregistrations": 0, "faults": 0,
+                      "connections": 0, "bytes_received": 0}
+        self._lock = threading.Lock()
+
+        self.httpd = _HTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc_details):
+        self.stop()
+
+
+    def run_in_process(self, connection):
+        """Serve until anything is received on 'connection' (a multiprocessing Pipe end), then send back the stats.
+            Used to run the server in its own process (e.g: so it doesn't compete with the client for the GIL).
+        """
+
+        with self:
+            connection.send(self.url)
+            connection.recv()
+        connection.send(self.stats)
+
+
+    def create_session(self, interface: Dict[str, Any]):
+        description = interface.get("description") or {}
+        action_names = [field["name"] for field in (description.get("action") or {}).get("fields", [])]
+        session_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self.sessions[session_id] = {"sequence_id": 0, "step": None, "action_names": action_names}
+            self.stats["registrations"] += 1
+        return {"sessionId": session_id, "sessionStatus": "Attachable", "interface": interface}
+
+
+    def delete_session(self, session_id: str):
+        with self._lock:
+            self.stats["unregistrations"] += 1
+            return self.sessions.pop(session_id, None) is not None
+
+
+    def advance(self, session_id: str, state: Dict[str, Any]):
+        """Get the next event of the scripted episodes of a session (None if the session doesn't exist).
+        """
+
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            self.stats["advances"] += 1
+            session["sequence_id"] += 1
+            event = {"sessionId": session_id, "sequenceId": session["sequence_id"]}
+
+            if session["step"] is None:
+                session["step"] = 0
+                event.update({"type": "EpisodeStart", "episodeStart": {"config": dict(self.config)}})
+            elif session["step"] < self.episode_length and not state.get("halted", False):
+                session["step"] += 1
+                event.update({"type": "EpisodeStep", "episodeStep": {"action": self.action_fn(session["action_names"])}})
+            else:
+                session["step"] = None
+                event.update({"type": "EpisodeFinish", "episodeFinish": {"reason": "Finished"}})
+            return event
+
+
+def _make_handler(server: LocalBonsaiServer):
+    """Create the request handler class bound to a server.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        # keep connections alive between requests, as the platform does
+        protocol_version = "HTTP/1.1"
+        # headers and body are written separately, so don't let small writes wait for an ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            with server._lock:
+                server.stats["connections"] += 1
+            if server.connect_latency_s > 0:
+                time.sleep(server.connect_latency_s)
+
+        def do_HEAD(self):
+            # e.g: to open connections ahead of the first requests
+            self._respond(200)
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def do_DELETE(self):
+            self._handle("DELETE")
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length > 0 else b""
+            with server._lock:
+                server.stats["bytes_received"] += len(body)
+            if body and self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            return json.loads(body) if body else {}
+
+        def _respond(self, status: int, payload: Dict[str, Any] = None):
+            body = json.dumps(payload).encode() if payload is not None else b""
+            self.send_response(status)
+            if payload is not None:
+                self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _respond_problem(self, status: int, title: str):
+            self._respond(status, {"type": "about:blank", "title": title, "status": status})
+
+        def _handle(self, method: str):
+            body = self._read_body()
+            with server._lock:
+                server.stats["requests"] += 1
+            if server.latency_s > 0:
+                time.sleep(server.latency_s)
+
+            match = SESSIONS_PATH.match(self.path.split("?")[0])
+            if match is None:
+                return self._respond_problem(404, "Not Found")
+            session_id, operation = match.group("session_id"), match.group("operation")
+
+            fault = server.faults.next_fault() if server.faults is not None else None
+            if fault is not None:
+                with server._lock:
+                    server.stats["faults"] += 1
+                if fault in ("error_503", "outage"):
+                    return self._respond_problem(503, "Service Unavailable")
+                if fault == "drop":
+                    self.close_connection = True
+                    return
+                if session_id is not None and fault == "session_lost":
+                    server.delete_session(session_id)
+                    return self._respond_problem(404, "Session Not Found")
+                if session_id is not None and operation == "advance" and fault == "unregister":
+                    server.delete_session(session_id)
+                    with server._lock:
+                        sequence_id = body.get("sequenceId", 0) + 1
+                    return self._respond(200, {"type": "Unregister", "sessionId": session_id, "sequenceId": sequence_id,
+                                               "unregister": {"reason": "Unknown", "details": "Injected fault"}})
+
+            if method == "POST" and session_id is None:
+                return self._respond(201, server.create_session(body))
+            if method == "POST" and operation == "advance":
+                event = server.advance(session_id, body)
+                if event is None:
+                    return self._respond_problem(404, "Session Not Found")
+                return self._respond(200, event)
+            if method == "DELETE" and operation is None:
+                server.delete_session(session_id)
+                return self._respond(204)
+            return self._respond_problem(404, "Not Found")
+
+    return Handler
+
+
+def verify_recovery(model: str, faults: str, iterations: int = 150, episode_length: int = 10, outage_s: float = 2.0,
+                    latency_s: float = 0.0):
+    """Run the simulator against the stand-in server with the faults given, and report the time to recover from each.
+    """
+
+    from microsoft_bonsai_api.simulator.client import BonsaiClient, BonsaiClientConfig
+    from microsoft_bonsai_api.simulator.generated.models import SimulatorInterface
+
+    from main import FMUSimulatorSession
+    from session_manager import SessionManager
+
+    fault_injector = FaultInjector(parse_faults(faults), outage_s=outage_s)
+    with LocalBonsaiServer(episode_length=episode_length, latency_s=latency_s, faults=fault_injector) as server:
+        sim = FMUSimulatorSession(modeldir=model)
+        with open("interface.json") as file:
+            interface = json.load(file)
+
+        config_client = BonsaiClientConfig(workspace="local", access_key="local", argv=None)
+        config_client.server = server.url
+        client = BonsaiClient(config_client)
+        registration_info = SimulatorInterface(name=sim.env_name, timeout=60, simulator_context=config_client.simulator_context,
+                                               description=interface["description"])
+
+        manager = SessionManager(client, config_client.workspace, registration_info, sim, backoff_base_s=0.1, backoff_max_s=2.0)
+        tic = time.perf_counter()
+        manager.run(max_iterations=iterations)
+        elapsed = time.perf_counter() - tic
+        manager.close()
+        sim.simulator.close_model()
+
+    print(f"[Local Server] {manager.iterations} events in {elapsed:.2f}s, {server.stats}")
+    for (request_number, fault, _), incident in zip(fault_injector.injected, manager.incidents):
+        print(f"[Local Server] Request #{request_number} '{fault}': recovered in {incident.downtime_s:.3f}s "
+              f"({incident.attempts} retries, {incident.reregistrations} re-registrations)")
+    print(f"[Local Server] Downtime: {manager.get_downtime_summary()}")
+    return manager
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local stand-in for the Bonsai simulator API, with fault injection.")
+    parser.add_argument("--model", type=str, default="generic.fmu", help="FMU model to simulate")
+    parser.add_argument("--faults", type=str, default="20:error_503,40:drop,60:session_lost,80:unregister,100:outage",
+                        help="Comma-separated 'request_number:fault' entries (faults: {})".format(", ".join(FAULTS)))
+    parser.add_argument("--iterations", type=int, default=150, help="Number of events to process")
+    parser.add_argument("--episode-length", type=int, default=10, help="Number of steps per episode")
+    parser.add_argument("--outage", type=float, default=2.0, help="Duration of outages (seconds)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latency added to every response (seconds)")
+
+    args = parser.parse_args()
+
+    verify_recovery(args.model, args.faults, args.iterations, args.episode_length, args.outage, args.latency)
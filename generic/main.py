@@ -14,23 +14,30 @@ import pathlib
 import json
 import time
 import datetime
+import multiprocessing
 from distutils.util import strtobool
 from typing import Any, Dict, List, Union
 
+import numpy as np
+
 from dotenv import load_dotenv, set_key
 from FMU_Connector import FMUConnector
+from vector_env import FMUVectorEnv
+import rpc
+from rpc import RPCServer, RPCClient
+import connector_logging
 from microsoft_bonsai_api.simulator.client import BonsaiClient, BonsaiClientConfig
-from microsoft_bonsai_api.simulator.generated.models import (
-    SimulatorInterface,
-    SimulatorState,
-)
+from microsoft_bonsai_api.simulator.generated.models import SimulatorInterface
 
 
 from policies import random_policy
+from session_manager import SessionManager
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 log_path = "logs"
 
+logger = connector_logging.get_logger("session")
+
 # TODO_PER_SIM 1: read FMI version from modelDescription.xml
 # - you can manually unzip the folder to check, or run with FMI_VERSIOn=2.0, and get it unpacked
 # ("1.0", "2.0", "3.0")
@@ -57,7 +64,7 @@ class FMUSimulatorSession:
 
         self.modeldir = modeldir
         self.model_full_path = os.path.join(dir_path, self.modeldir)
-        print("Using simulator file from: ", self.model_full_path)
+        logger.info(f"Using simulator file from:  {self.model_full_path}")
 
         # Validate and instance FMU model
         self.simulator = FMUConnector(model_filepath = self.model_full_path,
@@ -68,6 +75,7 @@ class FMUSimulatorSession:
 
         # initialize model - required!
         self.simulator.initialize_model()
+        self.episode_finished = True
 
         if not log_file:
             current_time = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
@@ -75,7 +83,7 @@ class FMUSimulatorSession:
             log_file = os.path.join(log_path, log_file)
             logs_directory = pathlib.Path(log_file).parent.absolute()
             if not pathlib.Path(logs_directory).exists():
-                print(
+                logger.info(
                     "Directory does not exist at {0}, creating now...".format(
                         str(logs_directory)
                     )
@@ -83,9 +91,11 @@ class FMUSimulatorSession:
                 logs_directory.mkdir(parents=True, exist_ok=True)
         self.log_file = os.path.join(log_path, log_file)
 
-    def get_state(self) -> Dict[str, float]:
-        """ Called to retreive the current state of the simulator. """
-        return self.simulator.get_state_vars()
+    def get_state(self, full: bool = False) -> Dict[str, float]:
+        """ Called to retreive the current state of the simulator.
+            Only the projected fields are returned (if a state projection is set), unless 'full' is True.
+        """
+        return self.simulator.get_state_vars(full)
 
 
     def _reset(self, config: dict):
@@ -112,6 +122,25 @@ class FMUSimulatorSession:
         """
 
         self._reset(config)
+        self.episode_finished = False
+
+
+    def episode_finish(self):
+        """Method invoked when an episode finishes. The model is speculatively reset in the background
+        while waiting for the next episode (see FMUConnector.prepare_reset).
+        """
+
+        self.episode_finished = True
+        self.simulator.prepare_reset()
+
+
+    def idle(self):
+        """Method invoked on Idle events. If no episode is running, the model is speculatively reset
+        in the background while waiting for the next episode (see FMUConnector.prepare_reset).
+        """
+
+        if self.episode_finished:
+            self.simulator.prepare_reset()
 
 
     def episode_step(self, action: Dict[str, Any]):
@@ -142,7 +171,7 @@ class FMUSimulatorSession:
 
     def halted(self) -> bool:
         """Should return True if the simulator cannot continue"""
-        return self.simulator.error_occurred
+        return self.simulator.halted()
 
     def random_policy(self, state: Dict = None) -> Dict:
         # TODO_PER_SIM 9: Update the random policy to be used for the example on policies.py
@@ -237,13 +266,161 @@ def test_random_policy(
             sim.episode_step(action)
             sim_state = sim.get_state()
             if log_iterations:
+                # log every state variable, not only those projected
                 sim.log_iterations(
-                    state=sim_state, action=action, episode=episode, iteration=iteration
+                    state=sim.get_state(full=True), action=action, episode=episode, iteration=iteration
                 )
-            print(f"Running iteration #{iteration} for episode #{episode}")
-            print(f"Observations: {sim_state}")
+            logger.info(f"Running iteration #{iteration} for episode #{episode}", extra={"rate_limit": False})
+            logger.info(f"Observations: {sim_state}", extra={"rate_limit": False})
             iteration += 1
             terminal = iteration > max_iterations
+        sim.episode_finish()
+
+
+def test_vector_env(
+    num_envs: int = 8,
+    backend: str = "sync",
+    num_steps: int = 1000,
+    max_episode_steps: int = 288,
+):
+    """Run a gymnasium vector environment of the model with random actions, and report its throughput
+
+    Parameters
+    ----------
+    num_envs : int, optional
+        number of instances of the model, by default 8
+    backend : str, optional
+        "sync", "thread", or "process" (see vector_env.py), by default "sync"
+    num_steps : int, optional
+        number of vector steps to run, by default 1000
+    """
+
+    # TODO_PER_SIM 4: define default config file for test_vector_env (and a reward, if needed)
+    DEFAULT_CONFIG = {"mu": 1.5,}
+
+    # the model and spaces are the same as those of FMUSimulatorSession (and interface.json)
+    model_full_path = os.path.join(dir_path, "generic.fmu")
+    env = FMUVectorEnv(model_full_path, num_envs, interface_filepath="interface.json", backend=backend,
+                       config=DEFAULT_CONFIG, max_episode_steps=max_episode_steps,
+                       connector_kwargs={"fmi_version": FMI_VERSION, "user_validation": False})
+    env.action_space.seed(0)
+    env.reset(seed=0)
+    for _ in range(num_steps):
+        env.step(env.action_space.sample())
+    logger.info(f"Vector environment ({backend} backend, {num_envs} instances): {env.get_throughput():.0f} env steps/s", extra={"rate_limit": False})
+    env.close()
+
+
+def create_connectors(num_instances: int, fmi_logging: bool = False):
+    """Instance and initialize FMUConnectors of the model (as FMUSimulatorSession does)
+    """
+
+    model_full_path = os.path.join(dir_path, "generic.fmu")
+    connectors = []
+    for _ in range(num_instances):
+        connector = FMUConnector(model_filepath = model_full_path,
+                                 fmi_version = FMI_VERSION,
+                                 user_validation = False,
+                                 fmi_logging = fmi_logging)
+        connector.initialize_model()
+        connectors.append(connector)
+    return connectors
+
+
+def serve_rpc(socket_path: str, num_instances: int = 1, fmi_logging: bool = False):
+    """Serve instances of the model to external trainers over a Unix domain socket, until interrupted (see rpc.py)
+
+    Parameters
+    ----------
+    socket_path : str
+        path of the Unix domain socket
+    num_instances : int, optional
+        number of instances of the model, by default 1
+    """
+
+    connectors = create_connectors(num_instances, fmi_logging)
+    try:
+        RPCServer(connectors, socket_path).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for connector in connectors:
+            connector.close_model()
+
+
+def _serve_rpc_process(socket_path: str, num_instances: int, log_level: int):
+    # messages are written directly (a queue inherited from the parent process has no listener here)
+    connector_logging.configure_logging(level=log_level, use_queue=False)
+    serve_rpc(socket_path, num_instances)
+
+
+def benchmark_rpc(num_instances: int = 8, num_steps: int = 1000, socket_path: str = "fmu_rpc.sock"):
+    """Measure the round trip latency of steps over RPC (for a single instance, and batched over every instance),
+    against the same steps run in-process
+
+    Parameters
+    ----------
+    num_instances : int, optional
+        number of instances of the model, by default 8
+    num_steps : int, optional
+        number of steps measured per case, by default 1000
+    """
+
+    # TODO_PER_SIM 4: define default config file for benchmark_rpc
+    DEFAULT_CONFIG = {"mu": 1.5,}
+
+    # the server runs in its own process, as it would for an external trainer
+    socket_path = os.path.abspath(socket_path)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = multiprocessing.Process(target=_serve_rpc_process, daemon=True,
+                                     args=(socket_path, num_instances, connector_logging.get_logger().level))
+    server.start()
+
+    connectors = create_connectors(num_instances)
+    action_names = connectors[0].sim_inputs
+
+    def run_in_process(ids):
+        for index in ids:
+            connectors[index].apply_actions({name: 0.0 for name in action_names})
+            connectors[index].run_step()
+            connectors[index].get_state_vars()
+
+    def measure(step_fn, ids):
+        latencies = np.zeros(num_steps)
+        for i in range(num_steps):
+            tic = time.perf_counter()
+            step_fn(ids)
+            latencies[i] = time.perf_counter() - tic
+        return latencies
+
+    while not os.path.exists(socket_path):
+        if not server.is_alive():
+            raise RuntimeError("[FMU Connector] RPC server failed to start.")
+        time.sleep(0.05)
+
+    encodings = [encoding for encoding in rpc.ENCODINGS if encoding != "msgpack" or rpc.msgpack is not None]
+    clients = [RPCClient(socket_path, encoding=encoding) for encoding in encodings]
+    for batch in ([0], list(range(num_instances))):
+        for connector in connectors:
+            connector.reset(DEFAULT_CONFIG)
+        baseline = measure(run_in_process, batch)
+        logger.info(f"Steps of {len(batch)} instance(s), in-process: {baseline.mean() * 1e6:.1f} us mean, {np.percentile(baseline, 99) * 1e6:.1f} us p99", extra={"rate_limit": False})
+        for client in clients:
+            client.reset(list(range(num_instances)), [DEFAULT_CONFIG] * num_instances)
+            actions = np.zeros((len(batch), len(client.action_names)))
+            latencies = measure(lambda ids: client.step(ids, actions), batch)
+            overhead = latencies.mean() - baseline.mean()
+            logger.info(f"Steps of {len(batch)} instance(s), RPC ({client.codec.name}): {latencies.mean() * 1e6:.1f} us mean, {np.percentile(latencies, 99) * 1e6:.1f} us p99 (+{overhead * 1e6:.1f} us per round trip)", extra={"rate_limit": False})
+
+    for client in clients:
+        client.close()
+    for connector in connectors:
+        connector.close_model()
+    server.terminate()
+    server.join()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
 
 
 def main(config_setup: bool, fmi_logging: bool):
@@ -284,60 +461,12 @@ def main(config_setup: bool, fmi_logging: bool):
         simulator_context=config_client.simulator_context,
         description=interface['description']
     )
-    registered_session = client.session.create(
-        workspace_name=config_client.workspace, body=registration_info
-    )
-    print("Registered simulator.")
-    sequence_id = 1
-
-    try:
-        while True:
-            # Advance by the new state depending on the event type
-            sim_state = SimulatorState(
-                sequence_id=sequence_id, state=sim.get_state(), halted=sim.halted(),
-            )
-            event = client.session.advance(
-                workspace_name=config_client.workspace,
-                session_id=registered_session.session_id,
-                body=sim_state,
-            )
-            sequence_id = event.sequence_id
-            print(f'[{time.strftime("%H:%M:%S")}] Last Event: {event.type}, Sim Time: {sim.simulator.sim_time:.3f}')
-
-            # Event loop
-            if event.type == "Idle":
-                time.sleep(event.idle.callback_time)
-                print("Idling...")
-            elif event.type == "EpisodeStart":
-                sim.episode_start(event.episode_start.config)
-            elif event.type == "EpisodeStep":
-                sim.episode_step(event.episode_step.action)
-            elif event.type == "EpisodeFinish":
-                print("Episode Finishing...")
-            elif event.type == "Unregister":
-                print("Simulator Session unregistered by platform because '{}'.".format(event.unregister.details))
-                client.session.delete(
-                    workspace_name=config_client.workspace,
-                    session_id=registered_session.session_id,
-                )
-                print("Unregistered simulator. Exiting.")
-                return
-            else:
-                pass
-    except KeyboardInterrupt:
-        # Gracefully unregister with keyboard interrupt
-        client.session.delete(
-            workspace_name=config_client.workspace,
-            session_id=registered_session.session_id,
-        )
-        print("Unregistered simulator.")
-    except Exception as err:
-        # Gracefully unregister for any other exceptions
-        client.session.delete(
-            workspace_name=config_client.workspace,
-            session_id=registered_session.session_id,
-        )
-        print("Unregistered simulator because: {}".format(err))
+    # Register, and run the event loop. Transient errors are retried with backoff, and the simulator
+    # registers again (keeping the model initialized) if the session is lost or unregistered by the platform.
+    manager = SessionManager(client, config_client.workspace, registration_info, sim)
+    manager.run()
+    if manager.incidents:
+        logger.info(f"Session incidents: {manager.get_downtime_summary()}")
 
 
 if __name__ == "__main__":
@@ -363,6 +492,36 @@ if __name__ == "__main__":
         default=False,
         help="Run simulator locally without connecting to platform",
     )
+    parser.add_argument(
+        "--test-vector-env",
+        type=lambda x: bool(strtobool(x)),
+        default=False,
+        help="Run a gymnasium vector environment of the simulator locally, and report its throughput",
+    )
+    parser.add_argument(
+        "--num-envs",
+        type=int,
+        default=8,
+        help="Number of simulator instances of the vector environment (or the RPC server)",
+    )
+    parser.add_argument(
+        "--vector-backend",
+        type=str,
+        default="sync",
+        help="Backend of the vector environment: sync, thread, or process",
+    )
+    parser.add_argument(
+        "--serve-rpc",
+        type=str,
+        default=None,
+        help="Serve simulator instances to external trainers over a Unix domain socket at this path",
+    )
+    parser.add_argument(
+        "--benchmark-rpc",
+        type=lambda x: bool(strtobool(x)),
+        default=False,
+        help="Measure the round trip latency of the RPC server, against an in-process baseline",
+    )
     parser.add_argument(
         "--fmi-logging",
         type=lambda x: bool(strtobool(x)),
@@ -370,12 +529,33 @@ if __name__ == "__main__":
         help="Print each FMU API call to the console output",
     )
 
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="INFO",
+        help="Logging level: DEBUG (includes per-step messages), INFO, WARNING, or ERROR",
+    )
+    parser.add_argument(
+        "--log-json",
+        type=lambda x: bool(strtobool(x)),
+        default=False,
+        help="Write log messages as single-line JSON objects",
+    )
+
     args = parser.parse_args()
 
+    connector_logging.configure_logging(level=args.log_level, json_format=args.log_json)
+
     if args.test_local:
         test_random_policy(
             num_episodes=1000, log_iterations=args.log_iterations
         )
+    elif args.test_vector_env:
+        test_vector_env(num_envs=args.num_envs, backend=args.vector_backend)
+    elif args.serve_rpc:
+        serve_rpc(args.serve_rpc, num_instances=args.num_envs, fmi_logging=args.fmi_logging)
+    elif args.benchmark_rpc:
+        benchmark_rpc(num_instances=args.num_envs)
     else:
         main(config_setup=args.config_setup, fmi_logging=args.fmi_logging)
 
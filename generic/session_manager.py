@@ -0,0 +1,296 @@
+"""
+Resilient simulator session with the Bonsai platform.
+
+Transient errors of 'advance' (connection errors, timeouts, 408/429/5xx responses) are retried with jittered
+exponential backoff, re-sending the same state. When the session is lost (404) or unregistered by the platform,
+the simulator registers again through 'session.create', keeping the simulator (and its initialized FMU) warm.
+
+Each incident is recorded with its downtime: from the first failed request to the next successful 'advance'.
+"""
+
+import time
+import random
+import logging
+
+import connector_logging
+
+from azure.core.exceptions import (
+    ClientAuthenticationError,
+    HttpResponseError,
+    ResourceNotFoundError,
+    ServiceRequestError,
+    ServiceResponseError,
+)
+from microsoft_bonsai_api.simulator.generated.models import SimulatorInterface, SimulatorState
+
+from typing import List
+
+
+logger = connector_logging.get_logger("session")
+
+# HTTP status codes of transient errors (the same request can be sent again)
+TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class Incident:
+    """Interruption of the session, from the first failed request until the next successful 'advance'.
+    """
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.start = time.time()
+        self.end = None
+        self.attempts = 0
+        self.reregistrations = 0
+
+    @property
+    def downtime_s(self):
+        return (self.end if self.end is not None else time.time()) - self.start
+
+    def to_dict(self):
+        return {"reason": self.reason, "start": self.start, "end": self.end, "downtime_s": self.downtime_s,
+                "attempts": self.attempts, "reregistrations": self.reregistrations}
+
+
+class SessionManager:
+    """Registers the simulator and runs the event loop, recovering from transient errors and lost sessions.
+    """
+
+    def __init__(
+        self,
+        client,
+        workspace: str,
+        registration_info: SimulatorInterface,
+        sim,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 30.0,
+        max_downtime_s: float = 600.0,
+        reregister_on_unregister: bool = True,
+        request_retries: int = 0,
+        log_iterations: bool = False,
+    ):
+        """Prepare a session for the given simulator (see main.py's FMUSimulatorSession).
+
+        Parameters
+        ----------
+        client: BonsaiClient
+            Client connected to the platform (or to a local stand-in server, see local_server.py).
+        workspace: str
+            Workspace the simulator registers in.
+        registration_info: SimulatorInterface
+            Interface the simulator registers with (sent again on every re-registration).
+        sim: FMUSimulatorSession
+            Simulator driven by the events (kept across re-registrations).
+        backoff_base_s, backoff_max_s: float
+            Retries wait a random time within [0, min(backoff_max_s, backoff_base_s * 2^attempt)] (full jitter).
+        max_downtime_s: float
+            Incidents lasting longer than this are raised (None to keep trying).
+        reregister_on_unregister: bool
+            If True, the simulator registers again when unregistered by the platform. Otherwise, the loop exits.
+        request_retries: int
+            Retries of each request within the HTTP pipeline (azure-core's RetryPolicy), before this manager retries.
+            Defaults to 0, so downtime and backoff are governed here.
+        log_iterations: bool
+            If True, states and actions of each step are logged to a CSV (see FMUSimulatorSession.log_iterations).
+        """
+
+        self.client = client
+        self.workspace = workspace
+        self.registration_info = registration_info
+        self.sim = sim
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.max_downtime_s = max_downtime_s
+        self.reregister_on_unregister = reregister_on_unregister
+        self.request_kwargs = {"retry_total": request_retries}
+        self.log_iterations = log_iterations
+
+        self.session_id = None
+        self.sequence_id = 1
+        self.incidents = []  # type: List[Incident]
+        self.iterations = 0
+        self._incident = None
+        self._episode = 0
+        self._episode_iteration = 0
+
+
+    def register(self):
+        """Register the simulator (again), retrying transient errors with backoff.
+        """
+
+        while True:
+            try:
+                session = self.client.session.create(workspace_name=self.workspace, body=self.registration_info,
+                                                     **self.request_kwargs)
+                break
+            except Exception as err:
+                if not self._is_transient(err):
+                    raise
+                self._wait_before_retry(f"registration failed: {self._describe(err)}")
+
+        self.session_id = session.session_id
+        self.sequence_id = 1
+        logger.info(f"Registered simulator (session '{self.session_id}').")
+        return session
+
+
+    def run(self, max_iterations: int = None):
+        """Run the event loop until the platform unregisters the simulator (and re-registration is disabled),
+            or 'max_iterations' events have been processed.
+        """
+
+        self.register()
+        try:
+            while max_iterations is None or self.iterations < max_iterations:
+                event = self._advance()
+                if event is None:
+                    continue
+                self.iterations += 1
+                if not self._handle_event(event):
+                    break
+        except KeyboardInterrupt:
+            # Gracefully unregister with keyboard interrupt
+            self.close()
+            logger.info("Unregistered simulator.")
+        except Exception as err:
+            # Gracefully unregister for any other (non-recoverable) exception
+            self.close()
+            logger.error("Unregistered simulator because: {}".format(err))
+
+
+    def close(self):
+        """Delete the current session (best effort, e.g: it may be gone already).
+        """
+
+        if self.session_id is None:
+            return
+        try:
+            self.client.session.delete(workspace_name=self.workspace, session_id=self.session_id, **self.request_kwargs)
+        except Exception as err:
+            logger.warning(f"[Session] Could not delete session '{self.session_id}': {self._describe(err)}")
+        self.session_id = None
+
+
+    def get_downtime_summary(self):
+        """Get the number of incidents, and their total and maximum downtime.
+        """
+
+        downtimes = [incident.downtime_s for incident in self.incidents]
+        return {"incidents": len(downtimes), "downtime_s": sum(downtimes), "max_downtime_s": max(downtimes, default=0.0)}
+
+
+    def _advance(self):
+        """Send the current state. Returns the event received, or None if the request failed and has to be sent again.
+        """
+
+        state = SimulatorState(sequence_id=self.sequence_id, state=self.sim.get_state(), halted=self.sim.halted())
+        try:
+            event = self.client.session.advance(workspace_name=self.workspace, session_id=self.session_id, body=state,
+                                                **self.request_kwargs)
+        except ResourceNotFoundError as err:
+            # the platform doesn't know the session anymore (e.g: it expired during an outage)
+            self._reregister(f"session not found: {self._describe(err)}")
+            return None
+        except Exception as err:
+            if not self._is_transient(err):
+                raise
+            self._wait_before_retry(f"advance failed: {self._describe(err)}")
+            return None
+
+        self.sequence_id = event.sequence_id
+        if self._incident is not None:
+            self._close_incident()
+        return event
+
+
+    def _handle_event(self, event):
+        """Drive the simulator with an event. Returns False if the loop has to exit.
+        """
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'[{time.strftime("%H:%M:%S")}] Last Event: {event.type}, Sim Time: {self.sim.simulator.sim_time:.3f}')
+
+        if event.type == "Idle":
+            self.sim.idle()
+            time.sleep(event.idle.callback_time)
+            logger.debug("Idling...")
+        elif event.type == "EpisodeStart":
+            self.sim.episode_start(event.episode_start.config)
+            self._episode += 1
+            self._episode_iteration = 0
+        elif event.type == "EpisodeStep":
+            self.sim.episode_step(event.episode_step.action)
+            self._episode_iteration += 1
+            if self.log_iterations:
+                self.sim.log_iterations(state=self.sim.get_state(full=True), action=event.episode_step.action,
+                                        episode=self._episode, iteration=self._episode_iteration)
+        elif event.type == "EpisodeFinish":
+            logger.info("Episode Finishing...")
+            self.sim.episode_finish()
+        elif event.type == "Unregister":
+            logger.warning("Simulator Session unregistered by platform because '{}'.".format(event.unregister.details))
+            if not self.reregister_on_unregister:
+                self.close()
+                logger.info("Unregistered simulator. Exiting.")
+                return False
+            self.session_id = None
+            self._reregister(f"unregistered by platform: {event.unregister.details}")
+        return True
+
+
+    def _reregister(self, reason: str):
+        """Register again, keeping the simulator warm. The episode in progress (if any) is finished.
+        """
+
+        incident = self._open_incident(reason)
+        incident.reregistrations += 1
+        logger.warning(f"[Session] Registering again ({reason}).")
+        if not self.sim.episode_finished:
+            self.sim.episode_finish()
+        self.register()
+
+
+    def _wait_before_retry(self, reason: str):
+        """Wait a jittered, exponentially growing time before retrying (raises if the incident lasts too long).
+        """
+
+        incident = self._open_incident(reason)
+        incident.attempts += 1
+        if self.max_downtime_s is not None and incident.downtime_s > self.max_downtime_s:
+            raise RuntimeError(f"Session could not recover within {self.max_downtime_s}s ({reason}).")
+
+        delay = random.uniform(0.0, min(self.backoff_max_s, self.backoff_base_s * 2 ** (incident.attempts - 1)))
+        logger.warning(f"[Session] Retrying in {delay:.2f}s (attempt {incident.attempts}, {reason}).")
+        time.sleep(delay)
+
+
+    def _open_incident(self, reason: str):
+        if self._incident is None:
+            self._incident = Incident(reason)
+            self.incidents.append(self._incident)
+        return self._incident
+
+
+    def _close_incident(self):
+        incident = self._incident
+        incident.end = time.time()
+        self._incident = None
+        logger.info(f"[Session] Recovered from '{incident.reason}' after {incident.attempts} retries and "
+                    f"{incident.reregistrations} re-registrations: {incident.downtime_s:.3f}s downtime.")
+
+
+    @staticmethod
+    def _is_transient(err: Exception):
+        if isinstance(err, ClientAuthenticationError):
+            return False
+        if isinstance(err, (ServiceRequestError, ServiceResponseError)):
+            return True
+        if isinstance(err, HttpResponseError):
+            return err.status_code in TRANSIENT_STATUS_CODES
+        return False
+
+
+    @staticmethod
+    def _describe(err: Exception):
+        status_code = getattr(err, "status_code", None)
+        return f"{type(err).__name__}" + (f" ({status_code})" if status_code else "") + f": {str(err).splitlines()[0] if str(err) else ''}"
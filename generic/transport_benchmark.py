@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""
+Benchmark of the transport options of BonsaiClientConfig, against the local stand-in server (see local_server.py).
+
+A number of simulator sessions share one client (sync: one thread per session, async: one task per session), register,
+and advance with a state of a given size. The server runs in its own process, with latency injected into every response,
+and into the first response of each connection (standing in for connection setup). For each option (and both clients),
+the following are reported: registration time (cold connections), latency of 'advance' (mean and p99), throughput,
+connections opened, and bytes sent.
+
+Usage:
+    python transport_benchmark.py --sessions 32 --steps 50 --state-size 100 --latency 0.005 --connect-latency 0.05
+"""
+
+import os
+import sys
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, dir_path + "//..//..//FMU_Connector")
+sys.path.insert(0, dir_path + "//..//FMU_Connector")
+
+import time
+import random
+import asyncio
+import contextlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from microsoft_bonsai_api.simulator.client import BonsaiClient, BonsaiClientAsync, BonsaiClientConfig
+from microsoft_bonsai_api.simulator.generated.models import SimulatorInterface, SimulatorState
+
+from local_server import LocalBonsaiServer
+
+
+def get_scenarios(sessions: int):
+    """Transport options benchmarked, one at a time and all together.
+    """
+
+    return [
+        ("default", {}),
+        ("pool_maxsize", {"pool_maxsize": sessions}),
+        ("keep_alive_s", {"keep_alive_s": 60.0}),
+        ("compress_threshold", {"compress_threshold": 1024}),
+        ("advance_timeout", {"advance_timeout": 5.0}),
+        ("prewarm_connections", {"prewarm_connections": min(sessions, 10)}),
+        ("all", {"pool_maxsize": sessions, "keep_alive_s": 60.0, "compress_threshold": 1024, "advance_timeout": 5.0,
+                 "prewarm_connections": sessions}),
+    ]
+
+
+@contextlib.contextmanager
+def server_process(**server_kwargs):
+    """Run a local server in its own process. Yields its URL, and a dict filled with its stats on exit.
+    """
+
+    connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve, args=(child_connection, server_kwargs), daemon=True)
+    process.start()
+    stats = {}
+    try:
+        yield connection.recv(), stats
+    finally:
+        connection.send("stop")
+        stats.update(connection.recv())
+        process.join()
+
+
+def _serve(connection, server_kwargs):
+    LocalBonsaiServer(**server_kwargs).run_in_process(connection)
+
+
+def make_config(server_url: str, options):
+    config = BonsaiClientConfig(workspace="local", access_key="local", argv=None, **options)
+    config.server = server_url
+    return config
+
+
+def make_state(state_size: int):
+    return {f"x{i}": random.random() for i in range(state_size)}
+
+
+def run_sync(server_url: str, options, sessions: int, steps: int, state_size: int):
+    """Run the sessions with the sync client. Returns (registration time, advance latencies).
+    """
+
+    client = BonsaiClient(make_config(server_url, options))
+    interface = SimulatorInterface(name="benchmark", timeout=60, description={})
+    state = make_state(state_size)
+
+    tic = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        session_ids = list(executor.map(lambda _: client.session.create(workspace_name="local", body=interface).session_id,
+                                        range(sessions)))
+    registration_s = time.perf_counter() - tic
+
+    def run_session(session_id):
+        latencies = []
+        sequence_id = 1
+        for _ in range(steps):
+            body = SimulatorState(sequence_id=sequence_id, state=state, halted=False)
+            tic = time.perf_counter()
+            event = client.session.advance(workspace_name="local", session_id=session_id, body=body)
+            latencies.append(time.perf_counter() - tic)
+            sequence_id = event.sequence_id
+        client.session.delete(workspace_name="local", session_id=session_id)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        latencies = [latency for session_latencies in executor.map(run_session, session_ids) for latency in session_latencies]
+    client.close()
+    return registration_s, latencies
+
+
+async def run_async(server_url: str, options, sessions: int, steps: int, state_size: int):
+    """Run the sessions with the async client. Returns (registration time, advance latencies).
+    """
+
+    interface = SimulatorInterface(name="benchmark", timeout=60, description={})
+    state = make_state(state_size)
+
+    async with BonsaiClientAsync(make_config(server_url, options)) as client:
+        tic = time.perf_counter()
+        registered = await asyncio.gather(*(client.session.create(workspace_name="local", body=interface)
+                                            for _ in range(sessions)))
+        registration_s = time.perf_counter() - tic
+
+        async def run_session(session_id):
+            latencies = []
+            sequence_id = 1
+            for _ in range(steps):
+                body = SimulatorState(sequence_id=sequence_id, state=state, halted=False)
+                tic = time.perf_counter()
+                event = await client.session.advance(workspace_name="local", session_id=session_id, body=body)
+                latencies.append(time.perf_counter() - tic)
+                sequence_id = event.sequence_id
+            await client.session.delete(workspace_name="local", session_id=session_id)
+            return latencies
+
+        results = await asyncio.gather(*(run_session(session.session_id) for session in registered))
+    return registration_s, [latency for session_latencies in results for latency in session_latencies]
+
+
+def benchmark(sessions: int = 32, steps: int = 50, state_size: int = 100, latency_s: float = 0.005,
+              connect_latency_s: float = 0.05, clients=("sync", "async")):
+    """Run every scenario with each client, and print a table of the results.
+    """
+
+    print(f"{sessions} sessions x {steps} steps, {state_size} state fields, latency {latency_s * 1e3:.1f}ms "
+          f"(+{connect_latency_s * 1e3:.1f}ms per connection)\n")
+    print(f"{'client':6} {'option':20} {'register [ms]':>13} {'mean [ms]':>10} {'p99 [ms]':>9} {'steps/s':>9} "
+          f"{'conns':>6} {'KB sent':>8}")
+
+    results = []
+    for client_kind in clients:
+        for name, options in get_scenarios(sessions):
+            with server_process(episode_length=steps + 10, latency_s=latency_s,
+                                connect_latency_s=connect_latency_s) as (server_url, stats):
+                tic = time.perf_counter()
+                if client_kind == "sync":
+                    registration_s, latencies = run_sync(server_url, options, sessions, steps, state_size)
+                else:
+                    registration_s, latencies = asyncio.run(run_async(server_url, options, sessions, steps, state_size))
+                elapsed = time.perf_counter() - tic - registration_s
+
+            latencies = np.array(latencies)
+            result = {"client": client_kind, "option": name, "registration_ms": registration_s * 1e3,
+                      "mean_ms": latencies.mean() * 1e3, "p99_ms": np.percentile(latencies, 99) * 1e3,
+                      "steps_per_s": len(latencies) / elapsed, "connections": stats["connections"],
+                      "kb_sent": stats["bytes_received"] / 1e3}
+            results.append(result)
+            print(f"{client_kind:6} {name:20} {result['registration_ms']:13.1f} {result['mean_ms']:10.2f} "
+                  f"{result['p99_ms']:9.2f} {result['steps_per_s']:9.0f} {result['connections']:6d} "
+                  f"{result['kb_sent']:8.0f}")
+    return results
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark of the transport options of BonsaiClientConfig.")
+    parser.add_argument("--sessions", type=int, default=32, help="Number of sessions sharing the client")
+    parser.add_argument("--steps", type=int, default=50, help="Number of 'advance' calls per session")
+    parser.add_argument("--state-size", type=int, default=100, help="Number of fields of the state sent")
+    parser.add_argument("--latency", type=float, default=0.005, help="Latency added to every response (seconds)")
+    parser.add_argument("--connect-latency", type=float, default=0.05,
+                        help="Latency added to the first response of each connection (seconds)")
+    parser.add_argument("--clients", type=str, default="sync,async", help="Clients benchmarked (sync, async)")
+
+    args = parser.parse_args()
+
+    benchmark(args.sessions, args.steps, args.state_size, args.latency, args.connect_latency,
+              tuple(args.clients.split(",")))
@@ -0,0 +1,50 @@
+import os
+import sys
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, dir_path + "//..//FMU_Connector")
+sys.path.insert(0, dir_path + "//..//generic")
+
+import pytest
+
+import connector_logging
+
+from FMU_Connector import FMUConnector
+from synthetic_fmu import make_model_description, synthetic_fmu_factory
+
+
+connector_logging.configure_logging("WARNING", use_queue=False)
+
+
+@pytest.fixture
+def make_connector(tmp_path, monkeypatch):
+    """Build initialized connectors of synthetic models (config and validation files are written to a temporary folder).
+    """
+
+    monkeypatch.chdir(tmp_path)
+    connectors = []
+
+    def make(model_description=None, config=None, yaml_sections: str = None, connector_options=None, **fmu_options):
+        model_description = model_description or make_model_description(n_real=4)
+        model_filepath = str(tmp_path / "synthetic.fmu")
+        connector_options = dict(connector_options or {})
+        me_solver = connector_options.pop("me_solver", "rk4" if model_description.coSimulation is None else "rk45")
+        if yaml_sections:
+            # sections appended to the config file written by the connector (e.g: "terminal", "aggregation")
+            FMUConnector(model_filepath, model_description=model_description,
+                         fmu_factory=synthetic_fmu_factory(model_description), me_solver=me_solver,
+                         user_validation=False)
+            with open(tmp_path / "synthetic_conf.yaml", "a") as file:
+                file.write(yaml_sections)
+
+        connector = FMUConnector(model_filepath, model_description=model_description,
+                                 fmu_factory=synthetic_fmu_factory(model_description, **fmu_options),
+                                 me_solver=me_solver, user_validation=False, **connector_options)
+        connector.initialize_model()
+        connector.reset(dict(config or {}))
+        connectors.append(connector)
+        return connector
+
+    yield make
+
+    for connector in connectors:
+        connector.close_model()
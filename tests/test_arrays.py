@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from arrays import ArrayVariables, get_flat_names, get_interface_type, parse_start_value
+
+
+class Float64Arrays:
+    """FMI 3.0 instance holding Float64 arrays per value reference (the high-level calls of fmpy's FMU3 classes).
+    """
+
+    def __init__(self, arrays):
+        self.arrays = {vr: np.array(values, dtype=np.float64).reshape(-1) for vr, values in arrays.items()}
+        self.calls = 0
+
+    def getFloat64(self, vr, nValues=None):
+        self.calls += 1
+        return np.concatenate([self.arrays[v] for v in vr]).tolist()
+
+    def setFloat64(self, vr, values):
+        self.calls += 1
+        offset = 0
+        for v in vr:
+            size = len(self.arrays[v])
+            self.arrays[v] = np.array(values[offset:offset + size])
+            offset += size
+
+
+def make_arrays():
+    fmu = Float64Arrays({10: [[1.0, 2.0], [3.0, 4.0]], 20: [5.0, 6.0, 7.0]})
+    arrays = ArrayVariables(["T", "p"], [10, 20], [(2, 2), (3,)])
+    arrays.bind(fmu)
+    return fmu, arrays
+
+
+def test_arrays_are_read_into_views_of_a_single_buffer():
+    fmu, arrays = make_arrays()
+
+    views = arrays.read()
+
+    assert fmu.calls == 1
+    np.testing.assert_array_equal(views["T"], [[1.0, 2.0], [3.0, 4.0]])
+    np.testing.assert_array_equal(views["p"], [5.0, 6.0, 7.0])
+    assert all(np.shares_memory(view, arrays.buffer) for view in views.values())
+
+    # views are overwritten in place by the following read
+    fmu.arrays[20][:] = [8.0, 9.0, 10.0]
+    arrays.read()
+    np.testing.assert_array_equal(views["p"], [8.0, 9.0, 10.0])
+
+
+def test_arrays_are_written_with_a_single_call():
+    fmu, arrays = make_arrays()
+
+    arrays.write({"T": [[0.0, 0.5], [1.0, 1.5]], "p": [1, 2, 3], "unknown": [0.0]})
+
+    assert fmu.calls == 1
+    np.testing.assert_array_equal(arrays.read()["T"], [[0.0, 0.5], [1.0, 1.5]])
+    np.testing.assert_array_equal(arrays.read()["p"], [1.0, 2.0, 3.0])
+
+
+def test_arrays_of_the_wrong_size_are_rejected():
+    _, arrays = make_arrays()
+
+    with pytest.raises(ValueError, match="expects 4 values"):
+        arrays.write({"T": [1.0, 2.0]})
+
+
+def test_array_names_starts_and_interface_types():
+    assert get_flat_names("T", (2, 2)) == ["T_0", "T_1", "T_2", "T_3"]
+    assert parse_start_value("0 1 2", (3,)) == (0.0, 1.0, 2.0)
+    assert parse_start_value("1.5", (2, 2)) == (1.5,) * 4
+    assert get_interface_type((2, 3)) == {"category": "Array", "length": 2, "comment": None,
+                                          "type": {"category": "Array", "length": 3, "type": {"category": "Number"}}}
@@ -0,0 +1,39 @@
+import pytest
+
+from FMU_Connector import FMUConnectorBatch
+from synthetic_fmu import make_model_description
+
+
+@pytest.mark.parametrize("solver", ["euler", "rk4", "rk45", "cvode"])
+@pytest.mark.parametrize("n_event_indicators", [0, 2])
+def test_batched_steps_match_single_steps(make_connector, solver, n_event_indicators):
+    model_description = make_model_description(n_real=6, model_type="modelExchange", n_event_indicators=n_event_indicators)
+    options = {"me_solver": solver}
+    configs = [{}, {"r0": 2.0}, {"FMU_step_size": 0.05}]
+    singles = [make_connector(model_description, config, connector_options=options) for config in configs]
+    batched = [make_connector(model_description, config, connector_options=options) for config in configs]
+    batch = FMUConnectorBatch(batched)
+
+    for t in range(10):
+        # (inputs driving the states across the event threshold and back)
+        for i, connector in enumerate(singles + batched):
+            connector.apply_actions({"r1": -1.0 if (t + i % 3) % 4 < 2 else 1.0})
+        for connector in singles:
+            connector.run_step()
+        batch.run_step()
+
+        for single, connector in zip(singles, batched):
+            state, expected = connector.get_state_vars(), single.get_state_vars()
+            assert state["FMU_time"] == pytest.approx(expected["FMU_time"])
+            assert state["r2"] == pytest.approx(expected["r2"], rel=1e-6, abs=1e-9)
+            assert state["r3"] == pytest.approx(expected["r3"], rel=1e-6, abs=1e-9)
+
+    if n_event_indicators > 0:
+        assert sum(connector.me_stepper.stats["n_events"] for connector in batched) > 0
+
+
+def test_batch_requires_model_exchange(make_connector):
+    connector = make_connector(make_model_description(n_real=6))
+
+    with pytest.raises(AssertionError, match="Only modelExchange models"):
+        FMUConnectorBatch([connector])
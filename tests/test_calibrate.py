@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from calibrate import get_reference_substep_size, get_substep_ladder, run_trajectory
+from synthetic_fmu import make_model_description
+
+
+@pytest.mark.parametrize("capabilities, ladder, reference", [
+    ({}, [1.0, 0.5, 0.25, 0.125], 0.03125),
+    # substeps can never be finer than the internal step size
+    ({"fixedInternalStepSize": 0.2}, [1.0], 0.2),
+    ({"fixedInternalStepSize": 0.125}, [1.0, 0.5, 0.25, 0.125], 0.125),
+    # substeps are a whole number of internal steps (if any substep of the ladder is)
+    ({"fixedInternalStepSize": 0.02}, [1.0, 0.5], 0.12),
+    ({"fixedInternalStepSize": 0.3}, [1.0, 0.5], 0.3),
+    # substeps divide the step evenly
+    ({"fixedInternalStepSize": 0.3, "canHandleVariableCommunicationStepSize": False}, [1.0, 0.5], 0.5),
+    ({"canHandleVariableCommunicationStepSize": False}, [1.0, 0.5, 0.25, 0.125], 0.03125),
+])
+def test_substeps_are_restricted_by_capabilities(capabilities, ladder, reference):
+    substep_ladder = get_substep_ladder(1.0, 4, capabilities)
+
+    assert substep_ladder == pytest.approx(ladder)
+    assert get_reference_substep_size(1.0, substep_ladder, capabilities) == pytest.approx(reference)
+
+
+def test_trajectories_converge_with_the_substep_size(make_connector, capsys):
+    connector = make_connector(make_model_description(n_real=4, model_type="modelExchange"),
+                               connector_options={"me_solver": "euler"})
+    actions = [{"r0": 1.0 if t % 2 else -1.0} for t in range(10)]
+
+    trajectories = {}
+    for substep_size in (0.1, 0.01, 0.001):
+        config = {"FMU_step_size": 0.1, "FMU_substep_size": substep_size}
+        trajectories[substep_size], elapsed = run_trajectory(connector, config, actions)
+        assert elapsed > 0
+
+    reference = trajectories[0.001]
+    assert reference.shape[0] == len(actions)
+    assert not np.isnan(reference).any()
+    errors = [np.abs(trajectories[substep_size] - reference).max() for substep_size in (0.1, 0.01)]
+    assert errors[1] < errors[0]
+    # the connector logs are left untouched (e.g: warnings)
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,29 @@
+import logging
+
+import connector_logging
+
+
+def test_fmi_trace_is_not_rate_limited(make_connector, capsys):
+    connector = make_connector(config={"FMU_logging": 1})
+    capsys.readouterr()
+
+    with connector_logging.temporary_level(logging.INFO):
+        for _ in range(50):
+            connector.apply_actions({"r0": 1.0})
+            connector.run_step()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len([line for line in lines if line.startswith("[FMI] fmi2DoStep")]) == 50
+    assert len([line for line in lines if line.strip().startswith("doStep(")]) == 50
+    assert not any("suppressed" in line for line in lines)
+
+
+def test_resets_without_config_log_nothing_by_default(make_connector, capsys):
+    connector = make_connector()
+    capsys.readouterr()
+
+    for _ in range(20):
+        connector.reset({})
+        connector.get_state_vars()
+
+    assert capsys.readouterr().out == ""
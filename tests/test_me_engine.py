@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from synthetic_fmu import make_model_description
+
+
+def run_episode(connector, n_steps: int = 10):
+    states = []
+    for t in range(n_steps):
+        connector.apply_actions({"r1": 1.0 + t % 3})
+        connector.run_step()
+        states.append(connector.get_state_vars())
+    return states
+
+
+def count_calls(connector, method_name: str, step_events_every: int = None):
+    """Count the calls to an FMU method (optionally requesting a step event every few completed steps).
+    """
+
+    counts = {"calls": 0}
+    method = getattr(connector.fmu, method_name)
+
+    def counted(*args, **kwargs):
+        counts["calls"] += 1
+        result = method(*args, **kwargs)
+        if step_events_every is not None and counts["calls"] % step_events_every == 0:
+            return True, False
+        return result
+
+    setattr(connector.fmu, method_name, counted)
+    return counts
+
+
+@pytest.mark.parametrize("solver, tolerance", [("euler", 0.05), ("rk4", 1e-4), ("rk45", 1e-3), ("cvode", 1e-3)])
+def test_solvers_match_the_exact_solution(make_connector, solver, tolerance):
+    # (co-simulation instances of the synthetic model step with the exact solution)
+    reference = make_connector(make_model_description(n_real=6))
+    connector = make_connector(make_model_description(n_real=6, model_type="modelExchange"),
+                               connector_options={"me_solver": solver, "me_max_step": 0.025})
+
+    for state, expected in zip(run_episode(connector), run_episode(reference)):
+        assert state["FMU_time"] == pytest.approx(expected["FMU_time"])
+        assert state["r2"] == pytest.approx(expected["r2"], rel=tolerance)
+        assert state["r3"] == pytest.approx(expected["r3"], rel=tolerance)
+
+
+@pytest.mark.parametrize("solver", ["rk4", "rk45", "cvode"])
+def test_every_internal_step_is_completed(make_connector, solver):
+    connector = make_connector(make_model_description(n_real=6, model_type="modelExchange"),
+                               connector_options={"me_solver": solver, "me_max_step": 0.025})
+    counts = count_calls(connector, "completedIntegratorStep")
+
+    run_episode(connector)
+
+    assert counts["calls"] == connector.me_stepper.stats["n_steps"]
+    # (at least 4 internal steps of at most 0.025 per step of 0.1)
+    assert counts["calls"] >= 4 * 10
+
+
+@pytest.mark.parametrize("solver", ["rk4", "rk45", "cvode"])
+def test_step_events_are_handled(make_connector, solver):
+    connector = make_connector(make_model_description(n_real=6, model_type="modelExchange"),
+                               connector_options={"me_solver": solver, "me_max_step": 0.025})
+    counts = count_calls(connector, "completedIntegratorStep", step_events_every=3)
+    events = count_calls(connector, "enterEventMode")
+
+    states = run_episode(connector)
+
+    assert events["calls"] == counts["calls"] // 3
+    assert states[-1]["FMU_time"] == pytest.approx(1.0)
+
+
+def test_state_events_are_located(make_connector):
+    # event indicators cross zero when the first states cross SyntheticFMU2Model.EVENT_THRESHOLD
+    model_description = make_model_description(n_real=6, model_type="modelExchange", n_event_indicators=2)
+    connector = make_connector(model_description, connector_options={"me_solver": "rk45"})
+    connector.apply_actions({"r1": -1.0})
+
+    for _ in range(10):
+        connector.run_step()
+
+    assert connector.me_stepper.stats["n_events"] > 0
+    assert not connector.error_occurred
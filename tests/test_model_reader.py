@@ -0,0 +1,71 @@
+import pytest
+
+from fmpy import read_model_description
+
+from model_reader import read_model_description_streaming
+
+
+FMI3_MODEL_DESCRIPTION = """<?xml version="1.0" encoding="UTF-8"?>
+<fmiModelDescription fmiVersion="3.0" modelName="Starts" instantiationToken="{starts}">
+  <CoSimulation modelIdentifier="Starts" canGetAndSetFMUState="true"/>
+  <ModelVariables>
+    <Float64 name="time" valueReference="0" causality="independent" variability="continuous"/>
+    <Float64 name="gain" valueReference="1" causality="parameter" variability="tunable" start="2.5"/>
+    <Int32 name="count" valueReference="2" causality="output" variability="discrete" initial="exact" start="3"/>
+    <Boolean name="enabled" valueReference="3" causality="input" start="true"/>
+    <String name="label" valueReference="4" causality="parameter" variability="fixed">
+      <Start value="synthetic"/>
+    </String>
+    <Binary name="blob" valueReference="5" causality="parameter" variability="fixed">
+      <Start value="0a0b"/>
+    </Binary>
+    <String name="empty" valueReference="6" causality="parameter" variability="fixed"/>
+    <Float64 name="offsets" valueReference="7" causality="parameter" variability="tunable" start="0 1 2">
+      <Dimension start="3"/>
+    </Float64>
+  </ModelVariables>
+  <ModelStructure>
+    <Output valueReference="2"/>
+  </ModelStructure>
+</fmiModelDescription>
+"""
+
+
+FMI2_MODEL_DESCRIPTION = """<?xml version="1.0" encoding="UTF-8"?>
+<fmiModelDescription fmiVersion="2.0" modelName="Starts" guid="{starts}">
+  <CoSimulation modelIdentifier="Starts" canGetAndSetFMUstate="true"/>
+  <ModelVariables>
+    <ScalarVariable name="gain" valueReference="0" causality="parameter" variability="tunable"><Real start="2.5"/></ScalarVariable>
+    <ScalarVariable name="count" valueReference="1" causality="output" variability="discrete"><Integer/></ScalarVariable>
+    <ScalarVariable name="label" valueReference="2" causality="parameter" variability="fixed"><String start="synthetic"/></ScalarVariable>
+  </ModelVariables>
+  <ModelStructure>
+    <Outputs><Unknown index="2"/></Outputs>
+  </ModelStructure>
+</fmiModelDescription>
+"""
+
+
+@pytest.mark.parametrize("xml", [FMI3_MODEL_DESCRIPTION, FMI2_MODEL_DESCRIPTION])
+def test_streaming_reader_matches_fmpy(tmp_path, xml):
+    (tmp_path / "modelDescription.xml").write_text(xml)
+
+    expected = read_model_description(str(tmp_path), validate=False)
+    model_description = read_model_description_streaming(str(tmp_path))
+
+    assert model_description.guid == expected.guid
+    assert model_description.coSimulation.canGetAndSetFMUstate == expected.coSimulation.canGetAndSetFMUstate
+    variables = {variable.name: variable for variable in model_description.modelVariables}
+    for expected_variable in expected.modelVariables:
+        variable = variables[expected_variable.name]
+        assert (variable.type, variable.causality, variable.start) == \
+               (expected_variable.type, expected_variable.causality, expected_variable.start)
+
+
+def test_string_and_binary_starts_are_read(tmp_path):
+    (tmp_path / "modelDescription.xml").write_text(FMI3_MODEL_DESCRIPTION)
+
+    model_description = read_model_description_streaming(str(tmp_path), causalities=["parameter"])
+    starts = {variable.name: variable.start for variable in model_description.modelVariables}
+
+    assert starts == {"gain": "2.5", "label": "synthetic", "blob": "0a0b", "empty": None, "offsets": "0 1 2"}
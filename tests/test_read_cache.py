@@ -0,0 +1,63 @@
+import pytest
+
+from FMU_Connector import FMUConnectorBatch
+from synthetic_fmu import make_model_description
+
+
+def test_repeated_reads_are_cached(make_connector):
+    connector = make_connector()
+    connector.apply_actions({"r0": 1.0})
+    connector.run_step()
+
+    first = connector.get_state_vars()
+    hits = connector.read_cache_stats["hits"]
+    second = connector.get_state_vars()
+
+    assert second == first
+    assert connector.read_cache_stats["hits"] > hits
+
+
+def test_step_invalidates_cached_reads(make_connector):
+    reference = make_connector()
+    connector = make_connector()
+
+    for t in range(3):
+        for c in (reference, connector):
+            c.apply_actions({"r0": 1.0 + t})
+        # values read after the actions are written (before the step) must not be served after it
+        connector.get_state_vars()
+        for c in (reference, connector):
+            c.run_step()
+        assert connector.get_state_vars() == reference.get_state_vars()
+
+
+def test_reset_invalidates_cached_reads(make_connector):
+    connector = make_connector()
+    initial = connector.get_state_vars()
+    connector.apply_actions({"r0": 2.0})
+    connector.run_step()
+    assert connector.get_state_vars() != initial
+
+    connector.reset({})
+
+    assert connector.get_state_vars() == initial
+
+
+@pytest.mark.parametrize("config", [{}, {"FMU_action_repeat": 3, "FMU_action_repeat_reduction": "mean", "FMU_substep_size": 0.025}])
+def test_batched_step_invalidates_cached_reads(make_connector, config):
+    model_description = make_model_description(n_real=6, model_type="modelExchange")
+    singles = [make_connector(model_description, config), make_connector(model_description)]
+    batched = [make_connector(model_description, config), make_connector(model_description)]
+
+    for t in range(3):
+        for connector in singles + batched:
+            connector.apply_actions({"r1": 1.0 + t})
+        for connector in batched:
+            # values read before the step must not be served after it
+            connector.get_state_vars()
+        for connector in singles:
+            connector.run_step()
+        FMUConnectorBatch(batched).run_step()
+
+        for single, connector in zip(singles, batched):
+            assert connector.get_state_vars() == pytest.approx(single.get_state_vars())
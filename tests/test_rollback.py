@@ -0,0 +1,90 @@
+import pytest
+
+
+def run_episode(connector, n_steps: int, action: float = 1.0):
+    states = []
+    for _ in range(n_steps):
+        connector.apply_actions({"r0": action})
+        connector.run_step()
+        states.append(connector.get_state_vars())
+        if connector.halted():
+            break
+    return states
+
+
+def test_failed_substeps_are_retried(make_connector):
+    reference = make_connector(config={"FMU_max_retries": 3})
+    connector = make_connector(config={"FMU_max_retries": 3}, failure_rate=0.05, seed=3)
+
+    expected = run_episode(reference, 20)
+    states = run_episode(connector, 20)
+
+    assert len(states) == 20
+    assert not connector.halted()
+    assert sum(state["FMU_retries"] for state in states) > 0
+    assert all(state["FMU_error"] == 0 for state in states)
+    # rolled back substeps are retried over the same interval, so the trajectory is unchanged
+    for state, expected_state in zip(states, expected):
+        assert state["FMU_time"] == pytest.approx(expected_state["FMU_time"])
+        assert state["r1"] == pytest.approx(expected_state["r1"])
+
+
+def test_failure_without_retries_halts(make_connector):
+    connector = make_connector(config={"FMU_max_retries": 0}, fail_at_time=0.25)
+
+    states = run_episode(connector, 10)
+
+    assert connector.halted()
+    assert states[-1]["FMU_error"] == 1
+    assert states[-1]["FMU_retries"] == 0
+    assert len(states) == 4
+    assert states[-1]["FMU_time"] == pytest.approx(0.3)
+
+
+def test_persistent_failure_exhausts_retries(make_connector):
+    connector = make_connector(config={"FMU_max_retries": 2}, fail_at_time=0.25)
+
+    states = run_episode(connector, 10)
+
+    assert connector.halted()
+    assert states[-1]["FMU_error"] == 1
+    assert states[-1]["FMU_retries"] == 2
+    assert states[-1]["FMU_time"] == pytest.approx(0.3, abs=0.05)
+
+
+@pytest.mark.parametrize("config", [{"FMU_max_retries": 2}, {"FMU_max_retries": 2, "FMU_adaptive_substep": 1}])
+def test_rolled_back_states_are_freed(make_connector, config):
+    connector = make_connector(config=config, failure_rate=0.3, seed=3)
+    counts = {"get": 0, "free": 0}
+    get_state, free_state = connector.fmu.getFMUstate, connector.fmu.freeFMUstate
+
+    def counted_get_state():
+        counts["get"] += 1
+        return get_state()
+
+    def counted_free_state(state):
+        counts["free"] += 1
+        return free_state(state)
+
+    connector.fmu.getFMUstate = counted_get_state
+    connector.fmu.freeFMUstate = counted_free_state
+    for _ in range(10):
+        connector.reset(dict(config))
+        run_episode(connector, 5)
+
+    assert counts["get"] > 0
+    assert counts["free"] == counts["get"]
+
+
+def test_reset_clears_step_counters(make_connector):
+    connector = make_connector(config={"FMU_max_retries": 3}, failure_rate=0.5, seed=1)
+    states = run_episode(connector, 10)
+    assert sum(state["FMU_retries"] for state in states) > 0
+
+    connector.reset({"FMU_max_retries": 3})
+    state = connector.get_state_vars()
+
+    assert state["FMU_retries"] == 0
+    assert state["FMU_substeps_taken"] == 0
+    assert state["FMU_substeps_rejected"] == 0
+    assert state["FMU_recovery_time"] == 0.0
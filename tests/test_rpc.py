@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+
+from rpc import CODECS, RPCClient, RPCServer, msgpack
+from synthetic_fmu import make_model_description
+
+
+ENCODINGS = ["struct"] + (["msgpack"] if msgpack is not None else [])
+
+LAYOUTS = {
+    "config": [("mu", "<f8", ()), ("gain", "<f8", ())],
+    "action": [("u", "<f8", (2,)), ("mode", "<i8", ())],
+    "state": [("x", "<f8", (2, 2)), ("count", "<i8", ()), ("on", "?", ()), ("FMU_time", "<f8", ())],
+}
+
+
+def run_episode(connector, n_steps: int, action: float = 1.0):
+    states = []
+    for _ in range(n_steps):
+        connector.apply_actions({"r0": action})
+        connector.run_step()
+        states.append(connector.get_state_vars())
+    return states
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("op, payload", [
+    ("reset", [[1.5, None], [None, None]]),
+    ("step", [[[0.5, -1.0], 3], [[2.0, 0.25], -7]]),
+    ("get_state", None),
+    ("restore", [4, 2**32 - 1]),
+    ("free_snapshot", [4, 5]),
+])
+def test_requests_round_trip(encoding, op, payload):
+    codec = CODECS[encoding](LAYOUTS)
+
+    decoded_op, ids, decoded_payload = codec.decode_request(codec.encode_request(op, [0, 3], payload))
+
+    assert (decoded_op, ids) == (op, [0, 3])
+    if op in ("reset", "step"):
+        decoded_payload = [list(row) for row in decoded_payload]
+    assert decoded_payload == payload
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("op, payload", [
+    ("reset", ([[[[1.0, 2.0], [3.0, 4.0]], 2**40, True, 0.5]], [True])),
+    ("step", ([[[[0.0, -1.0], [1e-300, 1e300]], -1, False, 1.0], [[[5.0, 6.0], [7.0, 8.0]], 0, True, 2.0]], [False, True])),
+    ("snapshot", [1, 2]),
+    ("free_snapshot", None),
+])
+def test_responses_round_trip(encoding, op, payload):
+    codec = CODECS[encoding](LAYOUTS)
+
+    decoded = codec.decode_response(op, codec.encode_response(op, payload))
+
+    if op in ("reset", "step"):
+        rows, halted = decoded
+        assert ([list(row) for row in rows], list(halted)) == (payload[0], payload[1])
+    else:
+        assert decoded == payload
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_numpy_payloads_are_encoded(encoding):
+    codec = CODECS[encoding](LAYOUTS)
+    actions = [[np.array([0.5, -1.0]), np.int64(3)]]
+
+    _, _, decoded = codec.decode_request(codec.encode_request("step", [1], actions))
+
+    assert [list(row) for row in decoded] == [[[0.5, -1.0], 3]]
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_errors_are_raised_by_the_client_codec(encoding):
+    codec = CODECS[encoding](LAYOUTS)
+
+    with pytest.raises(RuntimeError, match="RPC 'step' failed: boom"):
+        codec.decode_response("step", codec.encode_error("boom"))
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_server_matches_local_connectors(make_connector, tmp_path, encoding):
+    # (with n_real=6, 'r0' is a parameter set by the config, and 'r1' an input)
+    model_description = make_model_description(n_real=6)
+    references = [make_connector(model_description), make_connector(model_description)]
+    connectors = [make_connector(model_description), make_connector(model_description)]
+
+    with RPCServer(connectors, str(tmp_path / "rpc.sock")), \
+            RPCClient(str(tmp_path / "rpc.sock"), encoding=encoding) as client:
+        configs = [{"r0": 2.0}, {}]
+        for reference, config in zip(references, configs):
+            reference.reset(dict(config))
+        rows, halted = client.reset([0, 1], configs)
+
+        for t in range(3):
+            actions = [[1.0 + t], [-1.0 - t]]
+            for reference, action in zip(references, actions):
+                reference.apply_actions(dict(zip(client.action_names, action)))
+                reference.run_step()
+            rows, halted = client.step([0, 1], actions)
+
+            for reference, row in zip(references, rows):
+                state = reference.get_state_vars()
+                assert dict(zip(client.state_names, row)) == pytest.approx({name: state[name] for name in client.state_names})
+            assert list(halted) == [False, False]
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_server_snapshots(make_connector, tmp_path, encoding):
+    model_description = make_model_description(n_real=6)
+    connectors = [make_connector(model_description), make_connector(model_description)]
+
+    with RPCServer(connectors, str(tmp_path / "rpc.sock")) as server, \
+            RPCClient(str(tmp_path / "rpc.sock"), encoding=encoding) as client:
+        client.step([0, 1], [[1.0], [2.0]])
+        snapshot_ids = client.snapshot([0, 1])
+        expected, _ = client.step([0, 1], [[3.0], [3.0]])
+        client.step([0, 1], [[-3.0], [-3.0]])
+
+        client.restore([0, 1], snapshot_ids)
+        replayed, _ = client.step([0, 1], [[3.0], [3.0]])
+        assert replayed == expected
+
+        # snapshots are bound to the instance they were saved from
+        with pytest.raises(RuntimeError, match="was saved from instance"):
+            client.restore([1], snapshot_ids[:1])
+
+        client.free_snapshot([0, 1], snapshot_ids)
+        assert server.snapshots == {}
+        with pytest.raises(RuntimeError, match="Unknown snapshot id"):
+            client.restore([0], snapshot_ids[:1])
+
+
+def test_restored_snapshot_replays_the_episode(make_connector):
+    connector = make_connector()
+    run_episode(connector, 3)
+    snapshot = connector.save_snapshot()
+
+    expected = run_episode(connector, 5, action=2.0)
+    connector.restore_snapshot(snapshot)
+    replayed = run_episode(connector, 5, action=2.0)
+    connector.free_snapshot(snapshot)
+
+    assert replayed == expected
+
+
+def test_restored_snapshot_invalidates_cached_reads(make_connector):
+    connector = make_connector()
+    snapshot = connector.save_snapshot()
+    initial = connector.get_state_vars()
+    connector.apply_actions({"r0": 2.0})
+    connector.run_step()
+    assert connector.get_state_vars() != initial
+
+    connector.restore_snapshot(snapshot)
+    connector.free_snapshot(snapshot)
+
+    # (substeps and retries are still reported for the last step taken)
+    state = connector.get_state_vars()
+    assert state["r1"] == initial["r1"]
+    assert state["FMU_time"] == initial["FMU_time"]
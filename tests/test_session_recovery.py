@@ -0,0 +1,92 @@
+import pytest
+
+from microsoft_bonsai_api.simulator.client import BonsaiClient, BonsaiClientConfig
+from microsoft_bonsai_api.simulator.generated.models import SimulatorInterface
+
+from local_server import FAULTS, FaultInjector, LocalBonsaiServer
+from session_manager import SessionManager
+
+
+class SyntheticSimulatorSession:
+    """Simulator session driving a synthetic connector (as main.py's FMUSimulatorSession does).
+    """
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.env_name = "Synthetic FMU"
+        self.episode_finished = True
+        self.steps = 0
+
+    def get_state(self, full: bool = False):
+        return self.simulator.get_state_vars(full)
+
+    def halted(self):
+        return self.simulator.halted()
+
+    def episode_start(self, config):
+        self.simulator.reset(config or {})
+        self.episode_finished = False
+
+    def episode_step(self, action):
+        self.simulator.apply_actions(action)
+        self.simulator.run_step()
+        self.steps += 1
+
+    def episode_finish(self):
+        self.episode_finished = True
+        self.simulator.prepare_reset()
+
+    def idle(self):
+        if self.episode_finished:
+            self.simulator.prepare_reset()
+
+
+def run_session(server, sim, iterations: int, **manager_options):
+    config_client = BonsaiClientConfig(workspace="local", access_key="local", argv=None)
+    config_client.server = server.url
+    client = BonsaiClient(config_client)
+    registration_info = SimulatorInterface(name=sim.env_name, timeout=60, simulator_context=config_client.simulator_context,
+                                           description={"action": {"category": "Struct", "fields": [{"name": "r0"}]}})
+
+    manager = SessionManager(client, config_client.workspace, registration_info, sim, backoff_base_s=0.05,
+                             backoff_max_s=0.2, max_downtime_s=30.0, **manager_options)
+    manager.run(max_iterations=iterations)
+    manager.close()
+    return manager
+
+
+@pytest.mark.parametrize("fault", FAULTS)
+def test_session_recovers_from_fault(make_connector, fault):
+    sim = SyntheticSimulatorSession(make_connector())
+    fault_injector = FaultInjector({5: fault, 40: fault}, outage_s=0.3)
+
+    with LocalBonsaiServer(episode_length=5, faults=fault_injector,
+                           action_fn=lambda names: {name: 1.0 for name in names}) as server:
+        manager = run_session(server, sim, iterations=60)
+
+    assert manager.iterations == 60
+    assert {injected[1] for injected in fault_injector.injected} == {fault}
+    assert len(manager.incidents) == 2
+    assert all(incident.end is not None for incident in manager.incidents)
+    if fault in ("session_lost", "unregister"):
+        # the simulator registers again, keeping its (initialized) model
+        assert all(incident.reregistrations == 1 for incident in manager.incidents)
+        assert server.stats["registrations"] == 3
+    else:
+        # the same request is sent again after a backoff
+        assert all(incident.attempts >= 1 and incident.reregistrations == 0 for incident in manager.incidents)
+        assert server.stats["registrations"] == 1
+    assert sim.steps > 0
+    assert not sim.simulator.error_occurred
+
+
+def test_unregister_exits_without_reregistration(make_connector):
+    sim = SyntheticSimulatorSession(make_connector())
+    fault_injector = FaultInjector({5: "unregister"})
+
+    with LocalBonsaiServer(episode_length=5, faults=fault_injector) as server:
+        manager = run_session(server, sim, iterations=40, reregister_on_unregister=False)
+
+    assert manager.iterations == 4
+    assert manager.session_id is None
+    assert server.stats["registrations"] == 1
@@ -0,0 +1,59 @@
+import pytest
+
+from synthetic_fmu import make_model_description
+
+
+def run_episode(connector, n_steps: int = 5):
+    states = [connector.get_state_vars()]
+    for t in range(n_steps):
+        connector.apply_actions({"r1": 1.0 + t})
+        connector.run_step()
+        states.append(connector.get_state_vars())
+    return states
+
+
+@pytest.mark.parametrize("previous_config, config", [
+    ({"r0": 1.0}, {"r0": 1.0}),
+    ({"r0": 1.0}, {"r0": 3.0}),
+    ({"r0": 1.0}, {}),
+    ({}, {"r0": 2.0, "FMU_step_size": 0.05}),
+])
+def test_speculative_reset_equals_full_reset(make_connector, previous_config, config):
+    # (with n_real=6, 'r0' is a parameter set by the config, and 'r1' an input)
+    model_description = make_model_description(n_real=6)
+    reference = make_connector(model_description, previous_config)
+    connector = make_connector(model_description, previous_config)
+    run_episode(reference)
+    run_episode(connector)
+
+    reference.reset(dict(config))
+    connector.prepare_reset()
+    connector.reset(dict(config))
+
+    assert connector.speculative_reset_stats["hits"] + connector.speculative_reset_stats["misses"] == 1
+    assert run_episode(connector) == run_episode(reference)
+
+
+def test_speculative_reset_hits_the_recent_config(make_connector):
+    model_description = make_model_description(n_real=6)
+    connector = make_connector(model_description, {"r0": 1.0})
+
+    for _ in range(3):
+        run_episode(connector)
+        connector.prepare_reset()
+        connector.reset({"r0": 1.0})
+
+    assert connector.speculative_reset_stats["hits"] == 3
+    assert connector.speculative_reset_stats["misses"] == 0
+
+
+def test_states_are_kept_until_reset(make_connector):
+    model_description = make_model_description(n_real=6)
+    connector = make_connector(model_description, {"r0": 1.0})
+    last_state = run_episode(connector)[-1]
+
+    connector.prepare_reset()
+
+    assert connector.get_state_vars() == last_state
+    connector.reset({"r0": 1.0})
+    assert connector.get_state_vars()["FMU_time"] == 0.0
@@ -0,0 +1,41 @@
+import pytest
+
+from synthetic_fmu import make_model_description
+
+
+def steps_until_halted(connector, max_steps: int = 20):
+    for t in range(1, max_steps + 1):
+        connector.apply_actions({"r0": 1.0})
+        connector.run_step()
+        if connector.halted():
+            return t
+    return None
+
+
+@pytest.mark.parametrize("terminal, n_steps", [
+    # (Integer outputs count the steps taken, Real outputs relax towards the input)
+    ("    i2: [null, 3]\n", 3),
+    ("    r1: [null, 0.53]\n", 2),
+])
+def test_bounds_halt_the_episode(make_connector, terminal, n_steps):
+    model_description = make_model_description(n_real=4, n_integer=3)
+    connector = make_connector(model_description, yaml_sections="terminal:\n  bounds:\n" + terminal)
+
+    assert steps_until_halted(connector) == n_steps
+    assert connector.terminal_reason is not None
+    assert not connector.error_occurred
+
+    # conditions are evaluated again from the start of each episode
+    connector.reset({})
+    assert not connector.halted()
+    assert steps_until_halted(connector) == n_steps
+
+
+@pytest.mark.parametrize("terminal", [
+    "  bounds:\n    r9: [null, 1]\n",
+    "  non_finite: [r1, r9]\n",
+    "  expressions:\n    - \"r9 > 1\"\n",
+])
+def test_unknown_variables_are_rejected(make_connector, terminal):
+    with pytest.raises(ValueError, match="refers* to unknown variables"):
+        make_connector(yaml_sections="terminal:\n" + terminal)
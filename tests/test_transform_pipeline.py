@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from transform_pipeline import TransformPipeline
+
+
+def test_stages_run_in_order():
+    pipeline = TransformPipeline([
+        {"scale": {"x1": 2.0}},
+        {"offset": {"x1": -1.0}},
+        {"clip": {"x2": [None, 0.5]}},
+        {"convert": {"T": ["K", "degC"]}},
+        {"derive": {"x_norm": "x1 / mu"}},
+    ])
+    pipeline.bind({"mu": 4.0, "flag": True, "label": "a"})
+
+    transformed = pipeline.transform({"x1": 3.0, "x2": 0.75, "T": 300.0, "x3": 7.0})
+
+    assert transformed == pytest.approx({"x1": 5.0, "x2": 0.5, "T": 26.85, "x3": 7.0, "x_norm": 1.25})
+    # non-numeric config values are not available to expressions
+    assert pipeline.constants == {"mu": 4.0}
+
+
+def test_stages_refer_to_renamed_fields():
+    pipeline = TransformPipeline([
+        {"rename": {"x1": "position"}},
+        {"scale": {"position": 10.0, "x1": 100.0}},
+    ])
+
+    assert pipeline.transform({"x1": 1.0, "x2": 2.0}) == {"position": 10.0, "x2": 2.0}
+
+
+@pytest.mark.parametrize("field_names", [["x1", "x2"], ["x2", "x1"]])
+def test_rename_onto_existing_field_replaces_it(field_names):
+    # (regardless of the order of the fields)
+    pipeline = TransformPipeline([{"scale": {"x1": 2.0}}, {"rename": {"x1": "x2"}}])
+    values = {"x1": 1.0, "x2": 5.0}
+
+    assert pipeline.transform({name: values[name] for name in field_names}) == {"x2": 2.0}
+
+
+def test_rename_swaps_fields():
+    pipeline = TransformPipeline([{"rename": {"x1": "x2", "x2": "x1"}}, {"offset": {"x1": 1.0}}])
+
+    assert pipeline.transform({"x1": 1.0, "x2": 5.0}) == {"x2": 1.0, "x1": 6.0}
+
+
+def test_derive_replaces_existing_field():
+    pipeline = TransformPipeline([{"derive": {"x1": "x1 + x2"}}, {"scale": {"x1": 2.0}}])
+
+    assert pipeline.transform({"x1": 1.0, "x2": 5.0}) == {"x1": 12.0, "x2": 5.0}
+
+
+def test_derive_with_unknown_names_is_skipped(capsys):
+    pipeline = TransformPipeline([{"derive": {"y": "x1 * gain", "z": "sqrt(x1)"}}])
+
+    assert pipeline.transform({"x1": 4.0}) == {"x1": 4.0, "z": 2.0}
+    assert "['gain'] not available" in capsys.readouterr().out
+
+
+def test_batch_matches_single_transforms():
+    pipeline = TransformPipeline([
+        {"scale": {"x1": 2.0}},
+        {"derive": {"y": "max(x1, x2)"}},
+        {"clip": {"y": [0.0, 3.0]}},
+        {"rename": {"x2": "x1", "x1": "x2"}},
+    ])
+    rows = np.array([[1.0, 0.5], [-2.0, -1.0], [4.0, 1.0]])
+    compiled = pipeline.compile(["x1", "x2"])
+
+    columns = compiled.apply(rows.copy())
+
+    for row, row_columns in zip(rows, columns):
+        single = pipeline.transform(dict(zip(["x1", "x2"], row)))
+        batched = {name: row_columns[source] for name, (kind, source) in compiled.fields.items()}
+        assert batched == pytest.approx(single)
+
+
+def test_compiled_pipelines_are_cached_until_bind():
+    pipeline = TransformPipeline([{"derive": {"y": "x1 * gain"}}])
+    pipeline.bind({"gain": 2.0})
+    compiled = pipeline.compile(["x1"])
+
+    assert pipeline.compile(["x1"]) is compiled
+    assert pipeline.transform({"x1": 1.0}) == {"x1": 1.0, "y": 2.0}
+
+    pipeline.bind({"gain": 3.0})
+
+    assert pipeline.compile(["x1"]) is not compiled
+    assert pipeline.transform({"x1": 1.0}) == {"x1": 1.0, "y": 3.0}
+
+
+@pytest.mark.parametrize("stages, match", [
+    ([{"shift": {"x1": 1.0}}], "Unknown transform stage"),
+    ([{"scale": {"x1": 2.0}, "offset": {"x1": 1.0}}], "single-key dict"),
+    ([{"convert": {"T": ["K", "degR"]}}], "Unknown unit"),
+    ([{"convert": {"T": ["K", "m"]}}], "Cannot convert"),
+])
+def test_invalid_stages_are_rejected(stages, match):
+    with pytest.raises(ValueError, match=match):
+        TransformPipeline(stages)
+
+
+def test_connector_applies_declared_transforms(make_connector):
+    # (with n_real=4, 'r0' is an input and 'r1' an output relaxing towards it)
+    reference = make_connector()
+    connector = make_connector(yaml_sections=(
+        "transforms:\n"
+        "  state:\n"
+        "  - scale: {r1: 10.0}\n"
+        "  - rename: {r1: position}\n"
+        "  action:\n"
+        "  - scale: {r0: 2.0}\n"
+    ))
+
+    for t in range(3):
+        reference.apply_actions({"r0": 2.0 * (1.0 + t)})
+        connector.apply_actions({"r0": 1.0 + t})
+        reference.run_step()
+        connector.run_step()
+
+        states = connector.get_state_vars()
+        reference_states = reference.get_state_vars()
+        assert "r1" not in states
+        assert states["position"] == pytest.approx(10.0 * reference_states["r1"])
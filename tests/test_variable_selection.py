@@ -0,0 +1,54 @@
+import yaml
+import pytest
+
+from model_reader import clean_name
+from synthetic_fmu import make_model_description
+from variable_selection import VariableSelector, compile_pattern, is_pattern
+
+
+ORIGINAL_NAMES = ["plant.pump1.T", "plant.pump2.T", "plant.pump3.T", "plant.pump2.p_out", "plant.sub.pump4.T",
+                  "plant.valve1.opening", "plant.valve12.opening", "der(plant.x[1])", "x1"]
+
+
+@pytest.fixture
+def selector():
+    return VariableSelector([clean_name(name) for name in ORIGINAL_NAMES], ORIGINAL_NAMES)
+
+
+@pytest.mark.parametrize("entries, expected", [
+    (["x1"], ["x1"]),
+    (["plant.pump*.T"], ["plantpump1T", "plantpump2T", "plantpump3T"]),
+    (["plant.**.T"], ["plantpump1T", "plantpump2T", "plantpump3T", "plantsubpump4T"]),
+    (["plant.pump?.p_out"], ["plantpump2p_out"]),
+    (["re:plant\\.valve[0-9]+\\.opening"], ["plantvalve1opening", "plantvalve12opening"]),
+    (["re:plant\\.valve1?2?\\.opening"], ["plantvalve1opening", "plantvalve12opening"]),
+    (["re:plant\\.(pump1|valve1)\\..*"], ["plantpump1T", "plantvalve1opening"]),
+    (["plant.**.T", "!plant.pump3.*", "!plantsubpump4T"], ["plantpump1T", "plantpump2T"]),
+    (["x1", "plantpump1T", "plant.pump*.T"], ["x1", "plantpump1T", "plantpump2T", "plantpump3T"]),
+    (["plant.pump9*"], []),
+])
+def test_entries_are_resolved(selector, entries, expected):
+    assert selector.resolve(entries) == expected
+
+
+def test_patterns_are_told_from_names():
+    # (brackets are part of Modelica array names)
+    assert not is_pattern("der(plant.x[1])")
+    assert is_pattern("plant.*") and is_pattern("re:x") and is_pattern("!x1")
+    assert compile_pattern("plant.pump*.T")[1] == "plant.pump"
+    assert compile_pattern("re:plant\\.valve[0-9]+")[1] == "plant.valve"
+
+
+def test_config_lists_accept_patterns(make_connector, tmp_path):
+    model_description = make_model_description(n_real=6)
+    make_connector(model_description)
+    config_filepath = tmp_path / "synthetic_conf.yaml"
+    config = yaml.safe_load(config_filepath.read_text())
+    config["simulation"]["outputs"] = ["r*", "!r0", "!re:r[14]", "!r5"]
+    config["simulation"]["other_vars"] = []
+    config_filepath.write_text(yaml.safe_dump(config))
+
+    connector = make_connector(model_description)
+
+    assert connector.sim_outputs == ["r2", "r3"]
+    assert set(connector.get_state_vars()) >= {"r2", "r3"}
@@ -0,0 +1,31 @@
+from variable_table import VariableTable
+
+
+def test_start_values_keep_their_type_and_precision():
+    table = VariableTable()
+    table.append("real", 0, "Float64", "parameter", "tunable", 0.1)
+    table.append("int64", 1, "Int64", "parameter", "tunable", 2 ** 53 + 1)
+    table.append("negative", 2, "Int64", "parameter", "tunable", -2 ** 63)
+    table.append("uint64", 3, "UInt64", "parameter", "tunable", 2 ** 64 - 1)
+    table.append("flag", 4, "Boolean", "input", "discrete", True)
+    table.append("label", 5, "String", "parameter", "fixed", "synthetic")
+    table.append("offsets", 6, "Float64", "parameter", "tunable", (0.0, 1.0, 2.0), shape=(3,))
+    table.append("output", 7, "Float64", "output", "continuous")
+    table.freeze()
+
+    assert dict(table.start_values) == {"real": 0.1, "int64": 2 ** 53 + 1, "negative": -2 ** 63, "uint64": 2 ** 64 - 1,
+                                        "flag": True, "label": "synthetic", "offsets": (0.0, 1.0, 2.0)}
+    assert type(table.start_values["int64"]) is int
+    assert type(table.start_values["flag"]) is bool
+    assert "output" not in table.start_values
+
+
+def test_names_are_selected_by_causality():
+    table = VariableTable()
+    for i, causality in enumerate(["parameter", "input", "output", "local", "output"]):
+        table.append(f"v{i}", i, "Float64", causality)
+    table.freeze()
+
+    assert table.get_names(["output"]) == ["v2", "v4"]
+    assert table.get_names(["parameter", "input"], exclude=True) == ["v2", "v3", "v4"]
+    assert list(table.get_value_references(["v4", "v0"])) == [4, 0]
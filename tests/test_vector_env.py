@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from synthetic_fmu import make_model_description, synthetic_fmu_factory
+from vector_env import FMUVectorEnv
+
+
+@pytest.fixture
+def make_env(make_connector, tmp_path):
+    """Build vector environments over synthetic instances (interface.json is written by a first connector).
+    """
+
+    model_description = make_model_description(n_real=6)
+    make_connector(model_description)
+    envs = []
+
+    def make(**env_options):
+        connector_kwargs = {"model_description": model_description, "fmu_factory": synthetic_fmu_factory(model_description),
+                            "user_validation": False}
+        env = FMUVectorEnv(str(tmp_path / "synthetic.fmu"), connector_kwargs=connector_kwargs, **env_options)
+        envs.append(env)
+        return env
+
+    yield make
+
+    for env in envs:
+        env.close()
+
+
+def test_autoresets_keep_the_config_of_the_last_reset(make_env):
+    env = make_env(num_envs=2, max_episode_steps=2)
+    reference = make_env(num_envs=2)
+    actions = np.ones((2, 1))
+
+    env.reset(options={"config": {"r0": 3.0}})
+    for _ in range(3):
+        # (the third step autoresets every instance)
+        _, _, _, truncations, _ = env.step(actions)
+    observations = env.step(actions)[0]
+
+    reference.reset(options={"config": {"r0": 3.0}})
+    expected = reference.step(actions)[0]
+
+    assert not truncations.any()
+    np.testing.assert_allclose(observations, expected)
+
+
+def test_reset_without_options_restores_the_config(make_env):
+    env = make_env(num_envs=1, config={"r0": 2.0})
+    reference = make_env(num_envs=1, config={"r0": 2.0})
+    actions = np.ones((1, 1))
+
+    env.reset(options={"config": {"r0": 3.0}})
+    env.step(actions)
+    env.reset()
+    reference.reset()
+
+    np.testing.assert_allclose(env.step(actions)[0], reference.step(actions)[0])